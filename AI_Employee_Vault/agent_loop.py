@@ -1,10 +1,21 @@
 import os
 import time
-import shutil
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
 from openai import OpenAI
+from rate_limiter import TokenBucket
+from response_cache import ResponseCache, cache_key
+from summarizer import Summarizer, CHARS_PER_TOKEN
+from priority import PriorityRules, WaitStats, priority_class
+from dashboard import Dashboard
+from vault_storage import atomic_open, move_to_folder
+from vault_logging import setup_logging, log_context, timed
+from metrics import QUEUE_WAIT, STAGE_SECONDS
+from resilience import CircuitOpenError, backoff_delay, breaker, dead_letter, is_transient
+from batch_jobs import BatchQueue
 
 # Configuration - Relative to script location
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -14,21 +25,45 @@ NEEDS_ACTION = os.path.join(BASE_DIR, "Needs_Action")
 DONE = os.path.join(BASE_DIR, "Done")
 PLANS = os.path.join(BASE_DIR, "Plans")
 DASHBOARD = os.path.join(BASE_DIR, "Documentation", "Dashboard.md")
+HANDBOOK = os.path.join(BASE_DIR, "Company_Handbook.md")
 PHR = os.path.join(BASE_DIR, "PHR")
+DEAD_LETTER = os.path.join(BASE_DIR, "Dead_Letter")
 LOG_DIR = os.path.join(BASE_DIR, "Logs")
 
+# Summarization workers: how many files are processed at once, and the shared request budget
+AGENT_CONCURRENCY = int(os.getenv("AGENT_CONCURRENCY", "4"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+# Highest score first; every PRIORITY_AGING_SECONDS of waiting adds one point, so low items still run
+PRIORITY_AGING_SECONDS = float(os.getenv("AGENT_PRIORITY_AGING_SECONDS", "6"))
+# A file that fails this many times (with backoff in between) is moved to Dead_Letter
+MAX_ATTEMPTS = 3
+
+# Persistent cache of summaries, so re-dropped or duplicate files skip the API
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.path.join(BASE_DIR, ".cache", "llm_responses.db")
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "50"))
+LLM_CACHE_TTL_DAYS = float(os.getenv("LLM_CACHE_TTL_DAYS", "30"))
+
+# Dashboard.md shows only the latest items; older ones rotate into Dashboard_Archive/
+DASHBOARD_RECENT = int(os.getenv("DASHBOARD_RECENT", "20"))
+DASHBOARD_DB = os.path.join(BASE_DIR, ".cache", "dashboard.db")
+
+# Large documents are summarized in chunks, then the chunk summaries are merged
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "2000"))
+SUMMARY_REDUCE_FANOUT = int(os.getenv("SUMMARY_REDUCE_FANOUT", "8"))
+SUMMARY_CHUNK_CONCURRENCY = int(os.getenv("SUMMARY_CHUNK_CONCURRENCY", "4"))
+
+# Batch mode: files of these priority classes that fit in one chunk are summarized through
+# the OpenAI Batch API (half the price, results within 24h) instead of a live call. Off by default.
+BATCH_ENABLED = os.getenv("AGENT_BATCH", "false").lower() == "true"
+BATCH_PRIORITIES = {cls.strip() for cls in os.getenv("AGENT_BATCH_PRIORITIES", "low,normal").split(",") if cls.strip()}
+BATCH_DIR = os.path.join(BASE_DIR, ".state", "batches")
+
+SUMMARY_MODEL = "gpt-3.5-turbo"
+SUMMARY_PROMPT = "You are a helpful AI employee. Summarize the following document content concisely."
+
 # Logging Configuration
-if not os.path.exists(LOG_DIR):
-    os.makedirs(LOG_DIR)
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler(os.path.join(LOG_DIR, "system.log")),
-        logging.StreamHandler()
-    ]
-)
+setup_logging(LOG_DIR, "system")
 logger = logging.getLogger("Agent")
 
 # Check for API Key
@@ -38,97 +73,250 @@ if not api_key:
     client = None
 else:
     client = OpenAI(api_key=api_key)
+bucket = TokenBucket(LLM_REQUESTS_PER_MINUTE / 60, AGENT_CONCURRENCY)
+cache = ResponseCache(
+    LLM_CACHE_PATH,
+    max_bytes=int(LLM_CACHE_MAX_MB * 1024 * 1024),
+    ttl_seconds=LLM_CACHE_TTL_DAYS * 24 * 3600
+) if LLM_CACHE_ENABLED else None
 
-def get_ai_summary(content):
-    if not client:
-        return content[:200] + ("..." if len(content) > 200 else "")
-    
+summarizer = Summarizer(
+    client, bucket, cache, SUMMARY_MODEL, SUMMARY_PROMPT,
+    chunk_tokens=SUMMARY_CHUNK_TOKENS,
+    fanout=SUMMARY_REDUCE_FANOUT,
+    concurrency=SUMMARY_CHUNK_CONCURRENCY,
+    circuit=breaker("openai")
+)
+
+dashboard = Dashboard(DASHBOARD, DASHBOARD_DB, recent=DASHBOARD_RECENT)
+batches = BatchQueue(client, BATCH_DIR, circuit=summarizer.circuit) if client and BATCH_ENABLED else None
+
+priority_rules = PriorityRules(HANDBOOK)
+wait_stats = WaitStats()
+# When each Needs_Action file was first listed; moves keep the original mtime, so it cannot be used
+first_seen = {}
+# Failed attempts per file, and when a failed or deferred file may be picked up again
+attempts = {}
+retry_at = {}
+
+def simple_summary(path):
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful AI employee. Summarize the following document content concisely."},
-                {"role": "user", "content": content}
-            ]
-        )
-        return response.choices[0].message.content
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            content = f.read(201)
     except Exception as e:
-        logger.error(f"AI Summarization failed: {e}")
-        return content[:200] + ("..." if len(content) > 200 else "")
+        return f"Could not read content: {e}"
+    return content[:200] + ("..." if len(content) > 200 else "")
+
+def get_ai_summary(path):
+    """Returns (summary, stats); stats is None when no API key is configured and the simple summary is used.
+
+    API errors propagate, so handle_failure retries the file or moves it to Dead_Letter.
+    """
+    if not client:
+        return simple_summary(path), None
+
+    summary, stats = summarizer.summarize_file(path)
+    logger.info(f"Summarized {os.path.basename(path)}: {stats}")
+    return summary, stats
+
+def write_plan(filename, execution):
+    with atomic_open(os.path.join(PLANS, f"PLAN_{filename}.md")) as f:
+        f.write(f"# Plan for {filename}\n\n")
+        f.write(f"Task: AI Summarization of {filename}\n")
+        f.write(f"Execution: {execution}\n")
+
+def batch_eligible(filename, cls):
+    """True for a file of a batched priority class that is summarized in a single call."""
+    if batches is None or cls not in BATCH_PRIORITIES:
+        return False
+    try:
+        return os.path.getsize(os.path.join(NEEDS_ACTION, filename)) <= SUMMARY_CHUNK_TOKENS * CHARS_PER_TOKEN
+    except OSError:
+        return False
+
+def queue_for_batch(filename):
+    """Adds the summary request for a file to the next batch job.
+
+    Returns False, so the file is summarized now, if the summary is already cached.
+    The file stays in Needs_Action, skipped while queued, and is listed as queued in Dashboard.md.
+    """
+    src_path = os.path.join(NEEDS_ACTION, filename)
+    with open(src_path, "r", encoding="utf-8", errors="ignore") as f:
+        content = f.read()
+    # Same key as the summarizer's for a one-chunk file, so either path reuses the other's result
+    if cache and cache.get(cache_key(SUMMARY_MODEL, SUMMARY_PROMPT, content, normalize=False)) is not None:
+        return False
+    body = {"model": SUMMARY_MODEL, "messages": [
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": content}
+    ]}
+    if batches.add(filename, body):
+        write_plan(filename, "Queued for OpenAI batch summarization; recorded in Dashboard.md when the batch completes.")
+        dashboard.record(filename, "file", "queued", "Waiting for batch summarization (within 24 hours).", src_path)
+        logger.info(f"Queued {filename} for batch summarization.")
+    return True
+
+def finish_batched(filename, request, completion, error):
+    """Records a batch summary in Dashboard.md and PHR and moves the file to Done, as process_file does."""
+    src_path = os.path.join(NEEDS_ACTION, filename)
+    with log_context(file=filename, stage="batch"):
+        if not os.path.isfile(src_path):
+            logger.warning(f"Batch result for {filename} ignored: no longer in Needs_Action")
+            return
+        if error is not None:
+            dead_path = dead_letter(src_path, DEAD_LETTER, "batch", error, error.attempts)
+            meta = os.path.join(NEEDS_ACTION, f"FILE_{filename}.md")
+            if os.path.exists(meta):
+                move_to_folder(meta, DEAD_LETTER)
+            dashboard.record(filename, "file", "failed", str(error), dead_path)
+            return
+        summary = completion.choices[0].message.content or ""
+        if cache:
+            cache.put(cache_key(request["model"], SUMMARY_PROMPT, request["messages"][-1]["content"], normalize=False), summary)
+        usage = completion.usage
+        stats = (f"Batch API, {usage.prompt_tokens} prompt + {usage.completion_tokens} completion tokens"
+                 if usage else "Batch API")
+        complete_file(filename, summary, stats)
+
+def process_file(filename):
+    logger.info(f"Processing: {filename}")
+    src_path = os.path.join(NEEDS_ACTION, filename)
+    
+    # 1. Generate Plan
+    write_plan(filename, "Use OpenAI to summarize and record in Dashboard.md.")
+    
+    # 2. Execute (Summarize into Dashboard); the file is streamed in chunks, never read whole
+    with timed(logger, "summarize"):
+        summary, stats = get_ai_summary(src_path)
+    complete_file(filename, summary, stats)
+
+def complete_file(filename, summary, stats):
+    """Records the summary in Dashboard.md and PHR, then moves the file and its metadata to Done."""
+    src_path = os.path.join(NEEDS_ACTION, filename)
+    dashboard.record(filename, "file", "summarized", summary, src_path)
+
+    # 3. Record prompt in PHR
+    record_filename = f"RECORD_{datetime.now().strftime('%Y%H%M%S')}_{filename}.md"
+    record_path = os.path.join(PHR, record_filename)
+    with atomic_open(record_path) as f:
+        f.write(f"# Prompt Record\n")
+        f.write(f"- **File:** {filename}\n")
+        f.write(f"- **Timestamp:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"- **Action:** AI Summarization\n")
+        if stats:
+            f.write(f"- **Usage:** {stats}\n")
+
+    # 4. Move to Done (a rename; never overwrites an earlier file of the same name)
+    move_to_folder(src_path, DONE)
+    
+    # Also move the metadata file if it exists
+    meta_file = f"FILE_{filename}.md"
+    meta_src = os.path.join(NEEDS_ACTION, meta_file)
+    if os.path.exists(meta_src):
+        move_to_folder(meta_src, DONE)
+
+    logger.info(f"Successfully processed {filename}")
+
+def run_file(filename, cls):
+    wait_seconds = time.time() - first_seen.get(filename, time.time())
+    wait_stats.add(cls, wait_seconds)
+    QUEUE_WAIT.observe(wait_seconds, stage="needs_action")
+    with log_context(file=filename, priority=cls):
+        if batch_eligible(filename, cls) and queue_for_batch(filename):
+            return
+        with timed(logger, "process", wait_ms=round(wait_seconds * 1000)), STAGE_SECONDS.time(stage="summarize"):
+            process_file(filename)
+
+def handle_failure(filename, error):
+    """Schedules a retry of a failed file with backoff, or moves it to Dead_Letter once it runs out of attempts."""
+    if isinstance(error, CircuitOpenError):
+        # Not the file's fault: wait for the circuit without using up an attempt
+        logger.warning(f"Deferred {filename}: {error}")
+        retry_at[filename] = time.time() + error.retry_in
+        return
+    attempts[filename] = attempts.get(filename, 0) + 1
+    if is_transient(error) and attempts[filename] < MAX_ATTEMPTS:
+        delay = backoff_delay(attempts[filename])
+        logger.warning(f"Processing failed for {filename} (attempt {attempts[filename]}/{MAX_ATTEMPTS}), retrying in {delay:.0f}s: {error}")
+        retry_at[filename] = time.time() + delay
+        return
+    path = os.path.join(NEEDS_ACTION, filename)
+    failed = attempts.pop(filename)
+    first_seen.pop(filename, None)
+    retry_at.pop(filename, None)
+    if os.path.exists(path):
+        path = dead_letter(path, DEAD_LETTER, "summarize", error, failed)
+        meta = os.path.join(NEEDS_ACTION, f"FILE_{filename}.md")
+        if os.path.exists(meta):
+            move_to_folder(meta, DEAD_LETTER)
+    dashboard.record(filename, "file", "failed", str(error), path)
 
 def process_tasks():
     if not os.path.exists(NEEDS_ACTION):
         return False
 
-    files = [f for f in os.listdir(NEEDS_ACTION) if not f.startswith("FILE_") and os.path.isfile(os.path.join(NEEDS_ACTION, f))]
+    now = time.time()
+    files = [f for f in os.listdir(NEEDS_ACTION) if not f.startswith(("FILE_", ".")) and os.path.isfile(os.path.join(NEEDS_ACTION, f))
+             and retry_at.get(f, 0) <= now and not (batches and batches.has(f))]
     
     if not files:
         return False
 
+    # Highest priority first: the pool starts tasks in submission order
+    scores = {}
     for filename in files:
-        logger.info(f"Processing: {filename}")
-        src_path = os.path.join(NEEDS_ACTION, filename)
-        
-        # 1. Read content
-        try:
-            with open(src_path, "r", encoding="utf-8", errors="ignore") as f:
-                content = f.read()
-        except Exception as e:
-            content = f"Could not read content: {e}"
-
-        # 2. Generate Plan
-        plan_filename = f"PLAN_{filename}.md"
-        plan_path = os.path.join(PLANS, plan_filename)
-        with open(plan_path, "w", encoding="utf-8") as f:
-            f.write(f"# Plan for {filename}\n\n")
-            f.write(f"Task: AI Summarization of {filename}\n")
-            f.write(f"Execution: Use OpenAI to summarize and append to Dashboard.md.\n")
-        
-        # 3. Execute (Summarize into Dashboard)
-        summary = get_ai_summary(content)
-        with open(DASHBOARD, "a", encoding="utf-8") as f:
-            f.write(f"\n### {filename} (Processed at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')})\n")
-            f.write(f"**Summary:** {summary}\n")
-            f.write(f"**Original Location:** {src_path}\n")
-
-        # 4. Record prompt in PHR
-        record_filename = f"RECORD_{datetime.now().strftime('%Y%H%M%S')}_{filename}.md"
-        record_path = os.path.join(PHR, record_filename)
-        with open(record_path, "w", encoding="utf-8") as f:
-            f.write(f"# Prompt Record\n")
-            f.write(f"- **File:** {filename}\n")
-            f.write(f"- **Timestamp:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"- **Action:** AI Summarization\n")
-
-        # 5. Move to Done
-        dest_path = os.path.join(DONE, filename)
-        shutil.move(src_path, dest_path)
-        
-        # Also move the metadata file if it exists
-        meta_file = f"FILE_{filename}.md"
-        meta_src = os.path.join(NEEDS_ACTION, meta_file)
-        if os.path.exists(meta_src):
-            shutil.move(meta_src, os.path.join(DONE, meta_file))
-
-        logger.info(f"Successfully processed {filename}")
+        first_seen.setdefault(filename, now)
+        scores[filename] = priority_rules.score_file(os.path.join(NEEDS_ACTION, filename))
+    files.sort(key=lambda f: scores[f] + (now - first_seen[f]) / PRIORITY_AGING_SECONDS, reverse=True)
+
+    # Each file is handled end-to-end by one worker; different files run concurrently
+    with ThreadPoolExecutor(max_workers=AGENT_CONCURRENCY, thread_name_prefix="summarize") as executor:
+        futures = {executor.submit(run_file, filename, priority_class(scores[filename])): filename for filename in files}
+    for future, filename in futures.items():
+        error = future.exception()
+        if error is None:
+            first_seen.pop(filename, None)
+            attempts.pop(filename, None)
+            retry_at.pop(filename, None)
+        else:
+            handle_failure(filename, error)
+    logger.info(f"Queue wait by priority: {wait_stats}")
 
     return True
 
-if __name__ == "__main__":
+def run(stop):
+    """Processes Needs_Action until `stop` (a threading.Event) is set; the batch in flight finishes first."""
     for folder in [NEEDS_ACTION, DONE, PLANS, PHR]:
         if not os.path.exists(folder):
             os.makedirs(folder)
 
     logger.info("Agent Loop (Ralph Wiggum Mode) started. Monitoring Needs_Action...")
     logger.info(f"Directory: {NEEDS_ACTION}")
+    if cache:
+        logger.info(f"Response cache: {cache.stats()}")
+    # Batch jobs are submitted and polled on their own thread, stopped with this run
+    batch_stop = threading.Event()
+    if batches:
+        logger.info(f"Batch mode on for {', '.join(sorted(BATCH_PRIORITIES))} priority files.")
+        batch_thread = threading.Thread(target=batches.run, args=(batch_stop, finish_batched), name="batch")
+        batch_thread.start()
     
     try:
-        while True:
+        while not stop.is_set():
             processed = process_tasks()
             if not processed:
                 # Polling interval with minor heartbeat
-                time.sleep(5)
+                stop.wait(5)
             else:
                 logger.info("Tasks processed, checking for more...")
+    finally:
+        if batches:
+            batch_stop.set()
+            batch_thread.join()
+    logger.info("Agent Loop stopped.")
+
+if __name__ == "__main__":
+    try:
+        run(threading.Event())
     except KeyboardInterrupt:
         logger.info("Agent Loop stopped.")
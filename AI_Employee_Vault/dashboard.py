@@ -0,0 +1,156 @@
+import os
+import time
+import atexit
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from vault_storage import atomic_write
+
+logger = logging.getLogger("Dashboard")
+
+# Everything above this line in Dashboard.md is hand-written and kept as-is
+MARKER = "<!-- Activity below is generated by agent_loop.py; edit above this line only. -->"
+# Interim states; the item's final record replaces them, so each item is counted once
+PENDING_STATUSES = ("queued",)
+
+class Dashboard:
+    """Activity store that renders a bounded Dashboard.md.
+
+    Activity is recorded in SQLite. The note is regenerated atomically (temp file +
+    rename) from the last `recent` entries plus counters per channel and status.
+    Older entries are rotated into dated notes under Dashboard_Archive/. Renders are
+    coalesced: a burst of records within `flush_delay` seconds causes one rewrite.
+    A record replaces any earlier PENDING_STATUSES row for the same name.
+    """
+    def __init__(self, path, db_path, recent=20, flush_delay=2.0):
+        self.path = path
+        self.archive_dir = os.path.join(os.path.dirname(path), "Dashboard_Archive")
+        self.recent = recent
+        self.flush_delay = flush_delay
+        self.lock = threading.Lock()
+        self.render_lock = threading.Lock()
+        self.condition = threading.Condition()
+        self.last_record = None
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS activity (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                channel TEXT NOT NULL,
+                status TEXT NOT NULL,
+                summary TEXT,
+                location TEXT,
+                timestamp REAL NOT NULL,
+                archived INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        self.db.commit()
+
+        threading.Thread(target=self._run, name="dashboard-writer", daemon=True).start()
+        atexit.register(self.flush)
+
+    def record(self, name, channel, status, summary="", location=""):
+        with self.lock:
+            self.db.execute(
+                f"DELETE FROM activity WHERE name = ? AND status IN ({', '.join('?' * len(PENDING_STATUSES))})",
+                (name, *PENDING_STATUSES)
+            )
+            self.db.execute(
+                "INSERT INTO activity (name, channel, status, summary, location, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+                (name, channel, status, summary, location, time.time())
+            )
+            self.db.commit()
+        with self.condition:
+            self.last_record = time.monotonic()
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.last_record is None:
+                    self.condition.wait()
+                # Wait for the burst to go quiet before rewriting
+                while time.monotonic() - self.last_record < self.flush_delay:
+                    self.condition.wait(self.flush_delay - (time.monotonic() - self.last_record))
+                self.last_record = None
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Dashboard render failed: {e}")
+
+    def flush(self):
+        with self.render_lock:
+            header = self._read_header()
+            with self.lock:
+                self._rotate()
+                recent = self.db.execute(
+                    "SELECT name, channel, status, summary, location, timestamp FROM activity "
+                    "ORDER BY id DESC LIMIT ?", (self.recent,)
+                ).fetchall()
+                counters = self.db.execute(
+                    "SELECT channel, status, COUNT(*) FROM activity GROUP BY channel, status ORDER BY channel, status"
+                ).fetchall()
+            if not recent and not counters:
+                return
+
+            lines = [header.rstrip("\n"), "", MARKER, "", "## Activity Counters", "",
+                     "| Channel | Status | Count |", "| --- | --- | --- |"]
+            lines += [f"| {channel} | {status} | {count} |" for channel, status, count in counters]
+            lines += ["", f"## Latest {len(recent)} Items", ""]
+            for name, channel, status, summary, location, timestamp in recent:
+                processed_at = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+                lines.append(f"### {name} (Processed at {processed_at})")
+                lines.append(f"**Summary:** {summary}")
+                lines.append(f"**Original Location:** {location}")
+                lines.append("")
+            lines.append("Older items are archived in `Dashboard_Archive/`.")
+
+            atomic_write(self.path, "\n".join(lines) + "\n")
+
+    def _read_header(self):
+        """Returns the hand-written part of Dashboard.md, archiving any legacy appended sections."""
+        if not os.path.exists(self.path):
+            return "# AI Employee Dashboard\n"
+        with open(self.path, "r", encoding="utf-8") as f:
+            text = f.read()
+        if MARKER in text:
+            return text.split(MARKER, 1)[0]
+
+        # First run on an append-only dashboard: move the old "### file" sections out
+        cut = text.find("\n### ")
+        if cut == -1:
+            return text
+        self._append_archive(datetime.now().strftime("%Y-%m-%d"), text[cut:].strip("\n") + "\n")
+        return text[:cut + 1]
+
+    def _rotate(self):
+        """Moves entries that fell out of the recent window into Dashboard_Archive/<date>.md."""
+        rows = self.db.execute(
+            "SELECT id, name, summary, location, timestamp FROM activity WHERE archived = 0 "
+            "AND id NOT IN (SELECT id FROM activity ORDER BY id DESC LIMIT ?) ORDER BY id", (self.recent,)
+        ).fetchall()
+        if not rows:
+            return
+        by_day = {}
+        for _, name, summary, location, timestamp in rows:
+            when = datetime.fromtimestamp(timestamp)
+            by_day.setdefault(when.strftime("%Y-%m-%d"), []).append(
+                f"### {name} (Processed at {when.strftime('%Y-%m-%d %H:%M:%S')})\n"
+                f"**Summary:** {summary}\n**Original Location:** {location}\n"
+            )
+        for day, sections in by_day.items():
+            self._append_archive(day, "\n".join(sections))
+        self.db.executemany("UPDATE activity SET archived = 1 WHERE id = ?", [(row[0],) for row in rows])
+        self.db.commit()
+
+    def _append_archive(self, day, text):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"{day}.md")
+        new = not os.path.exists(path)
+        with open(path, "a", encoding="utf-8") as f:
+            if new:
+                f.write(f"---\ntags: [dashboard-archive]\ndate: {day}\n---\n# Dashboard Archive {day}\n")
+            f.write("\n" + text)
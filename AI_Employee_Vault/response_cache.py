@@ -0,0 +1,103 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger("ResponseCache")
+
+def normalize_content(text):
+    """Collapses whitespace only (line endings, runs of spaces, blank edges); every word is kept.
+
+    Quotes, forwards and signatures are content too: two messages that differ only
+    there can need different answers, so they must not share a cache entry.
+    """
+    lines = [" ".join(line.split()) for line in text.replace("\r\n", "\n").split("\n")]
+    return "\n".join(lines).strip()
+
+def cache_key(model, system_prompt, content, normalize=True):
+    """Key for a response; with `normalize` False the content is hashed exactly as given."""
+    digest = hashlib.sha256()
+    for part in (model, system_prompt, normalize_content(content) if normalize else content):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class ResponseCache:
+    """Persistent LLM response cache with TTL expiry and an LRU size cap.
+
+    Entries live in a small SQLite file inside the vault so cached answers survive
+    restarts. Hit/miss counters are persisted alongside them.
+    """
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, ttl_seconds=30 * 24 * 3600):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+            CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        """)
+        self.db.commit()
+
+    def _count(self, name):
+        self.db.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] > self.ttl_seconds:
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row:
+                self.db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                self._count("hits")
+            else:
+                self._count("misses")
+            self.db.commit()
+        return row[0] if row else None
+
+    def put(self, key, value):
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now)
+            )
+            self._evict(now)
+            self.db.commit()
+
+    def _evict(self, now):
+        self.db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        logger.info(f"Evicted {evicted} least recently used cache entries")
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.db.execute("SELECT name, value FROM counters").fetchall())
+            entries, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": counters.get("hits", 0), "misses": counters.get("misses", 0), "entries": entries, "bytes": size}
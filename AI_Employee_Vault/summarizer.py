@@ -0,0 +1,152 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from rate_limiter import rate_limited_call
+from response_cache import cache_key
+from metrics import LLM_CALLS, record_llm_call
+from resilience import breaker, retry_call
+
+logger = logging.getLogger("Summarizer")
+
+# Rough English average; good enough to keep chunks well inside the context window
+CHARS_PER_TOKEN = 4
+
+REDUCE_PROMPT = (
+    "You are a helpful AI employee. The following are summaries of consecutive parts of one document. "
+    "Merge them into a single concise summary of the whole document."
+)
+
+def iter_chunks(path, max_tokens):
+    """Yields the file as consecutive chunks of at most ~max_tokens, split on line boundaries.
+
+    Chunks are packed greedily from the start of the file, so appending to a file
+    leaves every earlier chunk byte-for-byte identical (and therefore cached).
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    chunk = []
+    size = 0
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            # Very long lines (minified logs, single-paragraph PDFs) are hard-split
+            while len(line) > max_chars:
+                if chunk:
+                    yield "".join(chunk)
+                    chunk, size = [], 0
+                yield line[:max_chars]
+                line = line[max_chars:]
+            if size + len(line) > max_chars and chunk:
+                yield "".join(chunk)
+                chunk, size = [], 0
+            chunk.append(line)
+            size += len(line)
+    if chunk:
+        yield "".join(chunk)
+
+class SummaryStats:
+    """Token usage and latency for one document, filled in by concurrent chunk calls."""
+    def __init__(self):
+        self.chunks = 0
+        self.cached = 0
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.seconds = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, usage):
+        with self.lock:
+            self.calls += 1
+            if usage is not None:
+                self.prompt_tokens += usage.prompt_tokens or 0
+                self.completion_tokens += usage.completion_tokens or 0
+
+    def hit(self):
+        with self.lock:
+            self.cached += 1
+
+    def __str__(self):
+        return (
+            f"{self.chunks} chunks, {self.calls} API calls, {self.cached} cache hits, "
+            f"{self.prompt_tokens} prompt + {self.completion_tokens} completion tokens, {self.seconds:.1f}s"
+        )
+
+class Summarizer:
+    """Map-reduce summarization of documents of any size.
+
+    The file is read as a stream of token-bounded chunks. Chunks are summarized
+    concurrently (through the shared rate limiter), then the partial summaries are
+    merged `fanout` at a time until one remains. Every call goes through the response
+    cache, so re-processing an appended file only pays for the new chunks and the
+    merge steps above them. Calls go through the `circuit` breaker (the shared
+    "openai" one by default), so an outage fails fast instead of being hammered.
+    """
+    def __init__(self, client, bucket, cache, model, prompt, chunk_tokens=2000, fanout=8, concurrency=4, circuit=None):
+        self.client = client
+        self.circuit = circuit or breaker("openai")
+        self.bucket = bucket
+        self.cache = cache
+        self.model = model
+        self.prompt = prompt
+        self.chunk_tokens = chunk_tokens
+        self.fanout = fanout
+        self.concurrency = concurrency
+
+    def _complete(self, system_prompt, content, stats):
+        # Exact content: chunks of logs or notes that differ only in whitespace may still mean different things
+        key = cache_key(self.model, system_prompt, content, normalize=False)
+        if self.cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                stats.hit()
+                LLM_CALLS.inc(model=self.model, result="cache")
+                return cached
+
+        started = time.perf_counter()
+        try:
+            # Transient errors are retried with backoff; an open circuit fails at once
+            response = retry_call(
+                self.circuit,
+                rate_limited_call,
+                self.bucket,
+                self.client.chat.completions.create,
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": content}
+                ]
+            )
+        except Exception:
+            LLM_CALLS.inc(model=self.model, result="error")
+            raise
+        usage = getattr(response, "usage", None)
+        record_llm_call(self.model, time.perf_counter() - started, usage)
+        stats.add(usage)
+        result = response.choices[0].message.content
+        if self.cache:
+            self.cache.put(key, result)
+        return result
+
+    def summarize_file(self, path):
+        """Returns (summary, SummaryStats) for the file at `path`."""
+        stats = SummaryStats()
+        started = time.perf_counter()
+        # Bounds how many chunks are read ahead of the workers, so a huge file is never fully in memory
+        window = threading.BoundedSemaphore(self.concurrency * 2)
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="chunk") as pool:
+            futures = []
+            for chunk in iter_chunks(path, self.chunk_tokens):
+                window.acquire()
+                future = pool.submit(self._complete, self.prompt, chunk, stats)
+                future.add_done_callback(lambda _: window.release())
+                futures.append(future)
+            stats.chunks = len(futures)
+            summaries = [future.result() for future in futures]
+
+            while len(summaries) > 1:
+                groups = [summaries[i:i + self.fanout] for i in range(0, len(summaries), self.fanout)]
+                futures = [pool.submit(self._complete, REDUCE_PROMPT, "\n\n".join(group), stats)
+                           if len(group) > 1 else None for group in groups]
+                summaries = [future.result() if future else group[0] for future, group in zip(futures, groups)]
+        stats.seconds = time.perf_counter() - started
+        return (summaries[0] if summaries else ""), stats
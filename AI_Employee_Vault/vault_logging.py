@@ -0,0 +1,266 @@
+import os
+import re
+import copy
+import json
+import time
+import zlib
+import queue
+import atexit
+import select
+import socket
+import logging
+import threading
+import contextvars
+import socketserver
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Each log file rolls over at this size or at midnight, keeping LOG_BACKUPS old files
+LOG_MAX_BYTES = int(float(os.getenv("LOG_MAX_MB", "10")) * 1024 * 1024)
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "7"))
+
+# Every process of a vault sends its records to one local collector, which alone writes
+# the files. The default port is derived from the vault path, so two vaults never share
+# one; "0" turns the collector off and each process writes <name>.<pid>.jsonl itself.
+COLLECTOR_HOST = "127.0.0.1"
+COLLECTOR_PORT = os.getenv("LOG_COLLECTOR_PORT")
+RECONNECT_SECONDS = 5
+
+CONSOLE_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+LOG_NAME = re.compile(r"^[\w.-]+$")
+# Standard LogRecord attributes; anything else came from `extra=` or log_context
+RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_context = contextvars.ContextVar("log_context", default={})
+_listener = None
+
+def collector_port(log_dir):
+    if COLLECTOR_PORT is not None:
+        return int(COLLECTOR_PORT)
+    return 20000 + zlib.crc32(os.path.abspath(log_dir).encode("utf-8")) % 20000
+
+@contextmanager
+def log_context(**fields):
+    """Adds fields (task_id, file, stage, ...) to every record logged inside the block."""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+@contextmanager
+def timed(logger, stage, **fields):
+    """Tags records in the block with `stage`, then logs its duration_ms (status=error if it raised).
+
+    `fields` are added to that final record only.
+    """
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        with log_context(stage=stage):
+            yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"{stage} {status} in {duration_ms:.0f} ms",
+                    extra={"stage": stage, "duration_ms": duration_ms, "status": status, **fields})
+
+class ContextFilter(logging.Filter):
+    """Copies the log_context fields onto each record, in the thread that logged it."""
+    def filter(self, record):
+        for key, value in _context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, plus any context and extra fields."""
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in RESERVED:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class BackgroundQueueHandler(QueueHandler):
+    """Only enqueues; formatting of tracebacks is the one cost left on the logging thread."""
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class RotatingLogHandler(RotatingFileHandler):
+    """Rolls over at `max_bytes` or when the day changes, whichever comes first."""
+    def __init__(self, path, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+        super().__init__(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8", delay=True)
+        self.setFormatter(logging.Formatter("%(message)s"))
+        try:
+            self.day = datetime.fromtimestamp(os.path.getmtime(path)).strftime("%Y-%m-%d")
+        except OSError:
+            self.day = datetime.now().strftime("%Y-%m-%d")
+
+    def shouldRollover(self, record):
+        if datetime.now().strftime("%Y-%m-%d") != self.day and os.path.exists(self.baseFilename):
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.day = datetime.now().strftime("%Y-%m-%d")
+
+class LogWriter:
+    """Appends JSON lines to <log_dir>/<name>.jsonl, one rotating file per name."""
+    def __init__(self, log_dir):
+        self.log_dir = log_dir
+        self.files = {}
+        self.lock = threading.Lock()
+
+    def write(self, name, line):
+        with self.lock:
+            handler = self.files.get(name)
+            if handler is None:
+                handler = self.files[name] = RotatingLogHandler(os.path.join(self.log_dir, f"{name}.jsonl"))
+        handler.handle(logging.makeLogRecord({"msg": line}))
+
+class CollectorRequestHandler(socketserver.StreamRequestHandler):
+    """Protocol: a "vault <log_dir>" greeting answered with "ok", then "<name>\\t<json>" lines."""
+    def handle(self):
+        greeting = self.rfile.readline().decode("utf-8", errors="replace").rstrip("\n")
+        if greeting != f"vault {self.server.writer.log_dir}":
+            return
+        self.wfile.write(b"ok\n")
+        for raw in self.rfile:
+            name, _, line = raw.decode("utf-8", errors="replace").rstrip("\n").partition("\t")
+            if line and LOG_NAME.match(name):
+                self.server.writer.write(name, line)
+
+class Collector(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    # Windows lets a second process bind a SO_REUSEADDR port, which would split the logs
+    allow_reuse_address = os.name != "nt"
+
+    def __init__(self, port, writer):
+        super().__init__((COLLECTOR_HOST, port), CollectorRequestHandler)
+        self.writer = writer
+
+class CollectorSink(logging.Handler):
+    """Writes this process's records through the vault's collector.
+
+    The first process to start becomes the collector; the others connect to it. If
+    the collector goes away, the next process to notice takes over. Records that
+    cannot reach any collector go to a per-process file instead of being lost.
+    Only the QueueListener thread calls emit, so no I/O happens on logging threads.
+    """
+    def __init__(self, log_dir, name):
+        super().__init__()
+        self.setFormatter(JsonFormatter())
+        self.log_dir = os.path.abspath(log_dir)
+        self.name = name
+        self.port = collector_port(log_dir)
+        self.writer = None
+        self.sock = None
+        self.retry_at = 0
+        self.fallback = None
+
+    def _connect(self):
+        """Joins the running collector, or becomes it; returns True if either worked."""
+        for _ in range(2):
+            try:
+                sock = socket.create_connection((COLLECTOR_HOST, self.port), timeout=2)
+                sock.sendall(f"vault {self.log_dir}\n".encode("utf-8"))
+                if sock.makefile("rb").readline() == b"ok\n":
+                    self.sock = sock
+                    return True
+                sock.close()
+                return False
+            except OSError:
+                pass
+            try:
+                writer = LogWriter(self.log_dir)
+                collector = Collector(self.port, writer)
+            except OSError:
+                # Another process bound the port between our two attempts; join it instead
+                continue
+            threading.Thread(target=collector.serve_forever, name="log-collector", daemon=True).start()
+            self.writer = writer
+            return True
+        return False
+
+    def emit(self, record):
+        try:
+            line = self.format(record)
+            # At most: send fails, reconnect (or take over), send again
+            for _ in range(3):
+                if self.writer is not None:
+                    self.writer.write(self.name, line)
+                    return
+                if self.sock is None:
+                    if not self.port or time.monotonic() < self.retry_at:
+                        break
+                    if not self._connect():
+                        self.retry_at = time.monotonic() + RECONNECT_SECONDS
+                        break
+                    continue
+                try:
+                    # The collector never writes after its greeting, so a readable socket means it
+                    # closed; sending into it would succeed locally and lose the record
+                    if select.select([self.sock], [], [], 0)[0]:
+                        raise ConnectionResetError("Log collector closed the connection")
+                    self.sock.sendall(f"{self.name}\t{line}\n".encode("utf-8"))
+                    return
+                except OSError:
+                    self.sock.close()
+                    self.sock = None
+            if self.fallback is None:
+                self.fallback = LogWriter(self.log_dir)
+            self.fallback.write(f"{self.name}.{os.getpid()}", line)
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        super().close()
+
+def setup_logging(log_dir, name, level=logging.INFO):
+    """Sends all logging through a background queue to the console and <log_dir>/<name>.jsonl.
+
+    Callers only enqueue the record; formatting, console output and file or socket
+    writes happen on the listener thread. Like basicConfig, only the first call in a
+    process has any effect, so under the supervisor every component shares its log.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    os.makedirs(log_dir, exist_ok=True)
+
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+    records = queue.SimpleQueue()
+    handler = BackgroundQueueHandler(records)
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level)
+    _listener = QueueListener(records, console, CollectorSink(log_dir, name), respect_handler_level=True)
+    _listener.start()
+    # Flushes whatever is still queued when the process exits
+    atexit.register(_listener.stop)
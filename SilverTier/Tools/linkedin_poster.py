@@ -1,7 +1,12 @@
 import os
+import sys
+import json
+import time
+import socket
 import asyncio
+import logging
 from dotenv import load_dotenv
-from playwright.async_api import async_playwright
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
 
 # Configuration
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -9,37 +14,184 @@ load_dotenv(os.path.join(BASE_DIR, ".env"))
 
 LINKEDIN_USER = os.getenv("LINKEDIN_USER")
 LINKEDIN_PASSWORD = os.getenv("LINKEDIN_PASSWORD")
+# Overridable so the poster can be exercised against a local page with the same selectors
+LINKEDIN_BASE_URL = os.getenv("LINKEDIN_BASE_URL", "https://www.linkedin.com").rstrip("/")
+LINKEDIN_HEADLESS = os.getenv("LINKEDIN_HEADLESS", "false").lower() == "true"
+# Cookies/local storage from the last login, reused so each post skips the login form
+STATE_PATH = os.path.join(BASE_DIR, ".cache", "linkedin_state.json")
 
-async def post_to_linkedin(content):
-    if not LINKEDIN_USER or not LINKEDIN_PASSWORD:
-        print("Error: LinkedIn credentials not set.")
-        return
+# Local job socket for the long-running poster service
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = int(os.getenv("LINKEDIN_SERVICE_PORT", "8790"))
+
+SHARE_TRIGGER = ".share-box-feed-entry__trigger"
+EDITOR = ".ql-editor"
+POST_BUTTON = ".share-actions__primary-action"
+
+logger = logging.getLogger("LinkedInPoster")
+
+class LinkedInPoster:
+    """Keeps one browser context (and login session) alive across posts."""
+    def __init__(self, headless=LINKEDIN_HEADLESS):
+        self.headless = headless
+        self.playwright = None
+        self.browser = None
+        self.context = None
+        self.page = None
+
+    async def start(self):
+        self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.launch(headless=self.headless)
+        storage_state = STATE_PATH if os.path.exists(STATE_PATH) else None
+        self.context = await self.browser.new_context(storage_state=storage_state)
+        self.page = await self.context.new_page()
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False) # Headed for visibility/login help
-        page = await browser.new_page()
-        
-        await page.goto("https://www.linkedin.com/login")
+    async def login(self):
+        page = self.page
+        await page.goto(f"{LINKEDIN_BASE_URL}/login")
         await page.fill("#username", LINKEDIN_USER)
         await page.fill("#password", LINKEDIN_PASSWORD)
         await page.click("button[type='submit']")
-        
-        await page.wait_for_selector(".share-box-feed-entry__trigger")
-        await page.click(".share-box-feed-entry__trigger")
-        
-        await page.wait_for_selector(".ql-editor")
-        await page.fill(".ql-editor", content)
-        
-        await page.click(".share-actions__primary-action")
-        await asyncio.sleep(5)
-        
-        await browser.close()
-        print("Successfully posted to LinkedIn")
+        # Headed runs may need a manual 2FA step, so allow time for it
+        await page.wait_for_selector(SHARE_TRIGGER, timeout=30000 if self.headless else 120000)
+        os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
+        await self.context.storage_state(path=STATE_PATH)
+        logger.info("Logged in to LinkedIn, session state saved.")
+
+    async def post(self, content):
+        """Publishes one post and returns per-stage timings in seconds."""
+        timings = {}
+        page = self.page
+
+        started = time.perf_counter()
+        await page.goto(f"{LINKEDIN_BASE_URL}/feed/")
+        try:
+            await page.wait_for_selector(SHARE_TRIGGER, timeout=10000)
+        except PlaywrightTimeoutError:
+            await self.login()
+        timings["session"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await page.click(SHARE_TRIGGER)
+        await page.wait_for_selector(EDITOR)
+        timings["open_editor"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await page.fill(EDITOR, content)
+        timings["fill"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await page.click(POST_BUTTON)
+        # The share dialog closes once the post is accepted
+        await page.wait_for_selector(EDITOR, state="detached", timeout=30000)
+        timings["submit"] = time.perf_counter() - started
+        return timings
+
+    async def close(self):
+        if self.browser:
+            await self.browser.close()
+        if self.playwright:
+            await self.playwright.stop()
+
+async def post_to_linkedin(content):
+    """One-off post in a fresh browser session. Returns True only once LinkedIn accepted the post."""
+    if not LINKEDIN_USER or not LINKEDIN_PASSWORD:
+        print("Error: LinkedIn credentials not set.")
+        return False
+
+    poster = LinkedInPoster()
+    await poster.start()
+    try:
+        timings = await poster.post(content)
+    except Exception as e:
+        print(f"Error: LinkedIn post failed: {e}")
+        return False
+    finally:
+        await poster.close()
+    print(f"Successfully posted to LinkedIn ({format_timings(timings)})")
+    return True
+
+def format_timings(timings):
+    return ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items())
+
+async def serve():
+    """Long-running poster: one JSON job per line over a local socket, posted in arrival order."""
+    poster = LinkedInPoster()
+    await poster.start()
+    jobs = asyncio.Queue()
+
+    async def worker():
+        while True:
+            content, reply = await jobs.get()
+            try:
+                timings = await poster.post(content)
+                logger.info(f"Posted to LinkedIn ({format_timings(timings)})")
+                reply.set_result({"ok": True, "timings": timings})
+            except Exception as e:
+                logger.error(f"LinkedIn post failed: {e}")
+                reply.set_result({"ok": False, "error": str(e)})
+
+    async def handle(reader, writer):
+        try:
+            line = await reader.readline()
+            job = json.loads(line)
+            reply = asyncio.get_running_loop().create_future()
+            await jobs.put((job["content"], reply))
+            writer.write(json.dumps(await reply).encode("utf-8") + b"\n")
+            await writer.drain()
+        except (ValueError, KeyError) as e:
+            writer.write(json.dumps({"ok": False, "error": f"Bad job: {e}"}).encode("utf-8") + b"\n")
+        finally:
+            writer.close()
+
+    worker_task = asyncio.create_task(worker())
+    server = await asyncio.start_server(handle, SERVICE_HOST, SERVICE_PORT)
+    logger.info(f"LinkedIn poster service listening on {SERVICE_HOST}:{SERVICE_PORT} (headless={LINKEDIN_HEADLESS})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        worker_task.cancel()
+        await poster.close()
+
+class PostOutcomeUnknown(Exception):
+    """The job was handed to the poster service but no answer came back; the post may be live."""
+
+def submit_post(content, timeout=300):
+    """Client for the poster service.
+
+    Raises ConnectionRefusedError if the service is not running, so nothing was sent.
+    Any failure after the job is sent raises PostOutcomeUnknown instead: the service
+    may still publish it, so it must not be posted again.
+    """
+    with socket.create_connection((SERVICE_HOST, SERVICE_PORT), timeout=timeout) as sock:
+        try:
+            sock.sendall(json.dumps({"content": content}).encode("utf-8") + b"\n")
+            response = sock.makefile("rb").readline()
+        except OSError as e:
+            raise PostOutcomeUnknown(f"No answer from the LinkedIn poster service: {e}") from e
+    if not response:
+        raise PostOutcomeUnknown("LinkedIn poster service closed the connection without answering")
+    return json.loads(response)
 
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) > 1:
-        content = sys.argv[1]
-        asyncio.run(post_to_linkedin(content))
+    sys.path.append(BASE_DIR)
+    from vault_logging import setup_logging
+    setup_logging(os.path.join(BASE_DIR, "Logs"), "linkedin")
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve":
+        if not LINKEDIN_USER or not LINKEDIN_PASSWORD:
+            print("Error: LinkedIn credentials not set.")
+            sys.exit(1)
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            logger.info("LinkedIn poster service stopped.")
+    elif len(sys.argv) > 1:
+        # "-" reads the post from stdin, so multi-line content need not fit in argv
+        content = sys.stdin.read() if sys.argv[1] == "-" else sys.argv[1]
+        # The orchestrator's fallback counts the post as sent only on exit status 0
+        if not asyncio.run(post_to_linkedin(content)):
+            sys.exit(1)
     else:
         print("No content provided.")
+        sys.exit(1)
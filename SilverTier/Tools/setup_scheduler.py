@@ -1,26 +1,30 @@
 import os
+import sys
 import platform
 import subprocess
 
+# The supervisor (main.py) runs every watcher and loop and restarts crashed ones itself,
+# so it is started once at logon/boot instead of being cold-started on a timer.
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN_PATH = os.path.join(BASE_DIR, "main.py")
+
 def setup_windows_task():
     print("Setting up Windows Task Scheduler...")
-    # Example: Create a task that runs every hour
-    # schtasks /create /tn "DigitalFTE_Watcher" /tr "python f:\\ai_dd\\digital_fte\\SilverTier\\Watchers\\gmail_watcher.py" /sc hourly
-    script_path = os.path.join(os.getcwd(), "Watchers", "gmail_watcher.py")
-    cmd = f'schtasks /create /tn "DigitalFTE_GmailWatcher" /tr "python {script_path}" /sc minute /mo 5 /f'
+    cmd = f'schtasks /create /tn "DigitalFTE_Supervisor" /tr "\\"{sys.executable}\\" \\"{MAIN_PATH}\\"" /sc onlogon /f'
     try:
         subprocess.run(cmd, shell=True, check=True)
-        print("Successfully created Windows Task: DigitalFTE_GmailWatcher (every 5 mins)")
+        print("Successfully created Windows Task: DigitalFTE_Supervisor (at logon)")
     except Exception as e:
         print(f"Failed to create task: {e}")
 
 def setup_cron():
     print("Setting up Cron job (Linux/macOS)...")
-    # Not implemented for Windows, but provided for reference
-    pass
+    # Printed rather than installed, so an existing crontab is never overwritten
+    print("Add this line with `crontab -e`:")
+    print(f"@reboot cd {BASE_DIR} && {sys.executable} {MAIN_PATH}")
 
 if __name__ == "__main__":
     if platform.system() == "Windows":
         setup_windows_task()
     else:
-        print("Unsupported OS for auto-setup. Please add to your crontab manually.")
+        setup_cron()
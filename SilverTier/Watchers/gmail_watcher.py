@@ -1,89 +1,559 @@
 import os
+import re
+import sys
+import json
 import time
+import quopri
+import base64
+import itertools
+import ssl
+import select
 import imaplib
-import email
 import logging
-from datetime import datetime
+import threading
+from email import policy
+from email.parser import BytesFeedParser
 from dotenv import load_dotenv
 
 # Configuration
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 load_dotenv(os.path.join(BASE_DIR, ".env"))
+sys.path.append(BASE_DIR)
+from ingest import SeenSet, hash_parts, new_id
+from vault_storage import atomic_open, atomic_write, write_new
+from vault_logging import setup_logging
+from metrics import INTAKE_LAG
+from resilience import CircuitOpenError, breaker, backoff_delay
 
 GMAIL_USER = os.getenv("GMAIL_USER")
 GMAIL_APP_PASSWORD = os.getenv("GMAIL_APP_PASSWORD")
 INBOX_DIR = os.path.join(BASE_DIR, "Inbox")
+
+# IMAP endpoint (overridable so the watcher can run against a local stand-in server)
+IMAP_HOST = os.getenv("IMAP_HOST", "imap.gmail.com")
+IMAP_PORT = int(os.getenv("IMAP_PORT", "993"))
+IMAP_SSL = os.getenv("IMAP_SSL", "true").lower() == "true"
+
+# "idle" keeps one session open and waits for push notifications, "poll" reconnects every 60s
+WATCH_MODE = os.getenv("GMAIL_WATCH_MODE", "idle").lower()
+POLL_INTERVAL = 60
+# Gmail drops IDLE after ~29 minutes; re-issue well before that
+IDLE_TIMEOUT = int(os.getenv("GMAIL_IDLE_SECONDS", "540"))
+MAX_BACKOFF = 300
+# IDLE waits are sliced so a shutdown request is noticed within this many seconds
+STOP_CHECK_SECONDS = 1
+
+# UIDVALIDITY/UID high-water mark, so each cycle only asks for mail newer than the last one saved
+STATE_PATH = os.path.join(BASE_DIR, ".cache", "gmail_state.json")
+# Messages per UID FETCH round trip
+FETCH_BATCH = int(os.getenv("GMAIL_FETCH_BATCH", "100"))
+# A message that fails this many times in a row (fetched alone) is skipped; it stays unread in Gmail
+MAX_UID_FAILURES = 3
+
+# Bodies are fetched with a partial range, so a huge message never lands in memory whole
+MAX_BODY_BYTES = int(os.getenv("GMAIL_MAX_BODY_BYTES", str(1024 * 1024)))
+# Attachments are streamed to Attachments/<email>/ in ranged chunks when enabled
+SAVE_ATTACHMENTS = os.getenv("GMAIL_SAVE_ATTACHMENTS", "false").lower() == "true"
+ATTACHMENTS_DIR = os.path.join(BASE_DIR, "Attachments")
+MAX_ATTACHMENT_BYTES = int(float(os.getenv("GMAIL_MAX_ATTACHMENT_MB", "25")) * 1024 * 1024)
+CHUNK_BYTES = 256 * 1024
 LOG_DIR = os.path.join(BASE_DIR, "Logs")
 
-if not os.path.exists(LOG_DIR):
-    os.makedirs(LOG_DIR)
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler(os.path.join(LOG_DIR, "watchers.log")),
-        logging.StreamHandler()
-    ]
-)
+setup_logging(LOG_DIR, "watchers")
 logger = logging.getLogger("GmailWatcher")
 
-def check_gmail():
-    if not GMAIL_USER or not GMAIL_APP_PASSWORD:
-        logger.error("GMAIL_USER or GMAIL_APP_PASSWORD not set.")
+# Shared with the filesystem watcher, so the same message is never ingested twice
+seen = SeenSet()
+imap_circuit = breaker("imap")
+
+def open_mailbox():
+    mail = imaplib.IMAP4_SSL(IMAP_HOST, IMAP_PORT) if IMAP_SSL else imaplib.IMAP4(IMAP_HOST, IMAP_PORT)
+    mail.login(GMAIL_USER, GMAIL_APP_PASSWORD)
+    mail.select("inbox")
+    return mail
+
+def load_state():
+    try:
+        with open(STATE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"uidvalidity": None, "last_uid": 0}
+
+def save_state(state):
+    atomic_write(STATE_PATH, json.dumps(state))
+
+def uid_set(uids):
+    """Compresses sorted UIDs into an IMAP sequence set, e.g. [3, 4, 5, 9] -> "3:5,9"."""
+    ranges = []
+    for uid in uids:
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ",".join(str(a) if a == b else f"{a}:{b}" for a, b in ranges)
+
+TOKEN = re.compile(rb'\(|\)|"(?:[^"\\]|\\.)*"|[^\s()"]+')
+
+def parse_sexp(data):
+    """Parses an IMAP parenthesized list (as in BODYSTRUCTURE) into nested Python lists."""
+    stack = [[]]
+    for token in TOKEN.findall(data):
+        if token == b"(":
+            stack.append([])
+        elif token == b")":
+            # Ignore the closing paren of the enclosing FETCH response
+            if len(stack) > 1:
+                done = stack.pop()
+                stack[-1].append(done)
+        elif token.startswith(b'"'):
+            stack[-1].append(re.sub(rb"\\(.)", rb"\1", token[1:-1]).decode(errors="replace"))
+        elif token.upper() == b"NIL":
+            stack[-1].append(None)
+        else:
+            stack[-1].append(token.decode(errors="replace"))
+    return stack[0]
+
+def walk_parts(structure, section=""):
+    """Flattens a parsed BODYSTRUCTURE into leaf part descriptions with their section numbers."""
+    if isinstance(structure[0], list):
+        # Child parts come first, followed by the subtype and extension data
+        for i, child in enumerate(itertools.takewhile(lambda item: isinstance(item, list), structure), 1):
+            yield from walk_parts(child, f"{section}.{i}" if section else str(i))
         return
 
+    maintype, subtype = str(structure[0]).lower(), str(structure[1]).lower()
+    params = dict(zip(
+        [str(key).lower() for key in (structure[2] or [])[::2]],
+        (structure[2] or [])[1::2]
+    ))
+    # Extension data follows the type-specific fields: text has a line count, message/rfc822 three more
+    extension = 8 if maintype == "text" else 10 if (maintype, subtype) == ("message", "rfc822") else 7
+    disposition = structure[extension + 1] if len(structure) > extension + 1 else None
+    filename = params.get("name")
+    if isinstance(disposition, list) and len(disposition) > 1 and isinstance(disposition[1], list):
+        for key, value in zip(disposition[1][::2], disposition[1][1::2]):
+            if str(key).lower() == "filename":
+                filename = value
+
+    yield {
+        "section": section or "1",
+        "type": f"{maintype}/{subtype}",
+        "encoding": str(structure[5] or "7bit").lower(),
+        "charset": params.get("charset") or "utf-8",
+        "size": int(structure[6]) if str(structure[6]).isdigit() else 0,
+        "filename": filename,
+    }
+
+def find_text_part(parts):
+    for part in parts:
+        if part["type"] == "text/plain" and not part["filename"]:
+            return part
+    return None
+
+def parse_fetch_response(data):
+    """Groups a UID FETCH response into {uid: {"meta": bytes, "BODY[...]": literal, ...}}."""
+    messages = {}
+    current = None
+    for item in data:
+        head, literal = item if isinstance(item, tuple) else (item, None)
+        if head is None:
+            continue
+        if re.match(rb"^\d+ \(", head):
+            current = {"meta": b""}
+            messages[id(current)] = current
+        if current is None:
+            continue
+        current["meta"] += head
+        if literal is not None:
+            name = re.search(rb"(BODY\[[^\]]*\])(?:<\d+>)? \{\d+\}$", head)
+            if name:
+                current[name.group(1).decode()] = literal
+    result = {}
+    for message in messages.values():
+        uid = re.search(rb"UID (\d+)", message["meta"])
+        if uid:
+            result[int(uid.group(1))] = message
+    return result
+
+class TransferDecoder:
+    """Incrementally undoes a Content-Transfer-Encoding across arbitrary chunk boundaries."""
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self.pending = b""
+
+    def feed(self, data):
+        if self.encoding == "base64":
+            data = self.pending + re.sub(rb"\s+", b"", data)
+            usable = len(data) - len(data) % 4
+            self.pending = data[usable:]
+            return base64.b64decode(data[:usable])
+        if self.encoding == "quoted-printable":
+            # Only decode complete lines, so a soft break or =XX escape is never split
+            data = self.pending + data
+            cut = data.rfind(b"\n") + 1
+            self.pending = data[cut:]
+            return quopri.decodestring(data[:cut])
+        return data
+
+    def flush(self):
+        if self.encoding == "base64":
+            data = self.pending + b"=" * (-len(self.pending) % 4)
+            return base64.b64decode(data) if self.pending else b""
+        if self.encoding == "quoted-printable":
+            return quopri.decodestring(self.pending)
+        return b""
+
+def decode_text(payload, part):
+    decoder = TransferDecoder(part["encoding"])
+    raw = decoder.feed(payload)
+    try:
+        raw += decoder.flush()
+    except ValueError:
+        # A range-truncated base64 body can end mid-quantum; drop the incomplete tail
+        pass
+    try:
+        return raw.decode(part["charset"], errors="replace")
+    except LookupError:
+        return raw.decode("utf-8", errors="replace")
+
+def parse_headers(header_bytes):
+    parser = BytesFeedParser(policy=policy.default)
+    parser.feed(header_bytes)
+    return parser.close()
+
+def stream_attachment(mail, uid, part, dest_dir):
+    """Downloads one attachment in CHUNK_BYTES ranges, decoding straight to disk."""
+    os.makedirs(dest_dir, exist_ok=True)
+    filename = os.path.basename(part["filename"]) or f"part_{part['section']}"
+    path = os.path.join(dest_dir, filename)
+    decoder = TransferDecoder(part["encoding"])
+    offset = 0
+    with atomic_open(path, "wb") as f:
+        while True:
+            result, data = mail.uid("FETCH", str(uid), f"(UID BODY.PEEK[{part['section']}]<{offset}.{CHUNK_BYTES}>)")
+            chunk = parse_fetch_response(data).get(uid, {}).get(f"BODY[{part['section']}]", b"") if result == "OK" else b""
+            f.write(decoder.feed(chunk))
+            offset += len(chunk)
+            if len(chunk) < CHUNK_BYTES:
+                break
+        f.write(decoder.flush())
+    return path
+
+def save_email(mail, uid, header_bytes, body, attachments):
+    headers = parse_headers(header_bytes)
+    subject = headers["Subject"]
+    sender = headers["From"]
+    date = headers["Date"]
+
+    # Message-ID survives re-delivery and UIDVALIDITY resets; fall back to the content itself
+    message_id = headers["Message-ID"]
+    digest = hash_parts("message-id", message_id.strip()) if message_id else hash_parts(header_bytes, body)
+    name = new_id("EMAIL")
+    if not seen.add(digest, f"{name}.md", "gmail"):
+        logger.info(f"Skipped duplicate email UID {uid} (already saved as {seen.first_name(digest)})")
+        return
     try:
-        mail = imaplib.IMAP4_SSL("imap.gmail.com")
-        mail.login(GMAIL_USER, GMAIL_APP_PASSWORD)
-        mail.select("inbox")
+        write_email(mail, uid, name, sender, subject, date, body, attachments)
+    except Exception:
+        seen.discard(digest)
+        raise
+    # Sent time per the Date header (parsed by the email policy) to saved in Inbox
+    sent = getattr(date, "datetime", None)
+    if sent is not None and sent.tzinfo is not None:
+        INTAKE_LAG.observe(max(0.0, time.time() - sent.timestamp()), source="gmail")
+
+def write_email(mail, uid, name, sender, subject, date, body, attachments):
+    saved = []
+    for part in attachments:
+        if part["size"] > MAX_ATTACHMENT_BYTES:
+            saved.append(f"{part['filename']} (skipped, {part['size'] // 1024} KB)")
+            continue
+        path = stream_attachment(mail, uid, part, os.path.join(ATTACHMENTS_DIR, name))
+        saved.append(os.path.relpath(path, BASE_DIR).replace(os.sep, "/"))
+
+    lines = [f"# New Email from {sender}\n\n", f"- **Subject:** {subject}\n", f"- **Date:** {date}\n"]
+    lines += [f"- **Attachment:** {attachment}\n" for attachment in saved]
+    lines.append(f"\n## Content\n\n{body}\n")
+    # Written only now, so the agent loop never sees the note before its attachments exist, and
+    # through a hidden temp file, so its name in Inbox never shows a partial note
+    filepath = write_new(INBOX_DIR, f"{name}.md", "".join(lines))
+    filename = os.path.basename(filepath)
+    
+    logger.info(f"Saved new email to Inbox: {filename}")
 
-        result, data = mail.search(None, "UNSEEN")
+def fetch_batch(mail, uids):
+    """Fetches headers and the plain-text part for a batch of UIDs in a few round trips.
+
+    Returns the highest UID up to which every message was saved (None if not even the
+    first was), so a message the server failed to return is fetched again next cycle.
+    """
+    # 1. One round trip for every message's structure
+    result, data = mail.uid("FETCH", uid_set(uids), "(UID BODYSTRUCTURE)")
+    if result != "OK":
+        raise imaplib.IMAP4.error(f"Could not fetch message structure for {uid_set(uids)}.")
+    structures = {}
+    for uid, message in parse_fetch_response(data).items():
+        structure = message["meta"].split(b"BODYSTRUCTURE ", 1)[-1]
+        structures[uid] = list(walk_parts(parse_sexp(structure)[0]))
+    text_parts = {uid: find_text_part(parts) for uid, parts in structures.items()}
+
+    # 2. One round trip per distinct text-part section (usually one or two), headers included
+    by_section = {}
+    for uid in uids:
+        if uid in structures:
+            part = text_parts[uid]
+            by_section.setdefault(part["section"] if part else None, []).append(uid)
+
+    fetched = {}
+    for section, group in by_section.items():
+        items = "BODY.PEEK[HEADER]" + (f" BODY.PEEK[{section}]<0.{MAX_BODY_BYTES}>" if section else "")
+        result, data = mail.uid("FETCH", uid_set(group), f"(UID {items})")
         if result != "OK":
-            logger.error("Could not search for unseen emails.")
-            return
+            raise imaplib.IMAP4.error(f"Could not fetch messages {uid_set(group)}.")
+        fetched.update(parse_fetch_response(data))
 
-        for num in data[0].split():
-            result, data = mail.fetch(num, "(RFC822)")
-            if result != "OK":
-                continue
-
-            raw_email = data[0][1]
-            msg = email.message_from_bytes(raw_email)
-            
-            subject = msg["Subject"]
-            sender = msg["From"]
-            date = msg["Date"]
-            
-            body = ""
-            if msg.is_multipart():
-                for part in msg.walk():
-                    if part.get_content_type() == "text/plain":
-                        body = part.get_payload(decode=True).decode()
-                        break
-            else:
-                body = msg.get_payload(decode=True).decode()
-
-            filename = f"EMAIL_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md"
-            filepath = os.path.join(INBOX_DIR, filename)
-            
-            with open(filepath, "w", encoding="utf-8") as f:
-                f.write(f"# New Email from {sender}\n\n")
-                f.write(f"- **Subject:** {subject}\n")
-                f.write(f"- **Date:** {date}\n\n")
-                f.write(f"## Content\n\n{body}\n")
-            
-            logger.info(f"Saved new email to Inbox: {filename}")
+    last_saved = None
+    for uid in uids:
+        if uid not in structures:
+            # Expunged between the SEARCH and the FETCH
+            logger.info(f"Message UID {uid} no longer exists, skipping.")
+            last_saved = uid
+            continue
+        message = fetched.get(uid)
+        if not message or "BODY[HEADER]" not in message:
+            logger.warning(f"Server returned no headers for UID {uid}; fetching it again next cycle.")
+            return last_saved
+        body = ""
+        part = text_parts.get(uid)
+        if part:
+            body = decode_text(message.get(f"BODY[{part['section']}]", b""), part)
+            if part["size"] > MAX_BODY_BYTES:
+                body += f"\n\n[Truncated: message body exceeds {MAX_BODY_BYTES // 1024} KB]"
+        attachments = [p for p in structures.get(uid, []) if p["filename"]] if SAVE_ATTACHMENTS else []
+        save_email(mail, uid, message["BODY[HEADER]"], body, attachments)
+        last_saved = uid
+    return last_saved
 
+def fetch_unseen(mail):
+    state = load_state()
+
+    # UIDVALIDITY arrives with SELECT; if the server reset UIDs, the high-water mark is void
+    _, validity = mail.response("UIDVALIDITY")
+    if validity and validity[0] is not None:
+        uidvalidity = int(validity[0])
+        if uidvalidity != state["uidvalidity"]:
+            if state["uidvalidity"] is not None:
+                logger.warning("UIDVALIDITY changed, resetting UID high-water mark.")
+            state = {"uidvalidity": uidvalidity, "last_uid": 0}
+            save_state(state)
+
+    criteria = ["UNSEEN"]
+    if state["last_uid"]:
+        criteria += ["UID", f"{state['last_uid'] + 1}:*"]
+    result, data = mail.uid("SEARCH", None, *criteria)
+    if result != "OK":
+        logger.error("Could not search for unseen emails.")
+        return
+
+    # "N:*" always matches the highest existing UID, even if it is not above N
+    uids = sorted(int(uid) for uid in data[0].split() if int(uid) > state["last_uid"])
+    start = 0
+    while start < len(uids):
+        # After a failure, messages up to the end of the failed batch are fetched one at a time,
+        # so the one that fails is known and can be skipped once it has failed MAX_UID_FAILURES times
+        careful = state["last_uid"] < state.get("careful_until", 0)
+        batch = uids[start:start + (1 if careful else FETCH_BATCH)]
+        if careful and state.get("failing_uid") == batch[0] and state.get("failing_count", 0) >= MAX_UID_FAILURES:
+            logger.error(f"Skipping email UID {batch[0]} after {state['failing_count']} failed attempts; "
+                         "it stays unread in the mailbox.")
+            advance(state, batch[0])
+            start += 1
+            continue
+        try:
+            last_saved = fetch_batch(mail, batch)
+        except Exception:
+            record_failure(state, batch, None)
+            raise
+        if last_saved is not None:
+            advance(state, last_saved)
+        # The high-water mark stays below the message that failed, so it is fetched again
+        if last_saved != batch[-1]:
+            record_failure(state, batch, last_saved)
+            raise imaplib.IMAP4.error(f"Could not fetch all of {uid_set(batch)}.")
+        start += len(batch)
+
+def advance(state, uid):
+    """Moves the high-water mark to `uid`, clearing the failure count once past the failing message."""
+    state["last_uid"] = uid
+    if uid >= (state.get("failing_uid") or 0):
+        state.pop("failing_uid", None)
+        state.pop("failing_count", None)
+    save_state(state)
+
+def record_failure(state, batch, last_saved):
+    """Counts a failed attempt against the first unsaved UID of `batch` (exact once fetched alone)."""
+    failed = batch[batch.index(last_saved) + 1] if last_saved is not None else batch[0]
+    if len(batch) == 1 or last_saved is not None or failed == state.get("failing_uid"):
+        count = state.get("failing_count", 0) + 1 if failed == state.get("failing_uid") else 1
+        state.update(failing_uid=failed, failing_count=count)
+    state["careful_until"] = max(state.get("careful_until", 0), batch[-1])
+    save_state(state)
+
+def check_gmail():
+    """One-shot check: connect, save unseen mail to Inbox, disconnect."""
+    if not GMAIL_USER or not GMAIL_APP_PASSWORD:
+        logger.error("GMAIL_USER or GMAIL_APP_PASSWORD not set.")
+        return
+
+    try:
+        mail = imap_circuit.call(open_mailbox)
+        fetch_unseen(mail)
         mail.logout()
     except Exception as e:
         logger.error(f"Gmail check failed: {e}")
 
-if __name__ == "__main__":
+class ImapSession:
+    """Long-lived IMAP session that waits for new mail with IDLE.
+
+    The connection is reopened with jittered exponential backoff whenever it drops or a
+    fetch cycle fails; `failures` only resets after a cycle that fetched everything, so a
+    message that keeps failing cannot turn into a tight LOGIN loop. Servers without IDLE
+    are kept alive with NOOP instead.
+    """
+    def __init__(self, stop):
+        self.mail = None
+        self.failures = 0
+        self.stop = stop
+
+    def connect(self):
+        while self.mail is None and not self.stop.is_set():
+            try:
+                self.mail = imap_circuit.call(open_mailbox)
+                logger.info(f"Connected to {IMAP_HOST} (IDLE {'supported' if self.supports_idle() else 'not supported'}).")
+            except CircuitOpenError as e:
+                self.stop.wait(e.retry_in)
+            except Exception as e:
+                self.failures += 1
+                delay = backoff_delay(self.failures, base=1, cap=MAX_BACKOFF)
+                logger.error(f"IMAP connection failed: {e}. Retrying in {delay:.0f}s...")
+                self.stop.wait(delay)
+        return self.mail
+
+    def supports_idle(self):
+        return "IDLE" in self.mail.capabilities
+
+    def has_buffered_data(self):
+        """True if response bytes were already read off the socket, where select() cannot see them."""
+        mail = self.mail
+        # Decrypted by the SSL layer but not yet read by imaplib
+        if getattr(mail.sock, "pending", None) and mail.sock.pending():
+            return True
+        # Read ahead into imaplib's buffered reader along with the "+ idling" line; peek returns
+        # the buffer as is, or does one non-blocking read when it is empty
+        timeout = mail.sock.gettimeout()
+        mail.sock.settimeout(0)
+        try:
+            return bool(mail.file.peek(1))
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return False
+        finally:
+            mail.sock.settimeout(timeout)
+
+    def wait_for_mail(self, timeout):
+        """Blocks until the server reports a mailbox change or `timeout` seconds pass."""
+        if not self.supports_idle():
+            self.stop.wait(min(timeout, POLL_INTERVAL))
+            self.mail.noop()
+            return
+
+        mail = self.mail
+        tag = mail._new_tag()
+        mail.send(tag + b" IDLE\r\n")
+        response = mail.readline()
+        if not response.startswith(b"+"):
+            raise imaplib.IMAP4.abort(f"IDLE rejected: {response!r}")
+
+        try:
+            # Any untagged response (EXISTS, EXPUNGE, FETCH) means the mailbox changed
+            deadline = time.monotonic() + timeout
+            readable = self.has_buffered_data()
+            while not readable and not self.stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                readable, _, _ = select.select([mail.sock], [], [], min(remaining, STOP_CHECK_SECONDS))
+            if readable:
+                logger.info(f"IMAP push: {mail.readline().strip().decode(errors='ignore')}")
+        finally:
+            mail.send(b"DONE\r\n")
+            while True:
+                line = mail.readline()
+                if not line:
+                    raise imaplib.IMAP4.abort("Connection closed during IDLE")
+                if line.startswith(tag):
+                    break
+            mail.tagged_commands.pop(tag, None)
+
+    def drop(self):
+        """Closes the socket without LOGOUT, which a broken session may never answer."""
+        if self.mail is not None:
+            try:
+                self.mail.shutdown()
+            except Exception:
+                pass
+            self.mail = None
+
+    def close(self):
+        if self.mail is not None:
+            try:
+                self.mail.logout()
+            except Exception:
+                pass
+            self.mail = None
+
+def watch_gmail(stop):
+    """Push mode: one persistent session, new mail is fetched as soon as the server announces it."""
+    if not GMAIL_USER or not GMAIL_APP_PASSWORD:
+        logger.error("GMAIL_USER or GMAIL_APP_PASSWORD not set.")
+        return
+
+    session = ImapSession(stop)
+    try:
+        while not stop.is_set():
+            try:
+                mail = session.connect()
+                if mail is None:
+                    break
+                fetch_unseen(mail)
+                session.failures = 0
+                session.wait_for_mail(IDLE_TIMEOUT)
+            except Exception as e:
+                # Full disk, a FETCH answered NO, a malformed message or a dropped connection alike
+                session.failures += 1
+                delay = backoff_delay(session.failures, base=1, cap=MAX_BACKOFF)
+                logger.warning(f"IMAP session failed: {e}. Reconnecting in {delay:.0f}s...")
+                session.drop()
+                stop.wait(delay)
+    finally:
+        session.close()
+
+def run(stop):
+    """Watches the mailbox until `stop` (a threading.Event) is set."""
     if not os.path.exists(INBOX_DIR):
         os.makedirs(INBOX_DIR)
-    
-    logger.info("Gmail Watcher started. Polling every 60 seconds...")
-    while True:
-        check_gmail()
-        time.sleep(60)
+
+    if WATCH_MODE == "poll":
+        logger.info(f"Gmail Watcher started. Polling every {POLL_INTERVAL} seconds...")
+        while not stop.is_set():
+            check_gmail()
+            stop.wait(POLL_INTERVAL)
+    else:
+        logger.info("Gmail Watcher started in IDLE (push) mode...")
+        watch_gmail(stop)
+    logger.info("Gmail Watcher stopped.")
+
+if __name__ == "__main__":
+    try:
+        run(threading.Event())
+    except KeyboardInterrupt:
+        logger.info("Gmail Watcher stopped.")
@@ -1,24 +1,20 @@
 import os
-import time
+import sys
 import logging
+import threading
 from datetime import datetime
 from dotenv import load_dotenv
 
 # Configuration
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 load_dotenv(os.path.join(BASE_DIR, ".env"))
+sys.path.append(BASE_DIR)
+from vault_logging import setup_logging
 
 INBOX_DIR = os.path.join(BASE_DIR, "Inbox")
 LOG_DIR = os.path.join(BASE_DIR, "Logs")
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler(os.path.join(LOG_DIR, "watchers.log")),
-        logging.StreamHandler()
-    ]
-)
+setup_logging(LOG_DIR, "watchers")
 logger = logging.getLogger("WhatsAppWatcher")
 
 def check_whatsapp():
@@ -28,11 +24,17 @@ def check_whatsapp():
     # placeholder for actual logic
     pass
 
-if __name__ == "__main__":
+def run(stop):
     if not os.path.exists(INBOX_DIR):
         os.makedirs(INBOX_DIR)
     
     logger.info("WhatsApp Watcher started (Stub).")
-    while True:
+    while not stop.is_set():
         check_whatsapp()
-        time.sleep(300) # Check every 5 minutes
+        stop.wait(300) # Check every 5 minutes
+
+if __name__ == "__main__":
+    try:
+        run(threading.Event())
+    except KeyboardInterrupt:
+        pass
@@ -2,9 +2,23 @@ import os
 import time
 import shutil
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 from dotenv import load_dotenv
 from openai import OpenAI
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+from rate_limiter import TokenBucket, rate_limited_call
+from response_cache import ResponseCache, cache_key
+from task_ledger import TaskLedger, file_hash, worker_id
+from triage import Classifier
+from priority import PriorityRules, WaitStats, priority_class
+from vault_storage import atomic_write, move
+from vault_logging import setup_logging, log_context, timed
+from metrics import LLM_CALLS, QUEUE_WAIT, STAGE_SECONDS, record_llm_call
+from resilience import CircuitOpenError, breaker, backoff_delay, dead_letter, is_transient
+from batch_jobs import BatchQueue
 
 # Configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -13,91 +27,555 @@ load_dotenv(os.path.join(BASE_DIR, ".env"))
 INBOX = os.path.join(BASE_DIR, "Inbox")
 DRAFTS = os.path.join(BASE_DIR, "Drafts")
 PLANS = os.path.join(BASE_DIR, "Plans")
+HANDBOOK = os.path.join(BASE_DIR, "Company_Handbook.md")
+SENT = os.path.join(BASE_DIR, "Sent")
+DONE = os.path.join(BASE_DIR, "Done")
+DEAD_LETTER = os.path.join(BASE_DIR, "Dead_Letter")
 LOG_DIR = os.path.join(BASE_DIR, "Logs")
 
+# Intake: "watch" reacts to filesystem events, "poll" rescans Inbox on a timer
+INTAKE_MODE = os.getenv("AGENT_INTAKE_MODE", "watch").lower()
+POLL_INTERVAL = 10
+# Quiet period after the last event on a file before it is considered ready
+DEBOUNCE_SECONDS = float(os.getenv("AGENT_DEBOUNCE_SECONDS", "0.5"))
+
+# Reasoning workers: how many files are processed at once, and the shared request budget
+AGENT_CONCURRENCY = int(os.getenv("AGENT_CONCURRENCY", "4"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+# A task that raises this many times is marked failed in the ledger instead of retried
+MAX_ATTEMPTS = 3
+# How often watch mode re-checks the ledger for retries and expired leases
+LEDGER_CHECK_SECONDS = 30
+# Highest score first; every PRIORITY_AGING_SECONDS of waiting adds one point, so low items still run
+PRIORITY_AGING_SECONDS = float(os.getenv("AGENT_PRIORITY_AGING_SECONDS", "6"))
+
+# Persistent cache of reasoning responses, so re-dropped or duplicate items skip the API
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.path.join(BASE_DIR, ".cache", "llm_responses.db")
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "50"))
+LLM_CACHE_TTL_DAYS = float(os.getenv("LLM_CACHE_TTL_DAYS", "30"))
+
+# Stream the reasoning into Plans/ as it is generated instead of writing it once complete
+STREAM_PLANS = os.getenv("AGENT_STREAM_PLANS", "true").lower() == "true"
+# Streamed tokens are buffered and written to the Plan file in batches of this size/age
+PLAN_FLUSH_CHARS = 200
+PLAN_FLUSH_SECONDS = 0.5
+
+# Local triage before the LLM: skips auto-replies/spam, batches receipts, picks the model.
+# The channel rules always apply; this only turns off skipping, batching and model choice.
+TRIAGE_ENABLED = os.getenv("AGENT_TRIAGE", "true").lower() == "true"
+# A digest item renamed from "<name>.processed" to "<name>.reason" is reasoned about regardless of triage
+REASON_SUFFIX = ".reason"
+
+# Batch mode: items of these priority classes, and items triage would only list in the digest,
+# are reasoned about through the OpenAI Batch API (half the price, results within 24h) instead
+# of a live call. Off by default.
+BATCH_ENABLED = os.getenv("AGENT_BATCH", "false").lower() == "true"
+BATCH_PRIORITIES = {cls.strip() for cls in os.getenv("AGENT_BATCH_PRIORITIES", "low").split(",") if cls.strip()}
+BATCH_DIR = os.path.join(BASE_DIR, ".state", "batches")
+
+REASONING_MODEL = "gpt-4" # Simulate high reasoning or use 3.5 for cost
+# Used for short items whose channel triage already settled
+SIMPLE_MODEL = os.getenv("AGENT_SIMPLE_MODEL", "gpt-3.5-turbo")
+REASONING_PROMPT = """You are a High-Level Assistant. 
+                Follow this reasoning pattern:
+                1. ANALYZE: What is requested?
+                2. STRATEGIZE: How to fulfill this?
+                3. PROPOSE: What specific draft should be created? (EMAIL, LINKEDIN, or WHATSAPP)
+                Return the reasoning in Markdown plan format and the proposed ACTION separately."""
+
 # Logging Configuration
-if not os.path.exists(LOG_DIR):
-    os.makedirs(LOG_DIR)
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler(os.path.join(LOG_DIR, "agent.log")),
-        logging.StreamHandler()
-    ]
-)
+setup_logging(LOG_DIR, "agent")
 logger = logging.getLogger("DigitalFTE")
 
 # API Client
 api_key = os.getenv("OPENAI_API_KEY")
 client = OpenAI(api_key=api_key) if api_key else None
+bucket = TokenBucket(LLM_REQUESTS_PER_MINUTE / 60, AGENT_CONCURRENCY)
+cache = ResponseCache(
+    LLM_CACHE_PATH,
+    max_bytes=int(LLM_CACHE_MAX_MB * 1024 * 1024),
+    ttl_seconds=LLM_CACHE_TTL_DAYS * 24 * 3600
+) if LLM_CACHE_ENABLED else None
+
+# Shared by every reasoning worker: an outage opens it once instead of failing each task in turn
+openai_circuit = breaker("openai")
+executor = ThreadPoolExecutor(max_workers=AGENT_CONCURRENCY, thread_name_prefix="reasoning")
+batches = BatchQueue(client, BATCH_DIR, circuit=openai_circuit) if client and BATCH_ENABLED else None
+ledger = TaskLedger()
+WORKER_ID = worker_id()
+running = set()
+# Re-entrant: a future's done-callback may run inline while dispatch_pending holds it
+running_lock = threading.RLock()
+# Set while shutting down: running tasks finish, but their completions claim nothing new
+draining = threading.Event()
+priority_rules = PriorityRules(HANDBOOK)
+classifier = Classifier(priority_rules).train_from([SENT, DRAFTS, DONE])
+digest_lock = threading.Lock()
+wait_stats = WaitStats()
+wait_stats_logged = 0
+
+class PlanStream:
+    """Writes reasoning into a Plan file as it arrives and spots the PROPOSE section.
+
+    Tokens are buffered and flushed every PLAN_FLUSH_CHARS characters or
+    PLAN_FLUSH_SECONDS, so Obsidian shows the Plan growing without a write per token.
+    `on_propose` is called once with the first line of the PROPOSE section, as soon
+    as that line is complete (or with "" at close if the model never proposed).
+    """
+    def __init__(self, path, on_propose):
+        self.file = open(path, "a", encoding="utf-8")
+        self.on_propose = on_propose
+        self.buffer = []
+        self.buffered = 0
+        self.last_flush = time.monotonic()
+        self.text = ""
+        self.scanned = 0
+        self.propose_at = -1
+        self.proposed = False
+
+    def write(self, delta):
+        self.buffer.append(delta)
+        self.buffered += len(delta)
+        self.text += delta
+        if self.buffered >= PLAN_FLUSH_CHARS or time.monotonic() - self.last_flush >= PLAN_FLUSH_SECONDS:
+            self.flush()
+        if not self.proposed:
+            self._check_propose()
+
+    def _check_propose(self):
+        if self.propose_at == -1:
+            # Only rescan the tail; the marker may straddle two deltas
+            start = self.text.upper().find("PROPOSE", max(0, self.scanned - len("PROPOSE")))
+            self.scanned = len(self.text)
+            if start == -1:
+                return
+            self.propose_at = start + len("PROPOSE")
+        # Wait for the first non-empty line of the section ("PROPOSE:" may be a heading on its own)
+        proposal = self.text[self.propose_at:]
+        lines = proposal.split("\n")
+        for line in lines[:-1]:
+            line = line.strip(" :*#-")
+            if line:
+                self.proposed = True
+                self.flush()
+                self.on_propose(line)
+                return
+
+    def flush(self):
+        if self.buffer:
+            self.file.write("".join(self.buffer))
+            self.file.flush()
+            self.buffer = []
+            self.buffered = 0
+        self.last_flush = time.monotonic()
+
+    def close(self, completed=True):
+        """Flushes the Plan; a failed attempt (`completed` False) creates no Draft."""
+        self.flush()
+        self.file.close()
+        if completed and not self.proposed:
+            self.proposed = True
+            self.on_propose("")
 
-def get_claude_style_reasoning(content):
+def reasoning_messages(content):
+    return [
+        {"role": "system", "content": REASONING_PROMPT},
+        {"role": "user", "content": content}
+    ]
+
+def get_claude_style_reasoning(content, plan, model=REASONING_MODEL):
+    """Writes the reasoning for `content` into `plan` (a PlanStream) and returns the action.
+
+    Raises if the LLM call fails, so the task is retried with backoff instead of the
+    error text standing in for a Plan. CircuitOpenError means no call was attempted.
+    """
     if not client:
-        return "Reasoning loop skipped (No API Key).", "ACTION: Request Manual Review."
+        plan.write("Reasoning loop skipped (No API Key).")
+        return "ACTION: Request Manual Review."
     
+    key = cache_key(model, REASONING_PROMPT, content)
+    if cache:
+        cached = cache.get(key)
+        if cached is not None:
+            LLM_CALLS.inc(model=model, result="cache")
+            logger.info("Reasoning served from cache.")
+            plan.write(cached)
+            return "ACTION: Draft CREATED"
+
+    messages = reasoning_messages(content)
+    openai_circuit.allow()
+    started = time.perf_counter()
+    first_token = None
     try:
-        response = client.chat.completions.create(
-            model="gpt-4", # Simulate high reasoning or use 3.5 for cost
-            messages=[
-                {"role": "system", "content": """You are a High-Level Assistant. 
-                Follow this reasoning pattern:
-                1. ANALYZE: What is requested?
-                2. STRATEGIZE: How to fulfill this?
-                3. PROPOSE: What specific draft should be created? (EMAIL, LINKEDIN, or WHATSAPP)
-                Return the reasoning in Markdown plan format and the proposed ACTION separately."""},
-                {"role": "user", "content": content}
-            ]
-        )
-        return response.choices[0].message.content, "ACTION: Draft CREATED"
+        if STREAM_PLANS:
+            stream = rate_limited_call(
+                bucket,
+                client.chat.completions.create,
+                model=model,
+                messages=messages,
+                stream=True,
+                # The final chunk then carries the token usage
+                stream_options={"include_usage": True}
+            )
+            parts = []
+            usage = None
+            for chunk in stream:
+                usage = chunk.usage or usage
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                parts.append(delta)
+                plan.write(delta)
+            reasoning = "".join(parts)
+        else:
+            response = rate_limited_call(
+                bucket,
+                client.chat.completions.create,
+                model=model,
+                messages=messages
+            )
+            reasoning = response.choices[0].message.content
+            usage = response.usage
+            first_token = time.perf_counter() - started
+            plan.write(reasoning)
     except Exception as e:
-        return f"Reasoning failed: {e}", "ACTION: Manual check required."
+        # Covers a stream that breaks mid-way, not just a failed request
+        openai_circuit.record(e)
+        LLM_CALLS.inc(model=model, result="error")
+        plan.write(f"\n\nReasoning failed: {e}")
+        raise
+    openai_circuit.success()
+    total = time.perf_counter() - started
+    record_llm_call(model, total, usage, first_token)
+    logger.info(f"Reasoning latency ({model}): first token {first_token or 0:.2f}s, total {total:.2f}s")
+    if cache:
+        cache.put(key, reasoning)
+    return "ACTION: Draft CREATED"
+
+def channel_from_proposal(proposal):
+    for channel in ("EMAIL", "LINKEDIN", "WHATSAPP"):
+        if channel in proposal.upper():
+            return channel
+    return None
+
+def record_digest(filename, triage):
+    """Lists a skipped or batched item in today's digest note instead of reasoning about it."""
+    digest_path = os.path.join(PLANS, f"DIGEST_{datetime.now().strftime('%Y-%m-%d')}.md")
+    with digest_lock:
+        new = not os.path.exists(digest_path)
+        with open(digest_path, "a", encoding="utf-8") as f:
+            if new:
+                f.write(f"# Triage Digest {datetime.now().strftime('%Y-%m-%d')}\n\n")
+                f.write("Items handled without the reasoning loop. To reason about one anyway, rename it in Inbox "
+                        f"from `<name>.processed` to `<name>{REASON_SUFFIX}`.\n\n")
+            f.write(f"- {datetime.now().strftime('%H:%M:%S')} **{triage.action}** ({triage.reason}): `{filename}`\n")
+
+def is_inbox_task(filename):
+    return not filename.endswith(".processed") and not filename.startswith(".")
+
+def draft_writer(filename, content, triage):
+    """The PlanStream callback that creates the Draft for `filename` once its PROPOSE line is known."""
+    def create_draft(proposal):
+        channel = triage.channel or channel_from_proposal(proposal) or "DRAFT"
+        draft_filename = f"{channel}_{filename}.md"
+
+        # Written atomically, so a Draft the human sees is always complete
+        atomic_write(os.path.join(DRAFTS, draft_filename), content) # Or structured draft
+        # Drafts wait in the ledger until the human approves them into Outbox
+        ledger.enqueue("drafts", draft_filename)
+        logger.info(f"Draft created at {draft_filename} for {filename}. Awaiting user approval.")
+    return create_draft
+
+def queue_for_batch(filename, content, model):
+    """Adds the reasoning request for an Inbox file to the next batch job.
+
+    Returns False, so the file is reasoned about now, if the response is already cached.
+    The file stays in Inbox, skipped by intake while queued; its Plan says it is waiting.
+    """
+    if cache and cache.get(cache_key(model, REASONING_PROMPT, content)) is not None:
+        return False
+    if batches.add(filename, {"model": model, "messages": reasoning_messages(content)}):
+        atomic_write(os.path.join(PLANS, f"PLAN_{filename}.md"), (
+            f"# Reasoning Plan for {filename}\n\n"
+            f"Queued for batch reasoning at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}. "
+            "The reasoning and Draft appear once the batch completes (within 24 hours).\n"
+        ))
+        logger.info(f"Queued {filename} for batch reasoning ({model}).")
+    return True
+
+def finish_batched(filename, request, completion, error):
+    """Writes the Plan and Draft for an Inbox file from its batch result, as a live call would."""
+    src_path = os.path.join(INBOX, filename)
+    with log_context(file=filename, stage="batch"):
+        if not os.path.isfile(src_path):
+            logger.warning(f"Batch result for {filename} ignored: no longer in Inbox")
+            return
+        if error is not None:
+            dead_letter(src_path, DEAD_LETTER, "batch", error, error.attempts)
+            return
+        # The Plan and Draft are for the content that was sent, even if the file changed since
+        content = request["messages"][-1]["content"]
+        reasoning = completion.choices[0].message.content or ""
+        triage = classifier.classify(filename, content)
+        plan_path = os.path.join(PLANS, f"PLAN_{filename}.md")
+        atomic_write(plan_path, f"# Reasoning Plan for {filename}\n\n")
+        plan = PlanStream(plan_path, draft_writer(filename, content, triage))
+        plan.write(reasoning)
+        plan.close()
+        if cache:
+            cache.put(cache_key(request["model"], REASONING_PROMPT, content), reasoning)
+        move(src_path, src_path + ".processed", overwrite=True)
+        logger.info(f"Batch reasoning complete for {filename}.")
+
+def process_file(filename, batch=False):
+    """Triages and reasons about one Inbox file; with `batch`, the reasoning may be deferred to a batch job."""
+    src_path = os.path.join(INBOX, filename)
+    if not os.path.isfile(src_path):
+        return
+
+    logger.info(f"New incoming task: {filename}")
+    with open(src_path, "r", encoding="utf-8", errors="ignore") as f:
+        content = f.read()
+
+    # The human asked for this digest item to be reasoned about; Plan and Draft use its original name
+    forced = filename.endswith(REASON_SUFFIX)
+    name = filename[:-len(REASON_SUFFIX)] if forced else filename
+    done_path = os.path.join(INBOX, name + ".processed")
+
+    # 0. Local triage; low-value items never reach the LLM
+    triage = classifier.classify(name, content, reason=forced)
+    logger.info(f"Triage for {filename}: {triage}")
+    if TRIAGE_ENABLED and triage.action == "batch" and batches:
+        # Batch mode on: receipts and bulk mail get a Plan and Draft through the Batch API
+        batch = True
+    elif TRIAGE_ENABLED and triage.action != "reason":
+        record_digest(filename, triage)
+        move(src_path, done_path, overwrite=True)
+        return
+    
+    model = SIMPLE_MODEL if TRIAGE_ENABLED and triage.simple and triage.channel else REASONING_MODEL
+    if batch and not forced and queue_for_batch(filename, content, model):
+        return
+
+    # 1. Create Plan.md; the reasoning is streamed into it as it is generated
+    plan_filename = f"PLAN_{name}.md"
+    plan_path = os.path.join(PLANS, plan_filename)
+    atomic_write(plan_path, f"# Reasoning Plan for {name}\n\n")
+
+    # 2. Claude Reasoning Loop; the Draft is created as soon as the PROPOSE section is known,
+    # while the Plan is still streaming
+    plan = PlanStream(plan_path, draft_writer(name, content, triage))
+    completed = False
+    try:
+        with timed(logger, "reasoning", model=model):
+            get_claude_style_reasoning(content, plan, model)
+        completed = True
+    finally:
+        plan.close(completed)
+    logger.info(f"Reasoning complete for {filename}.")
+    
+    # Move processed inbox file to avoid re-processing or archive
+    # shutil.move(src_path, os.path.join(BASE_DIR, "Archive", filename)) 
+    # For now, we delete or rename
+    move(src_path, done_path, overwrite=True)
+
+def enqueue_file(filename):
+    """Records an Inbox file in the ledger; the ledger, not the folder, drives scheduling."""
+    if batches and batches.has(filename):
+        # Waiting for its batch job; finish_batched completes it
+        return
+    path = os.path.join(INBOX, filename)
+    try:
+        content_hash = file_hash(path)
+    except OSError:
+        return
+    ledger.enqueue("inbox", filename, content_hash, classifier.score_file(path, reason=filename.endswith(REASON_SUFFIX)))
+
+def run_task(task):
+    wait_seconds = time.time() - task["created"]
+    wait_stats.add(priority_class(task["priority"]), wait_seconds)
+    QUEUE_WAIT.observe(wait_seconds, stage="inbox")
+    # Every record logged while handling the task carries its ledger id and file name
+    with log_context(task_id=task["id"], file=task["name"]):
+        try:
+            with timed(logger, "process", wait_ms=round(wait_seconds * 1000)), STAGE_SECONDS.time(stage="reasoning"):
+                process_file(task["name"], batch=batches is not None and priority_class(task["priority"]) in BATCH_PRIORITIES)
+            ledger.complete(task["id"])
+        except CircuitOpenError as e:
+            # Not the task's fault: it waits out the outage without using up an attempt
+            logger.warning(f"Deferred {task['name']}: {e}")
+            ledger.release(task["id"], delay=e.retry_in)
+        except Exception as e:
+            if task["attempts"] < MAX_ATTEMPTS and is_transient(e):
+                delay = backoff_delay(task["attempts"])
+                logger.error(f"Processing failed for {task['name']} (attempt {task['attempts']}/{MAX_ATTEMPTS}): {e}. "
+                             f"Retrying in {delay:.0f}s")
+                ledger.fail(task["id"], str(e), retry=True, delay=delay)
+                return
+            ledger.fail(task["id"], str(e), retry=False)
+            src_path = os.path.join(INBOX, task["name"])
+            if os.path.exists(src_path):
+                dead_letter(src_path, DEAD_LETTER, "inbox", e, task["attempts"])
+
+def task_done(future):
+    with running_lock:
+        running.discard(future)
+    dispatch_pending()
+
+def dispatch_pending():
+    """Leases as many pending Inbox tasks as there are idle workers.
+
+    The Plan and Draft for a file are written by the same worker, so they always
+    appear together; only different files run concurrently.
+    """
+    with running_lock:
+        free = AGENT_CONCURRENCY - len(running)
+        if free <= 0 or draining.is_set():
+            return
+        for task in ledger.claim("inbox", WORKER_ID, limit=free, aging_seconds=PRIORITY_AGING_SECONDS):
+            future = executor.submit(run_task, task)
+            running.add(future)
+            future.add_done_callback(task_done)
+
+def log_wait_stats():
+    """Logs queue wait percentiles per priority class if tasks ran since the last report."""
+    global wait_stats_logged
+    if wait_stats.total != wait_stats_logged:
+        wait_stats_logged = wait_stats.total
+        logger.info(f"Queue wait by priority: {wait_stats}")
 
 def process_inbox():
+    """Reconciliation scan: enqueue every pending file in Inbox and process until none are left."""
     if not os.path.exists(INBOX):
         return
 
-    files = [f for f in os.listdir(INBOX) if os.path.isfile(os.path.join(INBOX, f))]
-    for filename in files:
-        logger.info(f"New incoming task: {filename}")
-        src_path = os.path.join(INBOX, filename)
-        
-        with open(src_path, "r", encoding="utf-8", errors="ignore") as f:
-            content = f.read()
-        
-        # 1. Claude Reasoning Loop
-        reasoning, action = get_claude_style_reasoning(content)
-        
-        # 2. Create Plan.md
-        plan_filename = f"PLAN_{filename}.md"
-        with open(os.path.join(PLANS, plan_filename), "w", encoding="utf-8") as f:
-            f.write(f"# Reasoning Plan for {filename}\n\n")
-            f.write(reasoning)
-        
-        # 3. Create Draft based on content
-        draft_filename = f"DRAFT_{filename}.md"
-        if "EMAIL" in content.upper() or "MAIL" in content.upper():
-            draft_filename = f"EMAIL_{filename}.md"
-        elif "LINKEDIN" in content.upper():
-            draft_filename = f"LINKEDIN_{filename}.md"
-        
-        with open(os.path.join(DRAFTS, draft_filename), "w", encoding="utf-8") as f:
-            f.write(content) # Or structured draft
-            
-        logger.info(f"Reasoning complete for {filename}. Draft created at {draft_filename}. Awaiting user approval.")
-        
-        # Move processed inbox file to avoid re-processing or archive
-        # shutil.move(src_path, os.path.join(BASE_DIR, "Archive", filename)) 
-        # For now, we delete or rename
-        os.rename(src_path, src_path + ".processed")
+    with os.scandir(INBOX) as entries:
+        for entry in entries:
+            if entry.is_file() and is_inbox_task(entry.name):
+                enqueue_file(entry.name)
 
-if __name__ == "__main__":
+    dispatch_pending()
+    drain_running()
+    log_wait_stats()
+
+def drain_running():
+    """Waits for every task in flight, including ones their completions dispatch."""
+    while True:
+        with running_lock:
+            futures = list(running)
+        if not futures:
+            break
+        wait(futures)
+
+class InboxHandler(FileSystemEventHandler):
+    """Collects Inbox events into a debounced ready-queue.
+
+    A file becomes ready once no event has been seen for it for DEBOUNCE_SECONDS,
+    so tasks still being written by a watcher are not picked up half-way.
+    """
+    def __init__(self):
+        self.pending = {}
+        self.condition = threading.Condition()
+
+    def _touch(self, path):
+        filename = os.path.basename(path)
+        if os.path.dirname(path) != INBOX or not is_inbox_task(filename):
+            return
+        with self.condition:
+            self.pending[filename] = time.monotonic()
+            self.condition.notify()
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self._touch(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._touch(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self._touch(event.dest_path)
+
+    def wait_ready(self, timeout, stop):
+        """Returns settled filenames as soon as there are any, or [] after `timeout` seconds or on `stop`."""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                ready = [f for f, seen in self.pending.items() if now - seen >= DEBOUNCE_SECONDS]
+                if ready:
+                    for filename in ready:
+                        del self.pending[filename]
+                    return ready
+                if now >= deadline or stop.is_set():
+                    return []
+                if self.pending:
+                    oldest = min(self.pending.values())
+                    self.condition.wait(DEBOUNCE_SECONDS - (now - oldest))
+                else:
+                    # Bounded so Ctrl+C is still delivered on Windows
+                    self.condition.wait(min(1.0, deadline - now))
+
+def watch_inbox(stop):
+    draining.clear()
+    handler = InboxHandler()
+    observer = Observer()
+    observer.schedule(handler, INBOX, recursive=False)
+    observer.start()
+
+    # Anything that arrived while the loop was down is only visible to a scan
+    process_inbox()
+
+    try:
+        while not stop.is_set():
+            # An empty wake-up still re-checks the ledger for retries and expired leases
+            ready = handler.wait_ready(LEDGER_CHECK_SECONDS, stop)
+            for filename in ready:
+                enqueue_file(filename)
+            dispatch_pending()
+            if not ready:
+                log_wait_stats()
+    finally:
+        observer.stop()
+        observer.join()
+        # Tasks in flight finish; nothing new is claimed, so the executor stays usable for a restart
+        draining.set()
+        drain_running()
+
+def run(stop):
+    """Processes Inbox until `stop` (a threading.Event) is set."""
     for folder in [INBOX, DRAFTS, PLANS]:
         if not os.path.exists(folder):
             os.makedirs(folder)
 
-    logger.info("Silver Tier Agent Loop started. Monitoring Inbox...")
-    while True:
-        process_inbox()
-        time.sleep(10)
+    logger.info(f"Silver Tier Agent Loop started ({INTAKE_MODE} mode). Monitoring Inbox...")
+    if cache:
+        logger.info(f"Response cache: {cache.stats()}")
+    # Batch jobs are submitted and polled on their own thread, stopped with this run
+    batch_stop = threading.Event()
+    if batches:
+        logger.info(f"Batch mode on for {', '.join(sorted(BATCH_PRIORITIES))} priority items.")
+        batch_thread = threading.Thread(target=batches.run, args=(batch_stop, finish_batched), name="batch")
+        batch_thread.start()
+    try:
+        if INTAKE_MODE == "poll":
+            while not stop.is_set():
+                process_inbox()
+                stop.wait(POLL_INTERVAL)
+        else:
+            watch_inbox(stop)
+    finally:
+        if batches:
+            batch_stop.set()
+            batch_thread.join()
+    logger.info("Agent Loop stopped.")
+
+if __name__ == "__main__":
+    try:
+        run(threading.Event())
+    except KeyboardInterrupt:
+        logger.info("Agent Loop stopped.")
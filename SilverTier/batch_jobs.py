@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from openai.types.chat import ChatCompletion
+from vault_storage import atomic_write
+from metrics import BATCH_OPEN, BATCH_REQUESTS, BATCH_TURNAROUND, LLM_TOKENS
+from resilience import CircuitOpenError, breaker, backoff_delay
+
+logger = logging.getLogger("BatchJobs")
+
+# Requests are collected until there are BATCH_MAX_REQUESTS of them or the oldest has
+# waited BATCH_MAX_WAIT_SECONDS, then sent as one job. Running jobs are checked every
+# BATCH_POLL_SECONDS.
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "500"))
+BATCH_MAX_WAIT_SECONDS = float(os.getenv("BATCH_MAX_WAIT_SECONDS", "600"))
+BATCH_POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", "60"))
+
+ENDPOINT = "/v1/chat/completions"
+# The only window the Batch API offers; a job not finished by then expires
+COMPLETION_WINDOW = "24h"
+# A request that fails transiently (expired job, 429, 5xx) is sent again in the next job, up to this many times
+MAX_ATTEMPTS = 3
+# A job whose upload, creation or polling keeps failing is retried with backoff, then given up:
+# its requests are reported as failed. Any error counts, so a permanent 4xx is not retried forever.
+JOB_MAX_FAILURES = 8
+JOB_RETRY_BASE_SECONDS = 30
+JOB_RETRY_MAX_SECONDS = 3600
+FINISHED = {"completed", "failed", "expired", "cancelled"}
+
+class BatchError(Exception):
+    """The final error for one request, after `attempts` jobs."""
+    def __init__(self, message, attempts):
+        super().__init__(message)
+        self.attempts = attempts
+
+def request_error(record, status):
+    """(message, retryable) for one output or error-file line, or for a request missing from a finished job."""
+    if record is None:
+        # A failed job never ran (bad input file, quota); an expired or cancelled one may simply be resent
+        return f"batch job {status} before answering", status != "failed"
+    response = record.get("response") or {}
+    if record.get("error"):
+        code = record["error"].get("code")
+        return f"{code}: {record['error'].get('message')}", code in ("batch_expired", "batch_cancelled")
+    code = response.get("status_code", 0)
+    error = (response.get("body") or {}).get("error") or {}
+    return f"HTTP {code}: {error.get('message', 'no message')}", code == 429 or code >= 500
+
+class BatchQueue:
+    """Chat completion requests answered through the OpenAI Batch API instead of one call each.
+
+    Batch requests cost half as much and do not count against the interactive rate
+    limit, but their results arrive within 24 hours instead of seconds. `add` appends a
+    request to `pending.jsonl` under `folder`. `step` seals that file once it is full or
+    old enough, uploads it as a job, and polls the running jobs. Each finished request
+    is passed to `on_result(custom_id, body, completion, error)`, where `completion` is
+    a ChatCompletion on success and `error` a BatchError otherwise.
+
+    Requests are on disk from the moment `add` returns. After a restart, running jobs
+    are polled again and sealed files that were never uploaded are uploaded. A job is
+    forgotten before its results are applied, so a crash part-way leaves the remaining
+    items unanswered rather than answered twice; the caller queues them again when it
+    next finds them. A job whose upload or polling keeps failing is retried with backoff;
+    after JOB_MAX_FAILURES its requests are reported as failed.
+    """
+    def __init__(self, client, folder, max_requests=BATCH_MAX_REQUESTS, max_wait=BATCH_MAX_WAIT_SECONDS,
+                 poll_seconds=BATCH_POLL_SECONDS, circuit=None):
+        self.client = client
+        self.folder = folder
+        self.max_requests = max_requests
+        self.max_wait = max_wait
+        self.poll_seconds = poll_seconds
+        self.circuit = circuit or breaker("openai")
+        self.pending_path = os.path.join(folder, "pending.jsonl")
+        self.state_path = os.path.join(folder, "jobs.json")
+        self.lock = threading.RLock()
+        self.last_poll = 0.0
+        os.makedirs(folder, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """Rebuilds the in-memory view from the files: jobs, attempt counts and every queued custom_id."""
+        self.jobs = {}
+        self.attempts = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.jobs = state.get("jobs", {})
+            self.attempts = state.get("attempts", {})
+        # Sealed by a process that stopped before recording the upload
+        for name in os.listdir(self.folder):
+            if name.startswith("batch_") and name.endswith(".jsonl") and name not in self.jobs:
+                self.jobs[name] = {"batch_id": None}
+        self.pending = [request["custom_id"] for request in self._read(self.pending_path)]
+        self.pending_since = time.time() if self.pending else None
+        self.queued = set(self.pending)
+        for name in self.jobs:
+            self.queued.update(request["custom_id"] for request in self._read(os.path.join(self.folder, name)))
+        BATCH_OPEN.set(len(self.queued))
+
+    @staticmethod
+    def _read(path):
+        requests = []
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        requests.append(json.loads(line))
+                    except ValueError:
+                        # Only the last line can be torn, by a crash mid-append
+                        logger.warning(f"Skipping unreadable line in {os.path.basename(path)}")
+        except FileNotFoundError:
+            pass
+        return requests
+
+    def _save(self):
+        atomic_write(self.state_path, json.dumps({"jobs": self.jobs, "attempts": self.attempts}, indent=1))
+
+    def has(self, custom_id):
+        """True while a request with this id is waiting to be sent or running."""
+        with self.lock:
+            return custom_id in self.queued
+
+    def add(self, custom_id, body):
+        """Queues a chat completion request `body`; returns False if `custom_id` is already queued."""
+        with self.lock:
+            if custom_id in self.queued:
+                return False
+            self._append(custom_id, body)
+        BATCH_REQUESTS.inc(model=body.get("model", ""), result="queued")
+        return True
+
+    def _append(self, custom_id, body):
+        line = json.dumps({"custom_id": custom_id, "method": "POST", "url": ENDPOINT, "body": body})
+        with open(self.pending_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.pending.append(custom_id)
+        self.queued.add(custom_id)
+        if self.pending_since is None:
+            self.pending_since = time.time()
+        BATCH_OPEN.set(len(self.queued))
+
+    def _seal(self):
+        """Turns pending.jsonl into a job file, to be uploaded as one batch."""
+        name = f"batch_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.jsonl"
+        os.replace(self.pending_path, os.path.join(self.folder, name))
+        self.jobs[name] = {"batch_id": None}
+        self._save()
+        logger.info(f"Sealed {len(self.pending)} request(s) into {name}")
+        self.pending = []
+        self.pending_since = None
+
+    def _submit(self, name, job):
+        with open(os.path.join(self.folder, name), "rb") as f:
+            uploaded = self.circuit.call(self.client.files.create, file=(name, f), purpose="batch")
+        # A crash before the save below would send this file a second time after the restart
+        batch = self.circuit.call(
+            self.client.batches.create,
+            input_file_id=uploaded.id,
+            endpoint=ENDPOINT,
+            completion_window=COMPLETION_WINDOW,
+            metadata={"file": name}
+        )
+        job.update(batch_id=batch.id, input_file_id=uploaded.id, submitted=time.time(), failures=0, next_try=0)
+        self._save()
+        logger.info(f"Submitted {name} as batch {batch.id}")
+
+    def _download(self, file_id):
+        if not file_id:
+            return []
+        text = self.circuit.call(self.client.files.content, file_id).text
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    def _collect(self, name, job, on_result):
+        """Polls one job; once it has finished, hands out its results and forgets it."""
+        batch = self.circuit.call(self.client.batches.retrieve, job["batch_id"])
+        if job.get("failures"):
+            with self.lock:
+                job.update(failures=0, next_try=0)
+                self._save()
+        if batch.status not in FINISHED:
+            return
+        records = {record["custom_id"]: record
+                   for record in self._download(batch.output_file_id) + self._download(batch.error_file_id)}
+        BATCH_TURNAROUND.observe(time.time() - job.get("submitted", time.time()))
+        logger.info(f"Batch {job['batch_id']} {batch.status}: {len(records)} result(s)")
+
+        finished = []
+        path = os.path.join(self.folder, name)
+        with self.lock:
+            for request in self._read(path):
+                custom_id, body = request["custom_id"], request["body"]
+                model = body.get("model", "")
+                record = records.get(custom_id)
+                response = (record or {}).get("response") or {}
+                if response.get("status_code") == 200:
+                    # Built without validation, as the SDK does for live responses
+                    finished.append((custom_id, body, ChatCompletion.construct(**response["body"]), None))
+                    self.attempts.pop(custom_id, None)
+                    continue
+                message, retryable = request_error(record, batch.status)
+                attempts = self.attempts.get(custom_id, 0) + 1
+                if retryable and attempts < MAX_ATTEMPTS:
+                    BATCH_REQUESTS.inc(model=model, result="retried")
+                    logger.warning(f"Batch request {custom_id} failed ({message}); resending (attempt {attempts}/{MAX_ATTEMPTS})")
+                    self.attempts[custom_id] = attempts
+                    self.queued.discard(custom_id)
+                    self._append(custom_id, body)
+                    continue
+                self.attempts.pop(custom_id, None)
+                finished.append((custom_id, body, None, BatchError(message, attempts)))
+            # Requeued requests are in pending.jsonl before the job is forgotten
+            self._forget(name)
+        self._hand_out(finished, on_result)
+
+    def _forget(self, name):
+        del self.jobs[name]
+        self._save()
+        os.remove(os.path.join(self.folder, name))
+
+    def _hand_out(self, finished, on_result):
+        """Passes (custom_id, body, completion, error) results to `on_result`."""
+        for custom_id, body, completion, error in finished:
+            model = body.get("model", "")
+            if error is None:
+                BATCH_REQUESTS.inc(model=model, result="ok")
+                if completion.usage is not None:
+                    LLM_TOKENS.observe(completion.usage.prompt_tokens or 0, model=model, type="prompt")
+                    LLM_TOKENS.observe(completion.usage.completion_tokens or 0, model=model, type="completion")
+            else:
+                BATCH_REQUESTS.inc(model=model, result="error")
+            try:
+                on_result(custom_id, body, completion, error)
+            except Exception as e:
+                logger.error(f"Applying batch result for {custom_id} failed: {e}")
+            with self.lock:
+                if custom_id not in self.pending:
+                    self.queued.discard(custom_id)
+        with self.lock:
+            BATCH_OPEN.set(len(self.queued))
+
+    def _job_failed(self, name, job, error, on_result):
+        """Schedules the next try of a job whose API call failed, or gives it up after JOB_MAX_FAILURES."""
+        with self.lock:
+            failures = job.get("failures", 0) + 1
+            if failures < JOB_MAX_FAILURES:
+                delay = backoff_delay(failures, base=JOB_RETRY_BASE_SECONDS, cap=JOB_RETRY_MAX_SECONDS)
+                job.update(failures=failures, next_try=time.time() + delay)
+                self._save()
+                logger.warning(f"Batch job {name} failed ({error}); retrying in {delay:.0f}s "
+                               f"(failure {failures}/{JOB_MAX_FAILURES})")
+                return
+            logger.error(f"Giving up on batch job {name} after {failures} failures: {error}")
+            finished = []
+            for request in self._read(os.path.join(self.folder, name)):
+                custom_id = request["custom_id"]
+                attempts = self.attempts.pop(custom_id, 0) + 1
+                finished.append((custom_id, request["body"], None,
+                                 BatchError(f"batch job failed {failures} times: {error}", attempts)))
+            self._forget(name)
+        self._hand_out(finished, on_result)
+
+    def step(self, on_result, force=False):
+        """Sends the pending requests if due (or `force`), uploads unsent jobs and polls running ones.
+
+        A job whose call fails waits out its own backoff; the other jobs go ahead.
+        """
+        with self.lock:
+            due = self.pending and (force or len(self.pending) >= self.max_requests
+                                    or time.time() - self.pending_since >= self.max_wait)
+            if due:
+                self._seal()
+            jobs = list(self.jobs.items())
+        poll = force or time.monotonic() - self.last_poll >= self.poll_seconds
+        for name, job in jobs:
+            if time.time() < job.get("next_try", 0):
+                continue
+            try:
+                if job.get("batch_id") is None:
+                    self._submit(name, job)
+                elif poll:
+                    self._collect(name, job, on_result)
+            except CircuitOpenError as e:
+                # The API is down for every job alike; none of them is charged a failure
+                logger.info(f"Batch jobs waiting: {e}")
+                return
+            except Exception as e:
+                self._job_failed(name, job, e, on_result)
+        if poll:
+            self.last_poll = time.monotonic()
+
+    def run(self, stop, on_result):
+        """Calls `step` about once a second until `stop` (a threading.Event) is set."""
+        while not stop.is_set():
+            self.step(on_result)
+            stop.wait(1.0)
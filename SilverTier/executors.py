@@ -0,0 +1,105 @@
+import time
+import asyncio
+import logging
+from metrics import EXECUTION_SECONDS, EXECUTIONS
+from resilience import CircuitOpenError
+
+logger = logging.getLogger("Executors")
+
+class Executor:
+    """One outbound channel: the Outbox prefix it owns and how its work is run.
+
+    `handler` is an async function taking a list of up to `batch_size` filenames and
+    returning one result per file: None on success, otherwise the exception or an error message.
+    """
+    def __init__(self, channel, prefix, handler, concurrency, max_queue, batch_size):
+        self.channel = channel
+        self.prefix = prefix
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+
+EXECUTORS = []
+
+def register(channel, prefix, concurrency=1, max_queue=100, batch_size=1):
+    """Decorator that registers an async channel handler for files starting with `prefix`."""
+    def decorator(handler):
+        EXECUTORS.append(Executor(channel, prefix, handler, concurrency, max_queue, batch_size))
+        return handler
+    return decorator
+
+def executor_for(filename):
+    for executor in EXECUTORS:
+        if filename.startswith(executor.prefix):
+            return executor
+    return None
+
+class Dispatcher:
+    """Runs every registered channel on its own bounded queue and worker pool.
+
+    A slow channel only backs up its own queue. When a queue is full, `submit` refuses
+    the file and it stays in Outbox until a later scan (back-pressure).
+    """
+    def __init__(self, on_done):
+        self.on_done = on_done
+        self.queues = {}
+        self.in_flight = set()
+        self.workers = []
+
+    async def start(self):
+        for executor in EXECUTORS:
+            queue = asyncio.Queue(maxsize=executor.max_queue)
+            self.queues[executor.channel] = queue
+            for _ in range(executor.concurrency):
+                self.workers.append(asyncio.create_task(self._worker(executor, queue)))
+
+    def submit(self, filename):
+        """Queues a file on its channel. Returns False if it must wait (queue full)."""
+        if filename in self.in_flight:
+            return True
+        executor = executor_for(filename)
+        if executor is None:
+            self.on_done(filename, ValueError("No executor registered for this file type"))
+            return True
+        try:
+            self.queues[executor.channel].put_nowait(filename)
+        except asyncio.QueueFull:
+            return False
+        self.in_flight.add(filename)
+        return True
+
+    async def _worker(self, executor, queue):
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < executor.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            started = time.perf_counter()
+            try:
+                results = await executor.handler(batch)
+            except Exception as e:
+                results = [e] * len(batch)
+            EXECUTION_SECONDS.observe(time.perf_counter() - started, channel=executor.channel)
+            for error in results:
+                result = "ok" if error is None else "deferred" if isinstance(error, CircuitOpenError) else "error"
+                EXECUTIONS.inc(channel=executor.channel, result=result)
+            for filename, error in zip(batch, results):
+                try:
+                    self.on_done(filename, error)
+                except Exception as e:
+                    logger.error(f"Could not finalize {filename}: {e}")
+                self.in_flight.discard(filename)
+                queue.task_done()
+
+    def queue_depths(self):
+        return {channel: queue.qsize() for channel, queue in self.queues.items()}
+
+    async def join(self):
+        for queue in self.queues.values():
+            await queue.join()
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
@@ -1,105 +1,344 @@
 import os
+import json
 import time
-import shutil
+import heapq
+import fnmatch
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from dotenv import load_dotenv
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+from ingest import SeenSet, hash_file
+from vault_storage import atomic_open, move_to_folder, cleanup_temp
+from vault_logging import setup_logging, timed
+from metrics import INTAKE_LAG
 
 # Configuration - Relative to script location
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DROP_ZONE = os.path.join(BASE_DIR, "Drop_Zone")
+load_dotenv(os.path.join(BASE_DIR, ".env"))
 NEEDS_ACTION = os.path.join(BASE_DIR, "Needs_Action")
+# Files whose exact content was already ingested are set aside here instead of queued again
+DUPLICATES = os.path.join(BASE_DIR, "Duplicates")
 LOG_DIR = os.path.join(BASE_DIR, "Logs")
+# Watched roots, include/exclude globs and routing rules; defaults to Drop_Zone -> Needs_Action
+WATCHER_CONFIG = os.getenv("WATCHER_CONFIG", os.path.join(BASE_DIR, "watcher_config.json"))
+
+# A file is moved once its size and mtime have not changed for this long
+STABLE_SECONDS = float(os.getenv("WATCHER_STABLE_SECONDS", "2"))
+# ...or this long after its writer closed it (Linux reports the close)
+CLOSE_CONFIRM_SECONDS = 0.2
+# Files moved into their queues in parallel, and directories listed in parallel by startup scans
+WATCHER_WORKERS = int(os.getenv("WATCHER_WORKERS", "4"))
+SCAN_WORKERS = int(os.getenv("WATCHER_SCAN_WORKERS", "8"))
+# Partial downloads and editor temp files are never moved
+IGNORED_PREFIXES = (".", "~$")
+IGNORED_SUFFIXES = (".part", ".crdownload", ".tmp", ".download")
 
 # Logging Configuration
-if not os.path.exists(LOG_DIR):
-    os.makedirs(LOG_DIR)
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler(os.path.join(LOG_DIR, "system.log")),
-        logging.StreamHandler()
-    ]
-)
+setup_logging(LOG_DIR, "system")
 logger = logging.getLogger("Watcher")
 
+seen = SeenSet()
+
+class WatchRules:
+    """Which files under the watched roots are ingested, and into which queue folder.
+
+    Globs are matched (fnmatch) against the path relative to its root, with "/"
+    separators, and against the bare filename; "*" also crosses directories. The
+    first route whose glob matches decides the queue, a folder inside the vault.
+    """
+    def __init__(self, config):
+        self.roots = [os.path.abspath(os.path.join(BASE_DIR, root)) for root in config.get("roots", ["Drop_Zone"])]
+        self.include = config.get("include", ["*"])
+        self.exclude = config.get("exclude", [])
+        self.routes = [(route["match"], os.path.join(BASE_DIR, route["queue"]))
+                       for route in config.get("routes", [{"match": "*", "queue": "Needs_Action"}])]
+
+    def relative(self, path):
+        """Returns (root, path relative to it), or (None, None) if outside every root."""
+        for root in sorted(self.roots, key=len, reverse=True):
+            if path.startswith(root + os.sep):
+                return root, os.path.relpath(path, root).replace(os.sep, "/")
+        return None, None
+
+    @staticmethod
+    def matches(patterns, rel):
+        name = rel.rsplit("/", 1)[-1]
+        return any(fnmatch.fnmatch(rel, pattern) or fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+    def excluded_dir(self, path):
+        _, rel = self.relative(path)
+        return rel is not None and (self.matches(self.exclude, rel) or self.matches(self.exclude, rel + "/"))
+
+    def route(self, path):
+        """Queue folder for a file, or None if it is not to be ingested."""
+        root, rel = self.relative(path)
+        if rel is None:
+            return None
+        name = os.path.basename(path)
+        if name.startswith(IGNORED_PREFIXES) or name.endswith(IGNORED_SUFFIXES):
+            return None
+        if not self.matches(self.include, rel) or self.matches(self.exclude, rel):
+            return None
+        for pattern, queue in self.routes:
+            if self.matches([pattern], rel):
+                return queue
+        return None
+
+def load_rules():
+    if not os.path.exists(WATCHER_CONFIG):
+        return WatchRules({})
+    with open(WATCHER_CONFIG, "r", encoding="utf-8") as f:
+        return WatchRules(json.load(f))
+
+rules = load_rules()
+
+def ingest_file(src_path):
+    """Moves a settled file into its queue folder and writes its metadata note.
+
+    Content already ingested before (by hash) is moved to Duplicates/ instead, so it
+    never reaches the agent loop twice.
+    """
+    queue = rules.route(src_path)
+    if queue is None:
+        return
+    _, rel = rules.relative(src_path)
+    # The last write is when the file arrived; intake lag runs from then to landing in the queue
+    arrived = os.path.getmtime(src_path)
+    digest = hash_file(src_path)
+    if not seen.add(digest, rel, "filesystem"):
+        move_to_folder(src_path, DUPLICATES)
+        logger.info(f"Skipped duplicate {rel} (same content as {seen.first_name(digest)}), moved to {DUPLICATES}")
+        return
+
+    # Files from sub-folders keep their folder in the name, so a/notes.txt and b/notes.txt do not clash;
+    # an existing file of the same name gets a numbered name instead of being overwritten
+    try:
+        # An atomic rename, or a kernel copy to a hidden temp file from another drive; the name
+        # only appears once the file is complete
+        dest_path = move_to_folder(src_path, queue, rel.replace("/", "__"))
+        filename = os.path.basename(dest_path)
+    except Exception:
+        seen.discard(digest)
+        raise
+    logger.info(f"Moved {rel} to {queue}")
+
+    # Create metadata MD file
+    metadata_filename = f"FILE_{filename}.md"
+    metadata_path = os.path.join(queue, metadata_filename)
+
+    with atomic_open(metadata_path) as f:
+        f.write(f"# Metadata for {filename}\n\n")
+        f.write(f"- **Original Name:** {os.path.basename(src_path)}\n")
+        f.write(f"- **Original Path:** {src_path}\n")
+        f.write(f"- **Timestamp:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"- **Status:** pending\n")
+
+    INTAKE_LAG.observe(max(0.0, time.time() - arrived), source="filesystem")
+    logger.info(f"Created metadata file: {metadata_filename}")
+
+def is_candidate(path):
+    return rules.route(path) is not None
+
+class StabilityTracker:
+    """Decides when a dropped file is completely written, without blocking event threads.
+
+    Each tracked file has a deadline in a min-heap serviced by one timer thread. At
+    each deadline the file is stat'ed: if its size or mtime moved, it is re-armed for
+    another STABLE_SECONDS. It is ready once it has been unchanged for STABLE_SECONDS,
+    or for CLOSE_CONFIRM_SECONDS after the writer closed it (inotify IN_CLOSE_WRITE,
+    Linux only). Ready files are moved by a worker pool, so bulk drops ingest in parallel.
+    """
+    def __init__(self, workers):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self.files = {}
+        self.heap = []
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.thread = threading.Thread(target=self._run, name="stability-timer", daemon=True)
+        self.thread.start()
+
+    def track(self, path, closed=False, delay=0.0):
+        """Starts watching `path`, or fast-tracks it when its writer closed it."""
+        with self.condition:
+            entry = self.files.get(path)
+            if entry is not None and not closed:
+                # Already armed; its next check will see whatever changed
+                return
+            if entry is None:
+                entry = self.files[path] = {"stat": None, "changed": time.monotonic(), "closed": False}
+            if closed:
+                entry["closed"] = True
+                entry["stat"] = None
+                delay = max(delay, CLOSE_CONFIRM_SECONDS)
+            heapq.heappush(self.heap, (time.monotonic() + delay, path))
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.stopped and (not self.heap or self.heap[0][0] > time.monotonic()):
+                    self.condition.wait(self.heap[0][0] - time.monotonic() if self.heap else None)
+                if self.stopped:
+                    return
+                _, path = heapq.heappop(self.heap)
+                entry = self.files.get(path)
+                if entry is None or entry.get("queued"):
+                    continue
+                self._check(path, entry)
+
+    def _check(self, path, entry):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            # Renamed away or deleted before it settled
+            del self.files[path]
+            return
+        now = time.monotonic()
+        current = (st.st_size, st.st_mtime_ns)
+        if current != entry["stat"]:
+            if entry["stat"] is not None:
+                # Still being written; a close no longer vouches for the new bytes
+                entry["closed"] = False
+            entry["stat"] = current
+            entry["changed"] = now
+            wait = CLOSE_CONFIRM_SECONDS if entry["closed"] else STABLE_SECONDS
+            heapq.heappush(self.heap, (now + wait, path))
+            return
+        quiet = now - entry["changed"]
+        needed = CLOSE_CONFIRM_SECONDS if entry["closed"] else STABLE_SECONDS
+        if quiet < needed:
+            heapq.heappush(self.heap, (entry["changed"] + needed, path))
+            return
+        entry["queued"] = True
+        self.pool.submit(self._ingest, path)
+
+    def _ingest(self, path):
+        try:
+            with timed(logger, "ingest", file=os.path.basename(path)):
+                ingest_file(path)
+        except PermissionError as e:
+            # Windows keeps files locked while a copy is still running
+            logger.warning(f"{os.path.basename(path)} is still locked, retrying: {e}")
+            with self.condition:
+                self.files.pop(path, None)
+            self.track(path, delay=STABLE_SECONDS)
+            return
+        except Exception as e:
+            logger.error(f"Error processing {os.path.basename(path)}: {e}")
+        with self.condition:
+            self.files.pop(path, None)
+
+    def pending(self):
+        with self.condition:
+            return len(self.files)
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        self.thread.join()
+        self.pool.shutdown(wait=True)
+
 class WatcherHandler(FileSystemEventHandler):
+    """Forwards events from the watched roots to the stability tracker; never blocks the observer thread."""
+    def __init__(self, tracker, scanner):
+        self.tracker = tracker
+        self.scanner = scanner
+
     def on_created(self, event):
-        if not event.is_directory:
-            filename = os.path.basename(event.src_path)
-            logger.info(f"Detected new file: {filename}")
-            
-            # Wait a moment to ensure file is fully written
-            time.sleep(1)
-            
-            src_path = event.src_path
-            dest_path = os.path.join(NEEDS_ACTION, filename)
-            
-            try:
-                # Move the file
-                shutil.move(src_path, dest_path)
-                logger.info(f"Moved {filename} to {NEEDS_ACTION}")
-                
-                # Create metadata MD file
-                metadata_filename = f"FILE_{filename}.md"
-                metadata_path = os.path.join(NEEDS_ACTION, metadata_filename)
-                
-                with open(metadata_path, "w", encoding="utf-8") as f:
-                    f.write(f"# Metadata for {filename}\n\n")
-                    f.write(f"- **Original Name:** {filename}\n")
-                    f.write(f"- **Timestamp:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                    f.write(f"- **Status:** pending\n")
-                
-                logger.info(f"Created metadata file: {metadata_filename}")
-                
-            except Exception as e:
-                logger.error(f"Error processing {filename}: {e}")
-
-def scan_existing_files():
-    logger.info(f"Scanning for existing files in {DROP_ZONE}...")
-    for filename in os.listdir(DROP_ZONE):
-        src_path = os.path.join(DROP_ZONE, filename)
-        if os.path.isfile(src_path):
-            logger.info(f"Found existing file: {filename}")
-            # Manually trigger the move logic
-            dest_path = os.path.join(NEEDS_ACTION, filename)
-            try:
-                shutil.move(src_path, dest_path)
-                logger.info(f"Moved {filename} to {NEEDS_ACTION}")
-                
-                metadata_filename = f"FILE_{filename}.md"
-                metadata_path = os.path.join(NEEDS_ACTION, metadata_filename)
-                with open(metadata_path, "w", encoding="utf-8") as f:
-                    f.write(f"# Metadata for {filename}\n\n")
-                    f.write(f"- **Original Name:** {filename}\n")
-                    f.write(f"- **Timestamp:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                    f.write(f"- **Status:** pending\n")
-            except Exception as e:
-                logger.error(f"Error moving existing file {filename}: {e}")
+        if event.is_directory:
+            if rules.excluded_dir(event.src_path):
+                return
+            # Some platforms report a copied-in folder without events for its contents
+            self.scanner.submit(scan_tree, [event.src_path], self.tracker)
+        elif is_candidate(event.src_path):
+            logger.info(f"Detected new file: {os.path.basename(event.src_path)}")
+            self.tracker.track(event.src_path)
 
-if __name__ == "__main__":
-    if not os.path.exists(DROP_ZONE):
-        os.makedirs(DROP_ZONE)
-    if not os.path.exists(NEEDS_ACTION):
-        os.makedirs(NEEDS_ACTION)
+    def on_modified(self, event):
+        if not event.is_directory and is_candidate(event.src_path):
+            self.tracker.track(event.src_path)
+
+    def on_closed(self, event):
+        if not event.is_directory and is_candidate(event.src_path):
+            self.tracker.track(event.src_path, closed=True)
 
-    # Scan for files that are already there
-    scan_existing_files()
+    def on_moved(self, event):
+        if event.is_directory:
+            if rules.excluded_dir(event.dest_path):
+                return
+            # A folder dragged in on the same disk arrives as a single rename
+            self.scanner.submit(scan_tree, [event.dest_path], self.tracker)
+        # Downloaders write "name.part" and rename it into place when done
+        elif is_candidate(event.dest_path):
+            logger.info(f"Detected new file: {os.path.basename(event.dest_path)}")
+            self.tracker.track(event.dest_path, closed=True)
+
+def scan_dir(path, tracker):
+    """Tracks the candidate files of one directory; returns its sub-directories to scan next."""
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if not rules.excluded_dir(entry.path):
+                        subdirs.append(entry.path)
+                elif entry.is_file() and is_candidate(entry.path):
+                    # They may still be mid-copy if the watcher started during a drop
+                    tracker.track(entry.path)
+    except OSError as e:
+        logger.warning(f"Could not scan {path}: {e}")
+    return subdirs
 
-    event_handler = WatcherHandler()
+def scan_tree(paths, tracker):
+    """Walks directory trees breadth-first, listing each level's directories in parallel."""
+    started = time.perf_counter()
+    before = tracker.pending()
+    with ThreadPoolExecutor(max_workers=SCAN_WORKERS, thread_name_prefix="scan") as pool:
+        level = list(paths)
+        while level:
+            level = [sub for subdirs in pool.map(scan_dir, level, [tracker] * len(level)) for sub in subdirs]
+    queued = tracker.pending() - before
+    if queued:
+        logger.info(f"Scanned {', '.join(paths)}: {queued} files queued in {time.perf_counter() - started:.2f}s")
+
+def run(stop):
+    """Watches until `stop` (a threading.Event) is set."""
+    for folder in rules.roots + [NEEDS_ACTION]:
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+    for queue in {queue for _, queue in rules.routes}:
+        cleanup_temp(queue)
+
+    tracker = StabilityTracker(WATCHER_WORKERS)
+    # Folders that appear later are scanned here, off the observer thread
+    scanner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rescan")
+
+    event_handler = WatcherHandler(tracker, scanner)
     observer = Observer()
-    observer.schedule(event_handler, DROP_ZONE, recursive=False)
-    
-    logger.info(f"Watching folder: {DROP_ZONE}")
+    for root in rules.roots:
+        observer.schedule(event_handler, root, recursive=True)
+        logger.info(f"Watching folder: {root}")
     observer.start()
-    
+
     try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
+        # Scan for files that are already there; events arriving meanwhile are de-duplicated by the tracker
+        scan_tree(rules.roots, tracker)
+        # Bounded waits so Ctrl+C is still delivered on Windows
+        while not stop.wait(1):
+            pass
+    finally:
         logger.info("Watcher stopping...")
         observer.stop()
-    observer.join()
+        observer.join()
+        scanner.shutdown(wait=True)
+        tracker.stop()
+
+if __name__ == "__main__":
+    try:
+        run(threading.Event())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,117 @@
+import os
+import time
+import math
+import random
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger("Ingest")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SEEN_PATH = os.path.join(BASE_DIR, ".state", "ingested.db")
+
+CHUNK_BYTES = 1024 * 1024
+# Bloom filter sizing: false positives only cost one extra index lookup
+BLOOM_CAPACITY = 1_000_000
+BLOOM_ERROR_RATE = 0.001
+
+CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+def hash_file(path):
+    """Streaming SHA-256 of a file, read in 1 MB chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def hash_parts(*parts):
+    """SHA-256 over several byte/str parts, e.g. an email's headers and body."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8") if isinstance(part, str) else part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def ulid():
+    """26-char ULID: 48-bit millisecond timestamp + 80 random bits, lexically time-ordered."""
+    value = (int(time.time() * 1000) << 80) | random.getrandbits(80)
+    return "".join(CROCKFORD[(value >> shift) & 31] for shift in range(125, -1, -5))
+
+def new_id(prefix):
+    """Readable, collision-free name stem: PREFIX_YYYYmmdd_HHMMSS_<8 random ULID chars>."""
+    return f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{ulid()[-8:]}"
+
+class BloomFilter:
+    """Fixed-size Bloom filter over hex SHA-256 digests (the digest bits are the hash functions)."""
+    def __init__(self, capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE):
+        self.size = int(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, digest):
+        # Double hashing from two independent 64-bit slices of the digest
+        h1 = int(digest[:16], 16)
+        h2 = int(digest[16:32], 16) | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, digest):
+        for position in self._positions(digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, digest):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+class SeenSet:
+    """Persistent set of ingested content hashes, shared by every watcher of a vault.
+
+    The exact index is a SQLite table (WAL, so several watcher processes can use it);
+    an in-memory Bloom filter, rebuilt from it at startup, answers "definitely new"
+    without touching the database. `add` is the authority: it inserts atomically and
+    reports whether the hash was new, even if another process added it meanwhile.
+    """
+    def __init__(self, path=SEEN_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS seen (
+                digest TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                source TEXT,
+                first_seen REAL NOT NULL
+            )
+        """)
+        self.bloom = BloomFilter()
+        count = 0
+        for (digest,) in self.db.execute("SELECT digest FROM seen"):
+            self.bloom.add(digest)
+            count += 1
+        logger.info(f"Seen-set loaded: {count} hashes")
+
+    def first_name(self, digest):
+        """Name the content was first ingested under, or None if it is new."""
+        if digest not in self.bloom:
+            return None
+        with self.lock:
+            row = self.db.execute("SELECT name FROM seen WHERE digest = ?", (digest,)).fetchone()
+        return row[0] if row else None
+
+    def add(self, digest, name, source=None):
+        """Records a hash; returns False if it was already there (a duplicate)."""
+        with self.lock:
+            cursor = self.db.execute(
+                "INSERT OR IGNORE INTO seen (digest, name, source, first_seen) VALUES (?, ?, ?, ?)",
+                (digest, name, source, time.time())
+            )
+            self.bloom.add(digest)
+        return cursor.rowcount == 1
+
+    def discard(self, digest):
+        """Forgets a hash whose ingestion failed, so a retry is not mistaken for a duplicate."""
+        with self.lock:
+            self.db.execute("DELETE FROM seen WHERE digest = ?", (digest,))
@@ -1,6 +1,47 @@
-def main():
-    print("Hello from ai-employee-vault!")
+import os
+import logging
+import importlib
+from dotenv import load_dotenv
+from supervisor import Supervisor
+from vault_logging import setup_logging
+
+# Configuration - loaded once and shared by every service in this process
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(BASE_DIR, ".env"))
+
+LOG_DIR = os.path.join(BASE_DIR, "Logs")
+HEALTH_PATH = os.path.join(BASE_DIR, ".state", "health.json")
+
+# Service name -> module exposing run(stop)
+SERVICES = {
+    "filesystem_watcher": "filesystem_watcher",
+    "gmail_watcher": "Watchers.gmail_watcher",
+    "whatsapp_watcher": "Watchers.whatsapp_watcher",
+    "agent_loop": "agent_loop",
+    "orchestrator": "orchestrator",
+    "metrics": "metrics",
+}
+# Comma-separated subset to run, e.g. "agent_loop,orchestrator"
+ENABLED_SERVICES = [name.strip() for name in os.getenv("SUPERVISOR_SERVICES", ",".join(SERVICES)).split(",") if name.strip()]
 
+# Configured before any service is imported, so their own setup_logging calls are no-ops
+setup_logging(LOG_DIR, "supervisor")
+logger = logging.getLogger("Main")
+
+def service(module_name):
+    """Imports the module on first start, in the service's own thread, so one bad import only stops that service."""
+    def target(stop):
+        importlib.import_module(module_name).run(stop)
+    return target
+
+def main():
+    supervisor = Supervisor(HEALTH_PATH)
+    for name in ENABLED_SERVICES:
+        if name not in SERVICES:
+            logger.error(f"Unknown service '{name}' in SUPERVISOR_SERVICES; choose from {', '.join(SERVICES)}")
+            continue
+        supervisor.add(name, service(SERVICES[name]))
+    supervisor.run()
 
 if __name__ == "__main__":
     main()
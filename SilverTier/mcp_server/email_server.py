@@ -1,5 +1,5 @@
 import os
-import yagmail
+import sys
 from dotenv import load_dotenv
 from fastmcp import FastMCP
 
@@ -7,6 +7,10 @@ from fastmcp import FastMCP
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 load_dotenv(os.path.join(BASE_DIR, ".env"))
 
+# Shared SMTP pool lives in the tier root
+sys.path.append(BASE_DIR)
+from smtp_pool import get_pool
+
 GMAIL_USER = os.getenv("GMAIL_USER")
 GMAIL_APP_PASSWORD = os.getenv("GMAIL_APP_PASSWORD")
 
@@ -14,16 +18,16 @@ mcp = FastMCP("Email Service")
 
 @mcp.tool()
 def send_email(to: str, subject: str, body: str) -> str:
-    \"\"\"
+    """
     Sends an email using Gmail SMTP.
     Requires GMAIL_USER and GMAIL_APP_PASSWORD in .env.
-    \"\"\"
+    The SMTP session is kept open and reused across tool calls.
+    """
     if not GMAIL_USER or not GMAIL_APP_PASSWORD:
         return "Error: GMAIL_USER or GMAIL_APP_PASSWORD not set in .env"
     
     try:
-        yag = yagmail.SMTP(GMAIL_USER, GMAIL_APP_PASSWORD)
-        yag.send(to=to, subject=subject, contents=body)
+        get_pool().send(to, subject, body)
         return f"Email successfully sent to {to}"
     except Exception as e:
         return f"Failed to send email: {str(e)}"
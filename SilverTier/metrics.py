@@ -0,0 +1,290 @@
+import os
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from vault_storage import atomic_write
+
+logger = logging.getLogger("Metrics")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+METRICS_NOTE = os.path.join(BASE_DIR, "Metrics.md")
+
+# Local Prometheus endpoint (http://127.0.0.1:<port>/metrics); "0" turns it off. The only line
+# that differs between the tiers' copies: Silver defaults to 9108, Bronze to 9109, so both can
+# run on one host
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+# How often Metrics.md is re-rendered
+METRICS_NOTE_SECONDS = float(os.getenv("METRICS_NOTE_SECONDS", "60"))
+
+# Seconds, from sub-second file moves up to a day of human approval wait
+TIME_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900, 1800, 3600, 14400, 86400)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+# Vault folders whose file counts are reported; the ones a tier does not have are skipped
+QUEUE_FOLDERS = ("Drop_Zone", "Needs_Action", "Inbox", "Drafts", "Outbox", "Sent", "Done", "Duplicates", "Dead_Letter")
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names, values, extra=None):
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else f"{value:.6g}"
+
+class Metric:
+    """A named family of series, one per combination of label values."""
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self):
+        with self.lock:
+            return dict(self.series)
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def render(self):
+        return self.header() + [f"{self.name}{format_labels(self.labels, key)} {format_value(value)}"
+                                for key, value in sorted(self.samples().items())]
+
+class Gauge(Metric):
+    """A current value; with `collect`, values are computed at scrape time as {label tuple: value}."""
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), collect=None):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.series[self._key(labels)] = value
+
+    def samples(self):
+        if self.collect is not None:
+            return self.collect()
+        return super().samples()
+
+    def render(self):
+        return self.header() + [f"{self.name}{format_labels(self.labels, key)} {format_value(value)}"
+                                for key, value in sorted(self.samples().items())]
+
+class Histogram(Metric):
+    """Cumulative bucket counts, sum, count and max per series."""
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=TIME_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0, "max": 0.0}
+            series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+            series["max"] = max(series["max"], value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self.lock:
+            return {key: {**series, "counts": list(series["counts"])} for key, series in self.series.items()}
+
+    def quantile(self, series, q):
+        """Estimates a quantile by linear interpolation inside the bucket that contains it."""
+        rank = q * series["count"]
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets + (series["max"],), series["counts"]):
+            if count and seen + count >= rank:
+                upper = min(bound, series["max"])
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return series["max"]
+
+    def render(self):
+        lines = self.header()
+        for key, series in sorted(self.samples().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, key, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{format_labels(self.labels, key, le)} {series['count']}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {series['count']}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def get_or_add(self, metric):
+        # Defining a metric twice (e.g. a module imported both as a script and by name) shares one series set
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+def counter(name, help, labels=()):
+    return REGISTRY.get_or_add(Counter(name, help, labels))
+
+def gauge(name, help, labels=(), collect=None):
+    return REGISTRY.get_or_add(Gauge(name, help, labels, collect))
+
+def histogram(name, help, labels=(), buckets=TIME_BUCKETS):
+    return REGISTRY.get_or_add(Histogram(name, help, labels, buckets))
+
+def count_folders():
+    depths = {}
+    for folder in QUEUE_FOLDERS:
+        path = os.path.join(BASE_DIR, folder)
+        if not os.path.isdir(path):
+            continue
+        with os.scandir(path) as entries:
+            depths[(folder,)] = sum(1 for e in entries if e.is_file() and not e.name.startswith("."))
+    return depths
+
+# The pipeline's metrics, shared by every component in the process
+INTAKE_LAG = histogram("vault_intake_lag_seconds",
+                       "Time from an item's arrival (file last written, email Date) to landing in a queue folder", ("source",))
+QUEUE_WAIT = histogram("vault_queue_wait_seconds", "Time an item waited in a queue before a worker started on it", ("stage",))
+STAGE_SECONDS = histogram("vault_stage_seconds", "Processing time of one item in a pipeline stage", ("stage",))
+LLM_SECONDS = histogram("vault_llm_request_seconds", "LLM call duration, including rate-limit waits", ("model",))
+LLM_FIRST_TOKEN = histogram("vault_llm_first_token_seconds", "Time to the first streamed token", ("model",))
+LLM_TOKENS = histogram("vault_llm_tokens", "Tokens per LLM call", ("model", "type"), TOKEN_BUCKETS)
+LLM_CALLS = counter("vault_llm_calls_total", "LLM calls by outcome (ok, error, cache)", ("model", "result"))
+APPROVAL_WAIT = histogram("vault_approval_wait_seconds", "Time from a Draft being created to its approval into Outbox", ("channel",))
+EXECUTION_SECONDS = histogram("vault_execution_seconds", "Outbox execution time per batch", ("channel",))
+EXECUTIONS = counter("vault_executions_total", "Executed Outbox files by outcome (ok, error, deferred)", ("channel", "result"))
+RETRIES = counter("vault_retries_total", "In-process retries of failed dependency calls", ("dependency",))
+CIRCUIT_STATE = gauge("vault_circuit_state", "Circuit breaker state per dependency (0 closed, 1 half-open, 2 open)", ("dependency",))
+DEAD_LETTERS = counter("vault_dead_letters_total", "Items moved to Dead_Letter after repeated failures", ("stage",))
+BATCH_REQUESTS = counter("vault_batch_requests_total", "Batch API requests by outcome (queued, ok, retried, error)", ("model", "result"))
+BATCH_TURNAROUND = histogram("vault_batch_turnaround_seconds", "Time from a batch job's submission to its results")
+BATCH_OPEN = gauge("vault_batch_requests_open", "Batch API requests waiting to be sent or still running")
+FOLDER_FILES = gauge("vault_folder_files", "Files currently in each vault folder", ("folder",), collect=count_folders)
+
+def record_llm_call(model, seconds, usage=None, first_token=None):
+    LLM_CALLS.inc(model=model, result="ok")
+    LLM_SECONDS.observe(seconds, model=model)
+    if first_token is not None:
+        LLM_FIRST_TOKEN.observe(first_token, model=model)
+    if usage is not None:
+        LLM_TOKENS.observe(usage.prompt_tokens or 0, model=model, type="prompt")
+        LLM_TOKENS.observe(usage.completion_tokens or 0, model=model, type="completion")
+
+def render_note():
+    """Metrics.md: latency percentiles, counters and folder depths as Markdown tables."""
+    lines = [
+        "# Pipeline Metrics",
+        "",
+        f"Updated {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, every {METRICS_NOTE_SECONDS:.0f}s. "
+        f"Percentiles are estimated from histogram buckets since the last restart."
+        + (f" Live values: http://{METRICS_HOST}:{METRICS_PORT}/metrics" if METRICS_PORT else ""),
+        "",
+        "## Latency",
+        "",
+        "| Metric | Labels | Count | p50 | p95 | Max |",
+        "|---|---|---|---|---|---|",
+    ]
+    metrics = list(REGISTRY.metrics.values())
+    for metric in metrics:
+        if isinstance(metric, Histogram):
+            for key, series in sorted(metric.samples().items()):
+                if series["count"]:
+                    lines.append(
+                        f"| {metric.name} | {', '.join(key)} | {series['count']} | "
+                        f"{metric.quantile(series, 0.5):.3g} | {metric.quantile(series, 0.95):.3g} | {series['max']:.3g} |")
+    lines += ["", "## Counters", "", "| Metric | Labels | Value |", "|---|---|---|"]
+    for metric in metrics:
+        if isinstance(metric, Counter):
+            for key, value in sorted(metric.samples().items()):
+                lines.append(f"| {metric.name} | {', '.join(key)} | {format_value(value)} |")
+    lines += ["", "## Queue Depth and Circuits", "", "| Metric | Labels | Value |", "|---|---|---|"]
+    for metric in metrics:
+        if isinstance(metric, Gauge):
+            for key, value in sorted(metric.samples().items()):
+                lines.append(f"| {metric.name} | {', '.join(key)} | {format_value(value)} |")
+    return "\n".join(lines) + "\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+def run(stop):
+    """Serves /metrics and refreshes Metrics.md until `stop` (a threading.Event) is set."""
+    server = None
+    if METRICS_PORT:
+        try:
+            server = ThreadingHTTPServer((METRICS_HOST, METRICS_PORT), MetricsHandler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            logger.info(f"Metrics served at http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+        except OSError as e:
+            logger.warning(f"Metrics endpoint unavailable on port {METRICS_PORT}: {e}")
+    try:
+        while True:
+            atomic_write(METRICS_NOTE, render_note())
+            if stop.wait(METRICS_NOTE_SECONDS):
+                break
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
@@ -1,9 +1,19 @@
 import os
-import time
-import shutil
+import sys
+import asyncio
 import logging
-import subprocess
+import threading
 from dotenv import load_dotenv
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+from smtp_pool import get_pool, parse_email_draft
+from executors import register, executor_for, Dispatcher
+from task_ledger import TaskLedger, file_hash, worker_id
+from vault_storage import move_to_folder
+from vault_logging import setup_logging, log_context
+from metrics import APPROVAL_WAIT
+from resilience import CircuitOpenError, breaker, backoff_delay, dead_letter, is_transient
+from Tools.linkedin_poster import PostOutcomeUnknown, submit_post
 
 # Configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -12,64 +22,239 @@ load_dotenv(os.path.join(BASE_DIR, ".env"))
 OUTBOX = os.path.join(BASE_DIR, "Outbox")
 SENT = os.path.join(BASE_DIR, "Sent")
 INBOX = os.path.join(BASE_DIR, "Inbox")
+DEAD_LETTER = os.path.join(BASE_DIR, "Dead_Letter")
 LOG_DIR = os.path.join(BASE_DIR, "Logs")
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler(os.path.join(LOG_DIR, "orchestrator.log")),
-        logging.StreamHandler()
-    ]
-)
+# How often the ledger is re-checked for deferred items and expired leases
+RESCAN_INTERVAL = 5
+# Upper bound on Outbox items leased per dispatch pass
+DISPATCH_LIMIT = 500
+# Sends that fail transiently are retried with backoff this many times before going to Dead_Letter
+MAX_ATTEMPTS = 5
+
+setup_logging(LOG_DIR, "orchestrator")
 logger = logging.getLogger("Orchestrator")
 
-def process_outbox():
-    if not os.path.exists(OUTBOX):
-        return
+ledger = TaskLedger()
+WORKER_ID = worker_id()
+smtp_circuit = breaker("smtp")
+linkedin_circuit = breaker("linkedin")
+# Ledger tasks currently handed to a channel, by filename
+leases = {}
 
-    files = [f for f in os.listdir(OUTBOX) if os.path.isfile(os.path.join(OUTBOX, f))]
-    for filename in files:
-        filepath = os.path.join(OUTBOX, filename)
-        logger.info(f"Executing approved task: {filename}")
-        
-        success = False
-        try:
-            if filename.startswith("EMAIL_"):
-                # Handle Email execution via MCP or script
-                # For simplicity, we'll assume a specific format in the file
-                logger.info("Sending Email...")
-                # subprocess.run(["uv", "run", "mcp_server/email_server.py", ...]) 
-                # Or just use yagmail directly if credentials exist
-                success = True # Placeholder
-            elif filename.startswith("LINKEDIN_"):
-                logger.info("Posting to LinkedIn...")
-                with open(filepath, "r", encoding="utf-8") as f:
-                    content = f.read()
-                subprocess.run(["python", os.path.join(BASE_DIR, "Tools", "linkedin_poster.py"), content])
-                success = True
-            elif filename.startswith("WHATSAPP_"):
-                logger.info("Sending WhatsApp message...")
-                # Call whatsapp tool
-                success = True
-            
-            if success:
-                shutil.move(filepath, os.path.join(SENT, filename))
+def finish(filename, error):
+    """Moves an executed file to Sent; a failed one stays in Outbox for a later retry or goes to Dead_Letter.
+
+    `error` is None on success, otherwise the exception or message the channel reported.
+    """
+    task = leases.pop(filename, None)
+    attempts = task["attempts"] if task else MAX_ATTEMPTS
+    filepath = os.path.join(OUTBOX, filename)
+    with log_context(task_id=task["id"] if task else None, file=filename, stage="outbox"):
+        if error is None:
+            if task:
+                ledger.complete(task["id"])
+            if os.path.exists(filepath):
+                move_to_folder(filepath, SENT)
                 logger.info(f"Successfully executed and moved to Sent: {filename}")
-            else:
-                shutil.move(filepath, os.path.join(INBOX, filename))
-                logger.error(f"Execution failed for {filename}. Moved back to Inbox.")
-                
+        elif isinstance(error, CircuitOpenError) and task:
+            # The channel is down: the file waits it out without using up an attempt
+            ledger.release(task["id"], delay=error.retry_in)
+            logger.warning(f"Deferred {filename}: {error}")
+        elif attempts < MAX_ATTEMPTS and is_transient(error):
+            delay = backoff_delay(attempts)
+            ledger.fail(task["id"], str(error), retry=True, delay=delay)
+            logger.warning(f"Execution failed for {filename} (attempt {attempts}/{MAX_ATTEMPTS}): {error}. "
+                           f"Retrying in {delay:.0f}s.")
+        else:
+            if task:
+                ledger.fail(task["id"], str(error), retry=False)
+            if os.path.exists(filepath):
+                dead_letter(filepath, DEAD_LETTER, "outbox", error, attempts)
+
+def send_outbox_emails(filenames):
+    """Sends a batch of approved emails over the shared SMTP pool."""
+    results = {}
+    drafts = []
+    for filename in filenames:
+        try:
+            drafts.append((filename, parse_email_draft(os.path.join(OUTBOX, filename))))
         except Exception as e:
-            logger.error(f"Error executing {filename}: {e}")
-            shutil.move(filepath, os.path.join(INBOX, filename))
+            # Resending will not fix a malformed draft
+            results[filename] = ValueError(f"Could not read email draft: {e}")
 
-if __name__ == "__main__":
+    if drafts:
+        smtp_circuit.allow()
+        logger.info(f"Sending {len(drafts)} email(s)...")
+        try:
+            errors = get_pool().send_batch([message for _, message in drafts])
+        except Exception as e:
+            smtp_circuit.record(e)
+            raise
+        # One accepted message shows the server is up; refused recipients say nothing about it
+        if any(error is None or not is_transient(error) for error in errors):
+            smtp_circuit.success()
+        else:
+            smtp_circuit.failure()
+        for (filename, _), error in zip(drafts, errors):
+            results[filename] = error
+    return [results[filename] for filename in filenames]
+
+@register("email", "EMAIL_", concurrency=1, batch_size=50)
+async def execute_emails(filenames):
+    return await asyncio.to_thread(send_outbox_emails, filenames)
+
+@register("linkedin", "LINKEDIN_", concurrency=1)
+async def execute_linkedin(filenames):
+    results = []
+    for filename in filenames:
+        logger.info(f"Posting to LinkedIn: {filename}")
+        with open(os.path.join(OUTBOX, filename), "r", encoding="utf-8") as f:
+            content = f.read()
+        try:
+            linkedin_circuit.allow()
+        except CircuitOpenError as e:
+            results.append(e)
+            continue
+        try:
+            result = await asyncio.to_thread(submit_post, content)
+        except ConnectionRefusedError:
+            # Poster service not running, nothing was sent: fall back to a one-off browser session
+            poster = os.path.join(BASE_DIR, "Tools", "linkedin_poster.py")
+            process = await asyncio.create_subprocess_exec(sys.executable, poster, "-", stdin=asyncio.subprocess.PIPE)
+            await process.communicate(content.encode("utf-8"))
+            result = {"ok": process.returncode == 0, "error": f"linkedin_poster.py exited with {process.returncode}"}
+        except PostOutcomeUnknown as e:
+            # Not transient, so it goes to Dead_Letter for a manual check instead of being posted twice
+            logger.error(f"{filename} may already be published: {e}")
+            results.append(e)
+            continue
+        except Exception as e:
+            linkedin_circuit.record(e)
+            results.append(e)
+            continue
+        if result["ok"]:
+            linkedin_circuit.success()
+            logger.info(f"LinkedIn post timings: {result.get('timings')}")
+            results.append(None)
+        else:
+            linkedin_circuit.failure()
+            results.append(result["error"])
+    return results
+
+@register("whatsapp", "WHATSAPP_", concurrency=1)
+async def execute_whatsapp(filenames):
+    logger.info("Sending WhatsApp message...")
+    # Call whatsapp tool
+    return [None] * len(filenames)
+
+def enqueue_outbox_file(filename):
+    """Records an approved file in the ledger and closes its pending Draft entry."""
+    if filename.startswith("."):
+        # Hidden files are in-progress atomic writes, never approved tasks
+        return
+    try:
+        content_hash = file_hash(os.path.join(OUTBOX, filename))
+    except OSError:
+        return
+    ledger.enqueue("outbox", filename, content_hash)
+    waited = ledger.close("drafts", filename)
+    executor = executor_for(filename)
+    if waited is not None and executor is not None:
+        APPROVAL_WAIT.observe(waited, channel=executor.channel)
+
+def scan_outbox():
+    """Startup reconciliation: enqueue whatever was approved while the orchestrator was down."""
+    if not os.path.exists(OUTBOX):
+        return
+    with os.scandir(OUTBOX) as entries:
+        for entry in entries:
+            if entry.is_file():
+                enqueue_outbox_file(entry.name)
+
+def dispatch_pending(dispatcher):
+    """Leases pending Outbox tasks and hands them to their channels; returns how many were deferred."""
+    deferred = 0
+    for task in ledger.claim("outbox", WORKER_ID, limit=DISPATCH_LIMIT):
+        leases[task["name"]] = task
+        if not dispatcher.submit(task["name"]):
+            leases.pop(task["name"], None)
+            ledger.release(task["id"])
+            deferred += 1
+    if deferred:
+        logger.warning(f"{deferred} file(s) waiting for channel capacity. Queue depths: {dispatcher.queue_depths()}")
+    return deferred
+
+async def drain_outbox():
+    dispatcher = Dispatcher(finish)
+    await dispatcher.start()
+    try:
+        scan_outbox()
+        while True:
+            deferred = dispatch_pending(dispatcher)
+            await dispatcher.join()
+            if not deferred:
+                break
+    finally:
+        await dispatcher.stop()
+
+def process_outbox():
+    """One-shot pass: execute everything currently in Outbox and wait for it to finish."""
+    asyncio.run(drain_outbox())
+
+class OutboxHandler(FileSystemEventHandler):
+    """Hands a file to the dispatcher loop as soon as a draft is approved into Outbox."""
+    def __init__(self, loop, on_file):
+        self.loop = loop
+        self.on_file = on_file
+
+    def _notify(self, path):
+        if os.path.dirname(path) == OUTBOX:
+            self.loop.call_soon_threadsafe(self.on_file, os.path.basename(path))
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self._notify(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self._notify(event.dest_path)
+
+async def run_orchestrator(stop):
+    dispatcher = Dispatcher(finish)
+    await dispatcher.start()
+
+    def on_file(filename):
+        enqueue_outbox_file(filename)
+        dispatch_pending(dispatcher)
+
+    observer = Observer()
+    observer.schedule(OutboxHandler(asyncio.get_running_loop(), on_file), OUTBOX, recursive=False)
+    observer.start()
+    try:
+        scan_outbox()
+        while not stop.is_set():
+            dispatch_pending(dispatcher)
+            # Waits on the stop event off-loop, so shutdown does not sit out the rescan interval
+            await asyncio.to_thread(stop.wait, RESCAN_INTERVAL)
+    finally:
+        observer.stop()
+        observer.join()
+        await dispatcher.stop()
+        get_pool().close()
+
+def run(stop):
+    """Executes approved Outbox files until `stop` (a threading.Event) is set."""
     for folder in [OUTBOX, SENT, INBOX]:
         if not os.path.exists(folder):
             os.makedirs(folder)
 
     logger.info("Silver Tier Orchestrator started. Monitoring Outbox...")
-    while True:
-        process_outbox()
-        time.sleep(5)
+    asyncio.run(run_orchestrator(stop))
+    logger.info("Orchestrator stopped.")
+
+if __name__ == "__main__":
+    try:
+        run(threading.Event())
+    except KeyboardInterrupt:
+        logger.info("Orchestrator stopped.")
@@ -0,0 +1,122 @@
+import os
+import re
+import threading
+from collections import deque
+
+# Score weights; higher scores are processed first
+SENDER_WEIGHT = 100
+KEYWORD_WEIGHT = 50
+CHANNEL_WEIGHTS = {"EMAIL_": 10}
+BULK_WEIGHT = -20
+
+KEYWORDS = re.compile(r"\bpayments?\b|\binvoices?\b|\burgent\b|\basap\b|\bdeadline\b|\bcontract\b", re.IGNORECASE)
+BULK = re.compile(r"no-?reply|do-?not-?reply|newsletter|unsubscribe", re.IGNORECASE)
+SENDER_LINE = re.compile(r"^# New Email from (.+)$", re.MULTILINE)
+EMAIL_ADDRESS = re.compile(r"[\w.+-]+@[\w-]+(\.[\w-]+)+")
+SECTION = re.compile(r"^##\s+Priority Senders\s*$", re.IGNORECASE)
+
+# Only the head of a file is scored; sender and subject are at the top
+SCORE_READ_BYTES = 4096
+WAIT_SAMPLES = 1000
+
+class PriorityRules:
+    """Sender allowlist from the "## Priority Senders" list in Company_Handbook.md.
+
+    Entries are full addresses or "@domain" suffixes. The handbook is re-read when it
+    changes, so edits take effect without a restart.
+    """
+    def __init__(self, handbook_path):
+        self.path = handbook_path
+        self.mtime = None
+        self.senders = set()
+        self.lock = threading.Lock()
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            self.senders = set()
+            return
+        if mtime == self.mtime:
+            return
+        senders = set()
+        with open(self.path, "r", encoding="utf-8", errors="ignore") as f:
+            in_section = False
+            for line in f:
+                if line.startswith("#"):
+                    in_section = bool(SECTION.match(line.strip()))
+                elif in_section and line.startswith("- "):
+                    senders.add(line[2:].strip().strip("`").lower())
+        self.senders = senders
+        self.mtime = mtime
+
+    def is_priority_sender(self, sender):
+        with self.lock:
+            self._reload()
+            senders = self.senders
+        match = EMAIL_ADDRESS.search(sender)
+        address = match.group(0).lower() if match else sender.strip().lower()
+        return any(address == entry or (entry.startswith("@") and address.endswith(entry)) for entry in senders)
+
+    def score(self, filename, text):
+        """Static score of an item (without age) from its name and the head of its content."""
+        score = 0
+        sender_match = SENDER_LINE.search(text)
+        if sender_match and self.is_priority_sender(sender_match.group(1)):
+            score += SENDER_WEIGHT
+        if KEYWORDS.search(text):
+            score += KEYWORD_WEIGHT
+        if BULK.search(text):
+            score += BULK_WEIGHT
+        for prefix, weight in CHANNEL_WEIGHTS.items():
+            if filename.startswith(prefix):
+                score += weight
+        return score
+
+    def score_file(self, path):
+        try:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                text = f.read(SCORE_READ_BYTES)
+        except OSError:
+            return 0
+        return self.score(os.path.basename(path), text)
+
+def priority_class(score):
+    if score >= KEYWORD_WEIGHT:
+        return "high"
+    if score < 0:
+        return "low"
+    return "normal"
+
+class WaitStats:
+    """Queue wait times (arrival to start of processing), kept per priority class."""
+    def __init__(self):
+        self.samples = {}
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def add(self, cls, seconds):
+        with self.lock:
+            self.total += 1
+            self.samples.setdefault(cls, deque(maxlen=WAIT_SAMPLES)).append(seconds)
+
+    def summary(self):
+        """{class: {"count", "p50", "p95", "max"}} over the most recent samples."""
+        with self.lock:
+            snapshot = {cls: sorted(samples) for cls, samples in self.samples.items()}
+        result = {}
+        for cls, values in snapshot.items():
+            if not values:
+                continue
+            result[cls] = {
+                "count": len(values),
+                "p50": values[len(values) // 2],
+                "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "max": values[-1],
+            }
+        return result
+
+    def __str__(self):
+        parts = [f"{cls} n={s['count']} p50={s['p50']:.1f}s p95={s['p95']:.1f}s max={s['max']:.1f}s"
+                 for cls, s in sorted(self.summary().items())]
+        return "; ".join(parts) or "no samples"
@@ -0,0 +1,66 @@
+import time
+import logging
+import threading
+from openai import RateLimitError
+
+logger = logging.getLogger("RateLimiter")
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every worker that talks to the LLM.
+
+    `rate` tokens are added per second up to `capacity`. A 429 response pauses the
+    whole bucket for the server's Retry-After, so other workers back off as well.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+def retry_after_seconds(error, default=5.0):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            return float(value) * scale
+        except ValueError:
+            pass
+    return default
+
+def rate_limited_call(bucket, fn, *args, max_attempts=3, **kwargs):
+    """Calls `fn` once a token is available, honoring Retry-After on 429 responses."""
+    for attempt in range(1, max_attempts + 1):
+        bucket.acquire()
+        try:
+            return fn(*args, **kwargs)
+        except RateLimitError as e:
+            if attempt == max_attempts:
+                raise
+            delay = retry_after_seconds(e)
+            logger.warning(f"Rate limited by API, pausing all workers for {delay:.1f}s (attempt {attempt}/{max_attempts})")
+            bucket.pause(delay)
@@ -0,0 +1,197 @@
+import os
+import time
+import random
+import imaplib
+import smtplib
+import logging
+import threading
+from datetime import datetime
+import openai
+from vault_storage import atomic_write, move_to_folder
+from metrics import CIRCUIT_STATE, RETRIES, DEAD_LETTERS
+
+logger = logging.getLogger("Resilience")
+
+# Jittered exponential backoff between attempts: BASE, 2*BASE, 4*BASE, ... up to MAX
+RETRY_BASE_SECONDS = float(os.getenv("RETRY_BASE_SECONDS", "2"))
+RETRY_MAX_SECONDS = float(os.getenv("RETRY_MAX_SECONDS", "600"))
+# Consecutive failures that open a dependency's circuit, and how long it stays open
+# before one probe call is let through (doubled after every failed probe)
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+BREAKER_MAX_RESET_SECONDS = 600
+
+# Errors worth retrying: the dependency may answer next time. Anything else (a bad
+# request, a refused recipient, an unreadable file) fails the same way every time.
+TRANSIENT_ERRORS = (
+    # Sockets: refused, reset, timed out (smtplib errors are OSErrors too, handled first)
+    OSError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+    imaplib.IMAP4.abort,
+)
+PERMANENT_OS_ERRORS = (FileNotFoundError, IsADirectoryError, NotADirectoryError, PermissionError)
+
+STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+def backoff_delay(attempt, base=RETRY_BASE_SECONDS, cap=RETRY_MAX_SECONDS):
+    """Delay before retry number `attempt` (1-based): base * 2^(attempt-1), plus up to as much jitter."""
+    delay = min(cap, base * 2 ** max(0, attempt - 1))
+    return min(cap, delay + random.uniform(0, delay))
+
+def is_transient(error):
+    """True for errors a later attempt may not hit. Channel results that are plain strings count as transient."""
+    if not isinstance(error, BaseException):
+        return True
+    if isinstance(error, CircuitOpenError):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        # 4xx replies are temporary by definition (greylisting, mailbox busy)
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPException):
+        return isinstance(error, smtplib.SMTPServerDisconnected)
+    if isinstance(error, PERMANENT_OS_ERRORS):
+        return False
+    return isinstance(error, TRANSIENT_ERRORS)
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+    def __init__(self, name, retry_in):
+        super().__init__(f"{name} circuit open, retrying in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+class CircuitBreaker:
+    """Stops calling a dependency after repeated transient failures.
+
+    Closed: calls go through, consecutive failures are counted. After `failures` of
+    them the circuit opens and calls fail fast with CircuitOpenError. Once
+    `reset_seconds` have passed it is half-open: a single probe call goes through, and
+    closes the circuit if it succeeds or reopens it for twice as long if it fails.
+    """
+    def __init__(self, name, failures=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failures
+        self.base_reset = reset_seconds
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+        CIRCUIT_STATE.set(0, dependency=name)
+
+    def _set_state(self, state):
+        if state != self.state:
+            logger.warning(f"Circuit for {self.name}: {self.state} -> {state}"
+                           + (f" for {self.reset_seconds:.0f}s" if state == "open" else ""))
+            self.state = state
+            CIRCUIT_STATE.set(STATE_VALUES[state], dependency=self.name)
+
+    def retry_in(self):
+        """Seconds until the next call may go through (0 when closed)."""
+        with self.lock:
+            if self.state == "closed":
+                return 0.0
+            return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def allow(self):
+        """Raises CircuitOpenError unless a call may go through now."""
+        with self.lock:
+            if self.state == "closed":
+                return
+            remaining = self.opened_at + self.reset_seconds - time.monotonic()
+            if remaining > 0 or self.probing:
+                raise CircuitOpenError(self.name, max(remaining, 1.0))
+            # Exactly one caller probes; the rest keep failing fast until it reports back
+            self._set_state("half_open")
+            self.probing = True
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.probing = False
+            self.reset_seconds = self.base_reset
+            self._set_state("closed")
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == "half_open":
+                self.reset_seconds = min(self.reset_seconds * 2, BREAKER_MAX_RESET_SECONDS)
+            elif self.failures < self.failure_threshold:
+                return
+            self.probing = False
+            self.opened_at = time.monotonic()
+            self._set_state("open")
+
+    def record(self, error):
+        """Reports a call's outcome: None for success; only transient errors count against the circuit."""
+        if error is None or not is_transient(error):
+            self.success()
+        else:
+            self.failure()
+
+    def call(self, fn, *args, **kwargs):
+        self.allow()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.record(e)
+            raise
+        self.success()
+        return result
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def breaker(name):
+    """The process-wide breaker for a dependency ("openai", "smtp", "imap", "linkedin")."""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+def retry_call(circuit, fn, *args, attempts=3, base=1.0, cap=30.0, **kwargs):
+    """Calls `fn` through the `circuit` breaker, retrying transient errors with jittered backoff.
+
+    For short in-process retries; work that keeps failing is retried later by its
+    queue instead. Raises CircuitOpenError at once, without waiting, if the circuit is open.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return circuit.call(fn, *args, **kwargs)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            if attempt == attempts or not is_transient(e):
+                raise
+            delay = backoff_delay(attempt, base, cap)
+            RETRIES.inc(dependency=circuit.name)
+            logger.warning(f"{circuit.name} call failed ({e}), retrying in {delay:.1f}s (attempt {attempt}/{attempts})")
+            time.sleep(delay)
+
+def dead_letter(path, folder, stage, error, attempts):
+    """Moves a file that keeps failing to `folder` (Dead_Letter/) with a note explaining why.
+
+    The note sits next to it as "<name>.failure.md". Moving the file back to the folder
+    it came from retries it.
+    """
+    dest = move_to_folder(path, folder)
+    atomic_write(dest + ".failure.md", (
+        "---\n"
+        f"file: {os.path.basename(dest)}\n"
+        f"stage: {stage}\n"
+        f"source: {os.path.basename(os.path.dirname(path))}\n"
+        f"attempts: {attempts}\n"
+        f"failed_at: {datetime.now().isoformat(timespec='seconds')}\n"
+        "---\n\n"
+        f"# Failed: {os.path.basename(path)}\n\n"
+        f"Gave up after {attempts} attempt(s) in the {stage} stage.\n\n"
+        f"**Last error:** {error}\n\n"
+        f"To retry, move the file back to `{os.path.basename(os.path.dirname(path))}/`.\n"
+    ))
+    DEAD_LETTERS.inc(stage=stage)
+    logger.error(f"Moved {os.path.basename(path)} to {os.path.basename(folder)} after {attempts} attempt(s): {error}")
+    return dest
@@ -1,6 +1,7 @@
 import os
-import yagmail
 from dotenv import load_dotenv
+from smtp_pool import get_pool, parse_email_draft
+from vault_storage import move_to_folder
 
 # Configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -15,8 +16,7 @@ def send_reply(to, subject, body):
         return False
     
     try:
-        yag = yagmail.SMTP(GMAIL_USER, GMAIL_APP_PASSWORD)
-        yag.send(to=to, subject=subject, contents=body)
+        get_pool().send(to, subject, body)
         print(f"Email successfully sent to {to}")
         return True
     except Exception as e:
@@ -26,16 +26,10 @@ def send_reply(to, subject, body):
 if __name__ == "__main__":
     reply_file = os.path.join(BASE_DIR, "Outbox", "EMAIL_REPLY_20260221_131744.md")
     if os.path.exists(reply_file):
-        with open(reply_file, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-            to = lines[0].replace("To: ", "").strip()
-            subject = lines[1].replace("Subject: ", "").strip()
-            body = "".join(lines[3:])
-            
-            if send_reply(to, subject, body):
-                sent_dir = os.path.join(BASE_DIR, "Sent")
-                if not os.path.exists(sent_dir):
-                    os.makedirs(sent_dir)
-                os.rename(reply_file, os.path.join(sent_dir, "EMAIL_REPLY_20260221_131744.md"))
+        to, subject, body = parse_email_draft(reply_file)
+        
+        if send_reply(to, subject, body):
+            move_to_folder(reply_file, os.path.join(BASE_DIR, "Sent"))
+        get_pool().close()
     else:
         print("Reply file not found in Outbox.")
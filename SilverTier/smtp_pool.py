@@ -0,0 +1,182 @@
+import os
+import time
+import queue
+import smtplib
+import logging
+import threading
+from contextlib import contextmanager
+from email.message import EmailMessage
+from dotenv import load_dotenv
+
+# Configuration
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(BASE_DIR, ".env"))
+
+GMAIL_USER = os.getenv("GMAIL_USER")
+GMAIL_APP_PASSWORD = os.getenv("GMAIL_APP_PASSWORD")
+
+# SMTP endpoint (overridable so sends can go to a local sink server)
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_SSL = os.getenv("SMTP_SSL", "true").lower() == "true"
+SMTP_LOGIN = os.getenv("SMTP_LOGIN", "true").lower() == "true"
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
+# Idle sessions older than this are checked with NOOP before reuse
+SMTP_KEEPALIVE_SECONDS = 60
+
+logger = logging.getLogger("SMTPPool")
+
+def parse_email_draft(path):
+    """Reads an approved reply file: "To:" line, "Subject:" line, blank line, body.
+
+    Raises ValueError for anything else, e.g. an unedited EMAIL_ note that still starts
+    with "# New Email from ...", so it is dead-lettered instead of mailed to its sender.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    if len(lines) < 2 or not lines[0].startswith("To:") or not lines[1].startswith("Subject:"):
+        raise ValueError("draft does not start with \"To:\" and \"Subject:\" lines")
+    to = lines[0][len("To:"):].strip()
+    subject = lines[1][len("Subject:"):].strip()
+    if not to:
+        raise ValueError("draft has an empty \"To:\" line")
+    body = "".join(lines[3:])
+    return to, subject, body
+
+class SMTPPool:
+    """Thread-safe pool of authenticated SMTP sessions.
+
+    Sessions are reused across sends instead of paying a TLS handshake and AUTH per
+    message. A session that was dropped by the server is replaced transparently.
+    """
+    def __init__(self, size=SMTP_POOL_SIZE):
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        if SMTP_SSL:
+            smtp = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=30)
+        else:
+            smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30)
+        if SMTP_LOGIN:
+            smtp.login(GMAIL_USER, GMAIL_APP_PASSWORD)
+        logger.info(f"Opened SMTP session to {SMTP_HOST}:{SMTP_PORT}")
+        return smtp
+
+    def _checkout(self):
+        while True:
+            try:
+                smtp, last_used = self.idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - last_used < SMTP_KEEPALIVE_SECONDS:
+                return smtp
+            try:
+                if smtp.noop()[0] == 250:
+                    return smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._discard(smtp)
+
+    def _discard(self, smtp):
+        try:
+            smtp.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def session(self):
+        with self.slots:
+            smtp = self._checkout()
+            healthy = True
+            try:
+                yield smtp
+            except BaseException:
+                # The session may be mid-command; never hand it to the next sender
+                healthy = False
+                raise
+            finally:
+                if healthy:
+                    self.idle.put((smtp, time.monotonic()))
+                else:
+                    self._discard(smtp)
+
+    def _send(self, smtp, to, subject, body):
+        msg = EmailMessage()
+        msg["From"] = GMAIL_USER
+        msg["To"] = to
+        msg["Subject"] = subject
+        msg.set_content(body)
+        smtp.send_message(msg)
+
+    def send(self, to, subject, body):
+        """Sends one message, retrying once on a fresh session if the pooled one was dropped."""
+        for attempt in (1, 2):
+            try:
+                with self.session() as smtp:
+                    self._send(smtp, to, subject, body)
+                return
+            except (smtplib.SMTPServerDisconnected, OSError):
+                if attempt == 2:
+                    raise
+
+    def send_batch(self, messages):
+        """Sends (to, subject, body) tuples over one session; returns an exception or None per message.
+
+        A message whose session drops is retried once on a fresh one, as in send(). If no
+        session can be opened at all, the rest of the batch fails at once instead of
+        reconnecting once per message.
+        """
+        results = []
+        pending = list(messages)
+        retried = False
+        while pending:
+            smtp = None
+            try:
+                with self.session() as smtp:
+                    while pending:
+                        to, subject, body = pending[0]
+                        try:
+                            self._send(smtp, to, subject, body)
+                            results.append(None)
+                        except smtplib.SMTPRecipientsRefused as e:
+                            results.append(e)
+                        pending.pop(0)
+                        retried = False
+            except (smtplib.SMTPException, OSError) as e:
+                if smtp is None:
+                    logger.warning(f"Could not open an SMTP session, failing {len(pending)} message(s): {e}")
+                    results.extend(e for _ in pending)
+                    return results
+                if isinstance(e, (smtplib.SMTPServerDisconnected, OSError)) and not retried:
+                    # Retry the message that was in flight on a new session
+                    logger.warning(f"SMTP session dropped mid-batch, reconnecting: {e}")
+                    retried = True
+                    continue
+                logger.warning(f"SMTP send failed mid-batch: {e}")
+                pending.pop(0)
+                results.append(e)
+                retried = False
+        return results
+
+    def close(self):
+        while True:
+            try:
+                smtp, _ = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                smtp.quit()
+            except Exception:
+                self._discard(smtp)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Process-wide pool shared by the orchestrator, send_reply and the MCP email server."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SMTPPool()
+        return _pool
@@ -0,0 +1,140 @@
+import json
+import time
+import signal
+import logging
+import threading
+import traceback
+from vault_storage import atomic_write
+
+logger = logging.getLogger("Supervisor")
+
+# How often services are checked and the health file is rewritten
+HEALTH_CHECK_SECONDS = 5
+# Crash restarts back off exponentially up to this delay...
+MAX_RESTART_DELAY = 300
+# ...and the backoff resets once a service has stayed up this long
+STABLE_RUN_SECONDS = 60
+# Time each service gets to stop on shutdown before the process exits anyway
+SHUTDOWN_TIMEOUT = 30
+
+class Service:
+    """One long-running component, run as `target(stop)` in its own thread.
+
+    `target` must return soon after `stop` (a threading.Event) is set. Returning
+    on its own means the service is finished (e.g. not configured); raising means
+    it crashed and is restarted with backoff.
+    """
+    def __init__(self, name, target):
+        self.name = name
+        self.target = target
+        self.thread = None
+        self.state = "new"
+        self.started = None
+        self.restarts = 0
+        self.failures = 0
+        self.last_error = None
+        self.restart_at = None
+
+    def start(self, stop):
+        self.state = "running"
+        self.started = time.time()
+        self.restart_at = None
+        self.thread = threading.Thread(target=self._run, args=(stop,), name=self.name, daemon=True)
+        self.thread.start()
+
+    def _run(self, stop):
+        try:
+            self.target(stop)
+            self.state = "stopped" if stop.is_set() else "finished"
+        except BaseException as e:
+            self.state = "crashed"
+            self.last_error = f"{type(e).__name__}: {e}"
+            logger.error(f"Service {self.name} crashed:\n{traceback.format_exc()}")
+
+    def alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def health(self):
+        now = time.time()
+        return {
+            "state": self.state,
+            "uptime": round(now - self.started, 1) if self.started and self.alive() else 0,
+            "restarts": self.restarts,
+            "last_error": self.last_error,
+        }
+
+class Supervisor:
+    """Runs every watcher and loop of a vault in one process.
+
+    Services share the interpreter, so configuration, the API client, caches and
+    databases are loaded once. Crashed services are restarted with exponential
+    backoff, health is written to `health_path` for external checks, and SIGINT/
+    SIGTERM stop all services gracefully.
+    """
+    def __init__(self, health_path):
+        self.health_path = health_path
+        self.services = []
+        self.stop = threading.Event()
+
+    def add(self, name, target):
+        self.services.append(Service(name, target))
+
+    def _schedule_restart(self, service):
+        if service.started and time.time() - service.started >= STABLE_RUN_SECONDS:
+            service.failures = 0
+        delay = min(2 ** service.failures, MAX_RESTART_DELAY)
+        service.failures += 1
+        service.restart_at = time.time() + delay
+        service.state = "restarting"
+        logger.warning(f"Restarting {service.name} in {delay}s (restart #{service.restarts + 1})")
+
+    def check(self):
+        """Restarts crashed services that are due and writes the health file."""
+        now = time.time()
+        for service in self.services:
+            if service.alive() or self.stop.is_set():
+                continue
+            if service.state == "crashed":
+                self._schedule_restart(service)
+            elif service.state == "restarting" and now >= service.restart_at:
+                service.restarts += 1
+                service.start(self.stop)
+        self.write_health()
+
+    def write_health(self):
+        health = {
+            "updated": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "services": {service.name: service.health() for service in self.services},
+        }
+        try:
+            atomic_write(self.health_path, json.dumps(health, indent=2))
+        except OSError as e:
+            logger.warning(f"Could not write health file: {e}")
+
+    def _on_signal(self, signum, frame):
+        logger.info(f"Received signal {signum}, shutting down...")
+        self.stop.set()
+
+    def run(self):
+        """Starts all services and supervises them until SIGINT/SIGTERM."""
+        signal.signal(signal.SIGTERM, self._on_signal)
+        for service in self.services:
+            service.start(self.stop)
+        logger.info(f"Supervisor started: {', '.join(s.name for s in self.services)}")
+        try:
+            while not self.stop.wait(HEALTH_CHECK_SECONDS):
+                self.check()
+        except KeyboardInterrupt:
+            logger.info("Interrupted, shutting down...")
+        self.shutdown()
+
+    def shutdown(self):
+        self.stop.set()
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        for service in self.services:
+            if service.thread is not None:
+                service.thread.join(max(0, deadline - time.monotonic()))
+            if service.alive():
+                logger.warning(f"Service {service.name} did not stop within {SHUTDOWN_TIMEOUT}s")
+        self.write_health()
+        logger.info("Supervisor stopped.")
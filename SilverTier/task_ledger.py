@@ -0,0 +1,160 @@
+import os
+import time
+import socket
+import sqlite3
+import hashlib
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LEDGER_PATH = os.path.join(BASE_DIR, ".state", "tasks.db")
+
+# A claimed task whose worker died becomes claimable again after this long
+DEFAULT_LEASE_SECONDS = 600
+
+def file_hash(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+class TaskLedger:
+    """SQLite (WAL) ledger of every vault item and the pipeline stage it is in.
+
+    Folders stay the human-facing view; the ledger is what workers schedule from.
+    Each row is one item in one stage ("inbox", "drafts", "outbox", ...). A worker
+    claims a pending row with a time-limited lease, then completes or fails it, so
+    several processes can pull from the same stage without double-processing.
+    """
+    def __init__(self, path=LEDGER_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.local = threading.local()
+        self._db().executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY,
+                stage TEXT NOT NULL,
+                name TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                content_hash TEXT,
+                priority REAL NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                last_error TEXT,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS tasks_active
+                ON tasks (stage, name) WHERE status IN ('pending', 'leased');
+            CREATE INDEX IF NOT EXISTS tasks_claimable ON tasks (stage, status, created);
+        """)
+        columns = [row["name"] for row in self._db().execute("PRAGMA table_info(tasks)")]
+        if "priority" not in columns:
+            self._db().execute("ALTER TABLE tasks ADD COLUMN priority REAL NOT NULL DEFAULT 0")
+        if "available_at" not in columns:
+            self._db().execute("ALTER TABLE tasks ADD COLUMN available_at REAL NOT NULL DEFAULT 0")
+
+    def _db(self):
+        # One connection per thread; WAL lets readers proceed while a writer commits
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+        return db
+
+    def enqueue(self, stage, name, content_hash=None, priority=0):
+        """Records a pending item; a no-op if the same item is already pending or leased."""
+        now = time.time()
+        self._db().execute(
+            "INSERT OR IGNORE INTO tasks (stage, name, content_hash, priority, created, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (stage, name, content_hash, priority, now, now)
+        )
+
+    def claim(self, stage, owner, limit=1, lease_seconds=DEFAULT_LEASE_SECONDS, name=None, aging_seconds=None):
+        """Atomically leases up to `limit` pending (or lease-expired) items of a stage.
+
+        Items deferred by a failed attempt are skipped until their backoff has passed.
+        Items are taken oldest first, or, with `aging_seconds`, highest priority first
+        where waiting `aging_seconds` is worth one priority point (so nothing starves).
+        """
+        db = self._db()
+        now = time.time()
+        query = (
+            "SELECT id FROM tasks WHERE stage = ? AND "
+            "((status = 'pending' AND available_at <= ?) OR (status = 'leased' AND lease_expires < ?))"
+        )
+        params = [stage, now, now]
+        if name is not None:
+            query += " AND name = ?"
+            params.append(name)
+        if aging_seconds:
+            query += " ORDER BY priority + (? - created) / ? DESC, created LIMIT ?"
+            params += [now, aging_seconds, limit]
+        else:
+            query += " ORDER BY created LIMIT ?"
+            params.append(limit)
+
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            ids = [row["id"] for row in db.execute(query, params)]
+            for task_id in ids:
+                db.execute(
+                    "UPDATE tasks SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+                    "attempts = attempts + 1, updated = ? WHERE id = ?",
+                    (owner, now + lease_seconds, now, task_id)
+                )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        if not ids:
+            return []
+        marks = ",".join("?" * len(ids))
+        rows = {row["id"]: dict(row) for row in db.execute(f"SELECT * FROM tasks WHERE id IN ({marks})", ids)}
+        return [rows[task_id] for task_id in ids]
+
+    def complete(self, task_id):
+        self._db().execute(
+            "UPDATE tasks SET status = 'done', lease_owner = NULL, lease_expires = NULL, updated = ? WHERE id = ?",
+            (time.time(), task_id)
+        )
+
+    def fail(self, task_id, error, retry=True, delay=0):
+        """Records an error and either returns the item to pending (claimable after `delay` seconds) or marks it failed."""
+        now = time.time()
+        self._db().execute(
+            "UPDATE tasks SET status = ?, last_error = ?, lease_owner = NULL, lease_expires = NULL, "
+            "available_at = ?, updated = ? WHERE id = ?",
+            ("pending" if retry else "failed", error, now + delay, now, task_id)
+        )
+
+    def release(self, task_id, delay=0):
+        """Gives a lease back without counting it as an attempt, claimable again after `delay` seconds."""
+        now = time.time()
+        self._db().execute(
+            "UPDATE tasks SET status = 'pending', attempts = MAX(attempts - 1, 0), lease_owner = NULL, "
+            "lease_expires = NULL, available_at = ?, updated = ? WHERE id = ?",
+            (now + delay, now, task_id)
+        )
+
+    def close(self, stage, name):
+        """Marks an item done without a lease, e.g. a Draft once the human has approved it.
+
+        Returns how long it had been waiting in seconds, or None if nothing was pending.
+        """
+        now = time.time()
+        row = self._db().execute(
+            "UPDATE tasks SET status = 'done', updated = ? WHERE stage = ? AND name = ? AND status = 'pending' "
+            "RETURNING created",
+            (now, stage, name)
+        ).fetchone()
+        return now - row["created"] if row else None
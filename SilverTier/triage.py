@@ -0,0 +1,186 @@
+import os
+import re
+import math
+import logging
+from collections import Counter
+
+logger = logging.getLogger("Triage")
+
+CHANNELS = ("EMAIL", "LINKEDIN", "WHATSAPP")
+
+# Rules are checked against the sender and subject of Inbox emails (or the whole text otherwise)
+AUTO_REPLY = re.compile(
+    r"automatic reply|auto-?reply|out of (the )?office|undeliverable|delivery status notification|"
+    r"mailer-daemon|postmaster@", re.IGNORECASE)
+BULK_SENDER = re.compile(r"no-?reply|do-?not-?reply|newsletter|notifications?@|marketing@", re.IGNORECASE)
+# Invoices still need paying (Handbook: payments go to a human), so only settled receipts are batched
+RECEIPT = re.compile(
+    r"\breceipt\b|order confirm|your order|payment (received|confirmation)|\bsubscription\b",
+    re.IGNORECASE)
+SPAM = re.compile(r"\blottery\b|you have won|\bwinner\b|crypto ?currency offer|claim your prize", re.IGNORECASE)
+URGENT = re.compile(r"\burgent\b|\basap\b|immediately|\bdeadline\b|\btoday\b", re.IGNORECASE)
+# Added to the PriorityRules score when an item is enqueued: urgent envelopes are claimed
+# sooner, items triage would only list in the digest later
+PRIORITY_SCORES = {"high": 30, "normal": 0, "low": -30}
+# Only the head of a file is read to score it; sender and subject are at the top
+SCORE_READ_BYTES = 4096
+
+SENDER_LINE = re.compile(r"^# New Email from (.+)$", re.MULTILINE)
+SUBJECT_LINE = re.compile(r"^- \*\*Subject:\*\* (.+)$", re.MULTILINE)
+ATTACHMENT_LINE = re.compile(r"^- \*\*Attachment:\*\*", re.MULTILINE)
+TOKEN = re.compile(r"[a-z][a-z0-9']+")
+
+# The learned channel is only trusted with enough history and a clear winner
+MIN_TRAINING_DOCS = 5
+MIN_CONFIDENCE = 0.8
+# Short, unambiguous items do not need the expensive model
+SIMPLE_MAX_CHARS = 1500
+# History files are sampled, newest first, and only their head is read
+HISTORY_LIMIT = 500
+HISTORY_READ_BYTES = 4096
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+class NaiveBayes:
+    """Multinomial naive Bayes over word counts, with Laplace smoothing."""
+    def __init__(self):
+        self.doc_counts = Counter()
+        self.word_counts = {}
+        self.word_totals = Counter()
+        self.vocab = set()
+
+    def train(self, text, label):
+        words = tokenize(text)
+        self.doc_counts[label] += 1
+        self.word_counts.setdefault(label, Counter()).update(words)
+        self.word_totals[label] += len(words)
+        self.vocab.update(words)
+
+    def docs(self):
+        return sum(self.doc_counts.values())
+
+    def predict(self, text):
+        """Returns (label, probability), or (None, 0.0) when untrained."""
+        if not self.doc_counts:
+            return None, 0.0
+        words = tokenize(text)
+        total_docs = self.docs()
+        vocab_size = len(self.vocab) + 1
+        scores = {}
+        for label, count in self.doc_counts.items():
+            counts = self.word_counts[label]
+            denominator = self.word_totals[label] + vocab_size
+            score = math.log(count / total_docs)
+            for word in words:
+                score += math.log((counts[word] + 1) / denominator)
+            scores[label] = score
+        best = max(scores, key=scores.get)
+        # Softmax over the log scores gives a usable confidence
+        norm = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1.0 / norm
+
+class Triage:
+    """Local decision for one Inbox item, made before any LLM call.
+
+    `action` is "reason" (full reasoning loop), "batch" (low-value, listed in the
+    daily digest for the human) or "skip" (auto-replies and spam, digest only).
+    `channel` is None when neither the rules nor the model are sure. `priority`
+    ("high", "normal" or "low") feeds the ledger priority through Classifier.score.
+    """
+    def __init__(self, action, channel, priority, simple, reason):
+        self.action = action
+        self.channel = channel
+        self.priority = priority
+        self.simple = simple
+        self.reason = reason
+
+    def __str__(self):
+        return (f"action={self.action} channel={self.channel or '?'} priority={self.priority} "
+                f"simple={self.simple} ({self.reason})")
+
+def label_for(filename):
+    for channel in CHANNELS:
+        if filename.startswith(f"{channel}_"):
+            return channel
+    return "DRAFT"
+
+class Classifier:
+    """Rule engine plus a naive Bayes channel model trained from vault history.
+
+    Mail from a Handbook priority sender (`priority_rules`, a PriorityRules) is never
+    skipped or batched.
+    """
+    def __init__(self, priority_rules=None):
+        self.model = NaiveBayes()
+        self.priority_rules = priority_rules
+
+    def train_from(self, folders):
+        """Learns channels from the filename prefixes of past Drafts/Sent/Done items."""
+        for folder in folders:
+            if not os.path.isdir(folder):
+                continue
+            with os.scandir(folder) as entries:
+                files = [e for e in entries if e.is_file() and not e.name.startswith((".", "FILE_"))]
+            files.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+            for entry in files[:HISTORY_LIMIT]:
+                try:
+                    with open(entry.path, "r", encoding="utf-8", errors="ignore") as f:
+                        text = f.read(HISTORY_READ_BYTES)
+                except OSError:
+                    continue
+                self.model.train(text, label_for(entry.name))
+        logger.info(f"Triage model trained on {self.model.docs()} history items: {dict(self.model.doc_counts)}")
+        return self
+
+    def score(self, filename, content, reason=False):
+        """Ledger priority of an item: the PriorityRules score plus its triage priority."""
+        score = self.priority_rules.score(filename, content) if self.priority_rules is not None else 0
+        return score + PRIORITY_SCORES[self.classify(filename, content, reason).priority]
+
+    def score_file(self, path, reason=False):
+        try:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                text = f.read(SCORE_READ_BYTES)
+        except OSError:
+            return 0
+        return self.score(os.path.basename(path), text, reason)
+
+    def classify(self, filename, content, reason=False):
+        """Triage for one item; `reason` rules out skipping and batching, as for a priority sender."""
+        sender_match = SENDER_LINE.search(content)
+        subject_match = SUBJECT_LINE.search(content)
+        sender = sender_match.group(1) if sender_match else ""
+        subject = subject_match.group(1) if subject_match else ""
+        envelope = f"{sender}\n{subject}" if sender_match or subject_match else content[:500]
+
+        priority = "high" if URGENT.search(envelope) else "normal"
+        simple = len(content) <= SIMPLE_MAX_CHARS and not ATTACHMENT_LINE.search(content)
+
+        # An allowlisted client's "your order" mail still gets a Plan and Draft
+        vip = bool(sender) and self.priority_rules is not None and self.priority_rules.is_priority_sender(sender)
+        if not (reason or vip):
+            if AUTO_REPLY.search(envelope):
+                return Triage("skip", None, "low", True, "auto-reply")
+            if SPAM.search(envelope):
+                return Triage("skip", None, "low", True, "spam")
+            if RECEIPT.search(envelope):
+                return Triage("batch", None, "low", True, "receipt")
+            if BULK_SENDER.search(sender):
+                return Triage("batch", None, "low", True, "bulk sender")
+
+        # Explicit channel keywords win over the learned model
+        upper = content.upper()
+        if filename.startswith("EMAIL_") or "EMAIL" in upper or "MAIL" in upper:
+            return Triage("reason", "EMAIL", priority, simple, "rule")
+        if "LINKEDIN" in upper:
+            return Triage("reason", "LINKEDIN", priority, simple, "rule")
+        if "WHATSAPP" in upper:
+            return Triage("reason", "WHATSAPP", priority, simple, "rule")
+
+        if self.model.docs() >= MIN_TRAINING_DOCS:
+            label, confidence = self.model.predict(content)
+            if confidence >= MIN_CONFIDENCE:
+                channel = label if label in CHANNELS else None
+                return Triage("reason", channel, priority, simple, f"model {label} {confidence:.2f}")
+        return Triage("reason", None, priority, False, "undecided")
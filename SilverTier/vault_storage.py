@@ -0,0 +1,206 @@
+import os
+import time
+import errno
+import shutil
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger("VaultStorage")
+
+# Temp files are hidden, so folder scans (which skip dot-files) never pick up a half-written one
+TEMP_PREFIX = ".vault-tmp-"
+# Leftover temp files older than this are from a crashed writer, not one still running
+STALE_TEMP_SECONDS = 3600
+COPY_CHUNK = 64 * 1024 * 1024
+# Errors meaning "this zero-copy call is not supported here", so try the next method
+UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EBADF, errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOTSOCK}
+# Errors from os.link on a filesystem without hard links
+NO_HARD_LINKS = {errno.EPERM, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EMLINK}
+
+def temp_path_for(path):
+    folder, name = os.path.split(path)
+    return os.path.join(folder, f"{TEMP_PREFIX}{os.getpid()}-{time.monotonic_ns()}-{name}")
+
+def fsync_dir(folder):
+    """Makes a rename in `folder` durable; directories cannot be opened on Windows, which needs no fsync."""
+    if os.name == "nt":
+        return
+    fd = os.open(folder or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+@contextmanager
+def atomic_open(path, mode="w", encoding="utf-8"):
+    """Writes to a hidden temp file next to `path`, then fsyncs and renames it into place.
+
+    Readers see either the old file or the complete new one, never a partial write;
+    if the block raises, the temp file is removed and `path` is left untouched.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = temp_path_for(path)
+    binary = "b" in mode
+    f = open(tmp_path, mode, encoding=None if binary else encoding)
+    try:
+        yield f
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+        os.replace(tmp_path, path)
+        fsync_dir(os.path.dirname(path))
+    except BaseException:
+        f.close()
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def atomic_write(path, data, encoding="utf-8"):
+    with atomic_open(path, "wb" if isinstance(data, bytes) else "w", encoding) as f:
+        f.write(data)
+
+def _zero_copy(infd, outfd, size):
+    """Copies in the kernel with copy_file_range, then sendfile; returns bytes copied (0 if unsupported)."""
+    for method in ("copy_file_range", "sendfile"):
+        fn = getattr(os, method, None)
+        if fn is None:
+            continue
+        copied = 0
+        try:
+            while copied < size:
+                count = min(size - copied, COPY_CHUNK)
+                sent = fn(infd, outfd, count) if method == "copy_file_range" else fn(outfd, infd, copied, count)
+                if sent == 0:
+                    break
+                copied += sent
+            return copied
+        except OSError as e:
+            if copied == 0 and e.errno in UNSUPPORTED:
+                continue
+            raise
+    return 0
+
+def copy_file(src, dst_file):
+    """Copies `src` into the open binary file `dst_file` without passing the data through Python."""
+    with open(src, "rb") as fsrc:
+        size = os.fstat(fsrc.fileno()).st_size
+        dst_file.flush()
+        copied = _zero_copy(fsrc.fileno(), dst_file.fileno(), size)
+        if copied < size:
+            # Windows, or a filesystem that supports neither call
+            fsrc.seek(copied)
+            dst_file.seek(copied)
+            shutil.copyfileobj(fsrc, dst_file, COPY_CHUNK)
+
+def _rename_noreplace(src, dst):
+    """Renames `src` to `dst`, raising FileExistsError if `dst` exists, with no window between check and rename.
+
+    A hard link fails atomically if the name is taken; the old name is removed after.
+    A crash in between leaves both names for the same file, never neither.
+    """
+    try:
+        os.link(src, dst)
+    except OSError as e:
+        if e.errno not in NO_HARD_LINKS:
+            raise
+        # FAT, exFAT and some network shares have no hard links. os.rename refuses to overwrite
+        # on Windows; elsewhere the check below leaves a small race
+        if os.name != "nt" and os.path.exists(dst):
+            raise FileExistsError(errno.EEXIST, "Destination exists", dst)
+        os.rename(src, dst)
+        return
+    os.remove(src)
+
+def move(src, dst, overwrite=False):
+    """Moves a file as one atomic step where the filesystem allows it.
+
+    On the same device this is a single rename (a hard link plus unlink without
+    `overwrite`). Across devices the data is copied in the kernel to a hidden temp
+    file beside `dst`, fsynced and renamed into place, and only then is `src` removed:
+    a crash leaves either the original or both copies, never a partial file under a
+    visible name. Without `overwrite`, an existing `dst` raises FileExistsError.
+    """
+    try:
+        if overwrite:
+            os.replace(src, dst)
+        else:
+            _rename_noreplace(src, dst)
+        fsync_dir(os.path.dirname(dst))
+        return dst
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    logger.info(f"Cross-device move of {os.path.basename(src)}, copying")
+    tmp_path = temp_path_for(dst)
+    try:
+        with open(tmp_path, "wb") as f:
+            copy_file(src, f)
+            f.flush()
+            os.fsync(f.fileno())
+        shutil.copystat(src, tmp_path)
+        if overwrite:
+            os.replace(tmp_path, dst)
+        else:
+            _rename_noreplace(tmp_path, dst)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    fsync_dir(os.path.dirname(dst))
+    os.remove(src)
+    fsync_dir(os.path.dirname(src))
+    return dst
+
+def move_to_folder(src, folder, filename=None):
+    """Moves `src` into `folder` without overwriting; clashes get "name_1.ext", "name_2.ext", ..."""
+    os.makedirs(folder, exist_ok=True)
+    filename = filename or os.path.basename(src)
+    stem, ext = os.path.splitext(filename)
+    for attempt in range(10000):
+        candidate = os.path.join(folder, filename if attempt == 0 else f"{stem}_{attempt}{ext}")
+        try:
+            return move(src, candidate)
+        except FileExistsError:
+            continue
+    raise FileExistsError(f"No free name for {filename} in {folder}")
+
+def write_new(folder, filename, data, encoding="utf-8"):
+    """Writes `data` as a new file under a free name in `folder` and returns its path.
+
+    The data goes to a hidden temp file first and is then linked under the first free
+    name ("name_1.ext", ... on a clash), so two writers never pick the same name and
+    the name never shows an empty or partial file.
+    """
+    os.makedirs(folder, exist_ok=True)
+    tmp_path = temp_path_for(os.path.join(folder, filename))
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data if isinstance(data, bytes) else data.encode(encoding))
+            f.flush()
+            os.fsync(f.fileno())
+        return move_to_folder(tmp_path, folder, filename)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def cleanup_temp(folder):
+    """Removes temp files left in `folder` by writers that crashed mid-write."""
+    if not os.path.isdir(folder):
+        return
+    now = time.time()
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.name.startswith(TEMP_PREFIX) and now - entry.stat().st_mtime > STALE_TEMP_SECONDS:
+                try:
+                    os.remove(entry.path)
+                    logger.info(f"Removed stale temp file {entry.name}")
+                except OSError:
+                    pass
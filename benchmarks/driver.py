@@ -0,0 +1,248 @@
+import os
+import sys
+import json
+import time
+import threading
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Runs one scenario inside a throwaway copy of a tier (the working directory), against
+# the stand-ins run.py started, and writes the raw measurements to bench_result.json.
+# Stage timings are not measured here: run.py reads them from the components' own
+# JSON-lines logs once this process has exited and flushed them.
+WORKSPACE = os.getcwd()
+sys.path.insert(0, WORKSPACE)
+
+class Arrivals(FileSystemEventHandler):
+    """Records when each expected file first appears in a folder."""
+    def __init__(self, folder, names):
+        self.folder = folder
+        self.expected = set(names)
+        self.seen = {}
+        self.condition = threading.Condition()
+        self.observer = Observer()
+        os.makedirs(folder, exist_ok=True)
+        self.observer.schedule(self, folder, recursive=False)
+
+    def _arrived(self, path):
+        name = os.path.basename(path)
+        now = time.perf_counter()
+        with self.condition:
+            if name in self.expected and name not in self.seen:
+                self.seen[name] = now
+                self.condition.notify_all()
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self._arrived(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self._arrived(event.dest_path)
+
+    def wait(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while len(self.seen) < len(self.expected):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def __enter__(self):
+        self.observer.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.observer.stop()
+        self.observer.join()
+
+class AnyArrivals(Arrivals):
+    """Waits for `count` new Markdown files, whatever their names."""
+    def __init__(self, folder, count):
+        super().__init__(folder, [])
+        self.count = count
+
+    def _arrived(self, path):
+        name = os.path.basename(path)
+        if not name.endswith(".md") or name.startswith("."):
+            return
+        with self.condition:
+            if name not in self.seen:
+                self.seen[name] = time.perf_counter()
+                self.condition.notify_all()
+
+    def wait(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while len(self.seen) < self.count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+def write_file(path, size, text):
+    line = (text + "\n").encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(line * max(1, size // len(line)))
+
+def email_note(i, size):
+    """An Inbox note in the layout the Gmail watcher writes."""
+    body = f"Hello, could you send me an update on item {i} of our project this week?\n"
+    return (f"# New Email from Client {i} <client{i}@example.com>\n\n"
+            f"- **Subject:** Project question {i}\n"
+            f"- **Date:** {time.strftime('%a, %d %b %Y %H:%M:%S +0000', time.gmtime())}\n"
+            f"\n## Content\n\n" + body * max(1, size // len(body)))
+
+def bench_filesystem_watcher(config):
+    """Drops files into Drop_Zone at `rate` per second (0 = all at once) with the watcher running."""
+    import filesystem_watcher
+    drop_zone = os.path.join(WORKSPACE, "Drop_Zone")
+    os.makedirs(drop_zone, exist_ok=True)
+    names = [f"bench_{i:06d}.txt" for i in range(config["items"])]
+    stop = threading.Event()
+    watcher = threading.Thread(target=filesystem_watcher.run, args=(stop,), name="watcher")
+    written = {}
+    with Arrivals(os.path.join(WORKSPACE, "Needs_Action"), names) as arrivals:
+        watcher.start()
+        time.sleep(config["warmup"])
+        started = time.perf_counter()
+        for i, name in enumerate(names):
+            if config["rate"]:
+                delay = started + i / config["rate"] - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            write_file(os.path.join(drop_zone, name), config["file_bytes"], f"Benchmark file {i}")
+            written[name] = time.perf_counter()
+        complete = arrivals.wait(config["timeout"])
+        seen = dict(arrivals.seen)
+    stop.set()
+    watcher.join()
+    return started, {name: seen[name] - written[name] for name in seen}, seen, complete
+
+def bench_gmail_watcher(config):
+    """One check_gmail pass over the seeded mailbox."""
+    from Watchers import gmail_watcher
+    inbox = os.path.join(WORKSPACE, "Inbox")
+    # Notes are named by the watcher; the first `items` new .md files are the ones to wait for
+    arrivals = AnyArrivals(inbox, config["items"])
+    with arrivals:
+        started = time.perf_counter()
+        gmail_watcher.check_gmail()
+        complete = arrivals.wait(config["timeout"])
+        seen = dict(arrivals.seen)
+    return started, {name: at - started for name, at in seen.items()}, seen, complete
+
+def bench_agent_loop(config, batch=False):
+    """Seeds the queue, then one pass of process_inbox (Silver) or process_tasks (Bronze)."""
+    silver = os.path.exists(os.path.join(WORKSPACE, "orchestrator.py"))
+    queue = os.path.join(WORKSPACE, "Inbox" if silver else "Needs_Action")
+    # Created by the loops' run(), which the one-shot passes skip
+    for folder in [queue, "Drafts", "Plans", "Done", "PHR"]:
+        os.makedirs(os.path.join(WORKSPACE, folder), exist_ok=True)
+    names = [f"EMAIL_bench_{i:06d}.md" if silver else f"bench_{i:06d}.txt" for i in range(config["items"])]
+    for i, name in enumerate(names):
+        with open(os.path.join(queue, name), "w", encoding="utf-8") as f:
+            f.write(email_note(i, config["file_bytes"]))
+
+    import agent_loop
+    # Silver marks a finished file with a .processed suffix; Bronze moves it to Done
+    done_folder, done_names = (queue, [n + ".processed" for n in names]) if silver else (os.path.join(WORKSPACE, "Done"), names)
+    with Arrivals(done_folder, done_names) as arrivals:
+        started = time.perf_counter()
+        if silver:
+            agent_loop.process_inbox()
+        else:
+            agent_loop.process_tasks()
+        if batch:
+            # The pass only queued the items; submit them at once and poll until every result is applied
+            deadline = time.monotonic() + config["timeout"]
+            while not arrivals.wait(0.1) and time.monotonic() < deadline:
+                agent_loop.batches.step(agent_loop.finish_batched, force=True)
+        complete = arrivals.wait(config["timeout"])
+        seen = dict(arrivals.seen)
+    return started, {name: at - started for name, at in seen.items()}, seen, complete
+
+def bench_batch_reasoning(config):
+    """As agent_loop, with every item sent through the Batch API (run.py turns batch mode on)."""
+    return bench_agent_loop(config, batch=True)
+
+def bench_orchestrator(config):
+    """Seeds Outbox with approved emails (and LinkedIn posts), then one process_outbox pass."""
+    outbox = os.path.join(WORKSPACE, "Outbox")
+    for folder in [outbox, "Inbox"]:
+        os.makedirs(os.path.join(WORKSPACE, folder), exist_ok=True)
+    names = []
+    for i in range(config["items"]):
+        name = f"EMAIL_bench_{i:06d}.md"
+        with open(os.path.join(outbox, name), "w", encoding="utf-8") as f:
+            f.write(f"To: client{i}@example.com\nSubject: Re: Project question {i}\n\n")
+            f.write(f"Thanks for your message about item {i}. It will be done this week.\n")
+        names.append(name)
+    for i in range(config["linkedin_posts"]):
+        name = f"LINKEDIN_bench_{i:06d}.md"
+        with open(os.path.join(outbox, name), "w", encoding="utf-8") as f:
+            f.write(f"Benchmark post {i}: shipping another milestone this week.\n")
+        names.append(name)
+
+    import orchestrator
+    with Arrivals(os.path.join(WORKSPACE, "Sent"), names) as arrivals:
+        started = time.perf_counter()
+        orchestrator.process_outbox()
+        complete = arrivals.wait(config["timeout"])
+        seen = dict(arrivals.seen)
+    orchestrator.get_pool().close()
+    return started, {name: at - started for name, at in seen.items()}, seen, complete
+
+SCENARIOS = {
+    "filesystem_watcher": bench_filesystem_watcher,
+    "gmail_watcher": bench_gmail_watcher,
+    "agent_loop": bench_agent_loop,
+    "batch_reasoning": bench_batch_reasoning,
+    "orchestrator": bench_orchestrator,
+}
+
+def process_usage():
+    """Peak RSS, CPU time and context switches of this process, plus Linux I/O syscall counters."""
+    usage = {}
+    if resource is not None:
+        rusage = resource.getrusage(resource.RUSAGE_SELF)
+        # ru_maxrss is in KB on Linux and bytes on macOS
+        scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+        usage["peak_rss_mb"] = round(rusage.ru_maxrss / scale, 1)
+        usage["cpu_s"] = {"user": round(rusage.ru_utime, 3), "system": round(rusage.ru_stime, 3)}
+        usage["context_switches"] = {"voluntary": rusage.ru_nvcsw, "involuntary": rusage.ru_nivcsw}
+    try:
+        with open("/proc/self/io", "r") as f:
+            usage["io"] = {key: int(value) for key, value in (line.split(": ") for line in f.read().splitlines())}
+    except OSError:
+        pass
+    return usage
+
+def main():
+    config = json.loads(sys.argv[1])
+    # Everything the components log goes to one file, read back by run.py
+    from vault_logging import setup_logging
+    setup_logging(os.path.join(WORKSPACE, "Logs"), "bench")
+
+    started, latencies, seen, complete = SCENARIOS[config["scenario"]](config)
+    finished = max(seen.values()) if seen else time.perf_counter()
+    result = {
+        "completed": len(latencies),
+        "complete": complete,
+        "elapsed_s": round(finished - started, 4),
+        "end_to_end_s": sorted(latencies.values()),
+        **process_usage(),
+    }
+    with open(os.path.join(WORKSPACE, "bench_result.json"), "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+import os
+import re
+import sys
+import glob
+import json
+import math
+import time
+import shutil
+import socket
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+from contextlib import ExitStack
+from stubs import OpenAIStub, ImapStub, SmtpSink, LinkedInPage
+
+# End-to-end benchmarks against local stand-ins for OpenAI, IMAP, SMTP and LinkedIn.
+# Each scenario runs in a fresh copy of the tier, in its own process, so results do
+# not depend on the state of the real vault and never touch a live service.
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+DRIVER = os.path.join(BENCH_DIR, "driver.py")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+TIERS = {
+    "silver": os.path.join(REPO_DIR, "SilverTier"),
+    "bronze": os.path.join(REPO_DIR, "AI_Employee_Vault"),
+}
+TIER_SCENARIOS = {
+    "silver": ["filesystem_watcher", "gmail_watcher", "agent_loop", "batch_reasoning", "orchestrator"],
+    "bronze": ["filesystem_watcher", "agent_loop", "batch_reasoning"],
+}
+# Vault content and local state are never copied into a workspace, only code and config
+VAULT_FOLDERS = {"Drop_Zone", "Needs_Action", "Inbox", "Drafts", "Outbox", "Sent", "Done", "Duplicates",
+                 "Plans", "PHR", "Logs", "Attachments", "Documentation"}
+
+# Component settings for every run; --env overrides them. Credentials are placeholders,
+# and every endpoint points at a stand-in (or a closed port when none is running).
+BASE_ENV = {
+    "OPENAI_API_KEY": "bench",
+    "GMAIL_USER": "bench@example.com",
+    "GMAIL_APP_PASSWORD": "bench",
+    "IMAP_SSL": "false",
+    "SMTP_SSL": "false",
+    "SMTP_LOGIN": "false",
+    "LINKEDIN_USER": "bench@example.com",
+    "LINKEDIN_PASSWORD": "bench",
+    "LINKEDIN_HEADLESS": "true",
+    "LOG_COLLECTOR_PORT": "0",
+    "METRICS_PORT": "0",
+    "LLM_CACHE_ENABLED": "false",
+    "LLM_REQUESTS_PER_MINUTE": "60000",
+}
+CLOSED_PORT = "1"
+# Settings a scenario needs on top of BASE_ENV; --env still overrides them
+SCENARIO_ENV = {
+    "batch_reasoning": {"AGENT_BATCH": "true", "AGENT_BATCH_PRIORITIES": "low,normal,high"},
+}
+
+# Compared between runs: throughput should not drop, the rest should not grow
+HIGHER_IS_BETTER = {"throughput_per_s"}
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentiles(values):
+    """count, p50, p95, p99 and max (nearest rank) of a list of seconds, in milliseconds."""
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    rank = lambda q: values[min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))]
+    return {"count": len(values), **{f"p{int(q * 100)}": round(rank(q) * 1000, 2) for q in (0.5, 0.95, 0.99)},
+            "max": round(values[-1] * 1000, 2)}
+
+def make_workspace(tier):
+    source = TIERS[tier]
+
+    def ignore(folder, names):
+        top = os.path.samefile(folder, source)
+        return [n for n in names if n.startswith(".") or n == "__pycache__" or (top and n in VAULT_FOLDERS)]
+
+    workspace = os.path.join(tempfile.mkdtemp(prefix=f"vault-bench-{tier}-"), os.path.basename(source))
+    shutil.copytree(source, workspace, ignore=ignore)
+    return workspace
+
+def stage_latencies(workspace):
+    """Per-stage durations from the `timed` records (stage + duration_ms) in the run's logs."""
+    stages = {}
+    for path in glob.glob(os.path.join(workspace, "Logs", "*.jsonl")):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if "duration_ms" in record and "stage" in record:
+                    stages.setdefault(record["stage"], []).append(record["duration_ms"] / 1000)
+    return stages
+
+def parse_strace(path):
+    """Total and top-10 syscall counts from an `strace -c` summary."""
+    calls = {}
+    total = None
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) >= 5 and re.match(r"^[\d.]+$", fields[0]) and fields[3].isdigit():
+                if fields[-1] == "total":
+                    total = int(fields[3])
+                else:
+                    calls[fields[-1]] = int(fields[3])
+    top = dict(sorted(calls.items(), key=lambda item: item[1], reverse=True)[:10])
+    return {"total": total if total is not None else sum(calls.values()), "top": top}
+
+def wait_for_port(port, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+def start_stubs(scenario, args, stack):
+    """Starts the stand-ins a scenario needs; returns them by name."""
+    stubs = {}
+    if scenario in ("agent_loop", "batch_reasoning"):
+        stubs["openai"] = stack.enter_context(OpenAIStub(args.llm_latency, args.llm_tokens_per_second, args.llm_completion_tokens,
+                                                         args.batch_latency, args.batch_error_rate))
+    if scenario == "gmail_watcher":
+        stubs["imap"] = stack.enter_context(ImapStub(args.items, args.email_bytes))
+    if scenario == "orchestrator":
+        stubs["smtp"] = stack.enter_context(SmtpSink(args.smtp_latency))
+        if args.linkedin_posts:
+            stubs["linkedin"] = stack.enter_context(LinkedInPage(args.linkedin_latency))
+    return stubs
+
+def scenario_env(scenario, stubs, args):
+    env = {**os.environ, **BASE_ENV, **SCENARIO_ENV.get(scenario, {})}
+    env["OPENAI_BASE_URL"] = stubs["openai"].base_url if "openai" in stubs else f"http://127.0.0.1:{CLOSED_PORT}/v1"
+    env["IMAP_HOST"] = env["SMTP_HOST"] = "127.0.0.1"
+    env["IMAP_PORT"] = str(stubs["imap"].port) if "imap" in stubs else CLOSED_PORT
+    env["SMTP_PORT"] = str(stubs["smtp"].port) if "smtp" in stubs else CLOSED_PORT
+    env["LINKEDIN_BASE_URL"] = stubs["linkedin"].base_url if "linkedin" in stubs else f"http://127.0.0.1:{CLOSED_PORT}"
+    env["LINKEDIN_SERVICE_PORT"] = str(free_port())
+    env.update(args.env)
+    return env
+
+def run_scenario(tier, scenario, args):
+    workspace = make_workspace(tier)
+    config = {
+        "scenario": scenario,
+        "items": args.items,
+        "rate": args.rate,
+        "file_bytes": args.file_bytes,
+        "linkedin_posts": args.linkedin_posts,
+        "warmup": args.warmup,
+        "timeout": args.timeout,
+    }
+    command = [sys.executable, DRIVER, json.dumps(config)]
+    strace_path = os.path.join(workspace, "strace.txt")
+    if args.strace:
+        command = ["strace", "-f", "-c", "-o", strace_path] + command
+
+    result = {}
+    keep = args.keep
+    try:
+        with ExitStack() as stack:
+            stubs = start_stubs(scenario, args, stack)
+            env = scenario_env(scenario, stubs, args)
+            if "linkedin" in stubs:
+                # The orchestrator posts through the long-running poster service, as in production
+                poster = subprocess.Popen(
+                    [sys.executable, os.path.join(workspace, "Tools", "linkedin_poster.py"), "--serve"],
+                    cwd=workspace, env=env, stdout=subprocess.DEVNULL,
+                    stderr=open(os.path.join(workspace, "poster.log"), "wb"))
+                stack.callback(poster.wait)
+                stack.callback(poster.terminate)
+                if not wait_for_port(int(env["LINKEDIN_SERVICE_PORT"]), poster, 60):
+                    raise RuntimeError(f"LinkedIn poster service did not start; see {workspace}/poster.log")
+
+            with open(os.path.join(workspace, "bench.log"), "wb") as log:
+                process = subprocess.run(command, cwd=workspace, env=env, stdout=log, stderr=subprocess.STDOUT,
+                                         timeout=args.timeout + 120)
+            if process.returncode != 0:
+                raise RuntimeError(f"driver exited with {process.returncode}; see {workspace}/bench.log")
+            result["stubs"] = {name: dict(stub.stats) for name, stub in stubs.items()}
+
+        with open(os.path.join(workspace, "bench_result.json"), "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        end_to_end = raw.pop("end_to_end_s")
+        elapsed = raw["elapsed_s"]
+        result = {
+            "items": args.items + (args.linkedin_posts if scenario == "orchestrator" else 0),
+            **raw,
+            "throughput_per_s": round(raw["completed"] / elapsed, 2) if elapsed else None,
+            "latency_ms": {"end_to_end": percentiles(end_to_end),
+                           **{stage: percentiles(values) for stage, values in sorted(stage_latencies(workspace).items())}},
+            **result,
+        }
+        if args.strace:
+            result["syscalls"] = parse_strace(strace_path)
+    except Exception as e:
+        result = {"error": str(e)}
+        keep = True
+    finally:
+        if not keep:
+            shutil.rmtree(os.path.dirname(workspace), ignore_errors=True)
+        else:
+            result["workspace"] = workspace
+    return result
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+def format_summary(report):
+    lines = []
+    for name, result in report["scenarios"].items():
+        if "error" in result:
+            lines.append(f"{name}: FAILED ({result['error']})")
+            continue
+        lines.append(f"{name}: {result['completed']}/{result['items']} items in {result['elapsed_s']:.2f}s "
+                     f"({result['throughput_per_s']}/s), peak RSS {result.get('peak_rss_mb', '?')} MB"
+                     + (f", {result['syscalls']['total']} syscalls" if "syscalls" in result else ""))
+        for stage, stats in result["latency_ms"].items():
+            if stats["count"]:
+                lines.append(f"  {stage:<12} n={stats['count']:<6} p50 {stats['p50']:>9.1f} ms  "
+                             f"p95 {stats['p95']:>9.1f} ms  p99 {stats['p99']:>9.1f} ms")
+    return "\n".join(lines)
+
+def comparable(result):
+    """Flattens one scenario's result into {metric: value} for comparison."""
+    values = {"throughput_per_s": result.get("throughput_per_s"), "peak_rss_mb": result.get("peak_rss_mb")}
+    for stage, stats in result.get("latency_ms", {}).items():
+        if stats.get("count"):
+            values[f"{stage}.p95_ms"] = stats["p95"]
+            values[f"{stage}.p99_ms"] = stats["p99"]
+    if "syscalls" in result:
+        values["syscalls"] = result["syscalls"]["total"]
+    return {key: value for key, value in values.items() if value is not None}
+
+def compare(base_path, new_path, threshold):
+    """Prints the change of every shared metric; returns the number of regressions beyond `threshold`."""
+    with open(base_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"Base {base.get('commit', '?')[:10]} vs new {new.get('commit', '?')[:10]} (threshold {threshold:.0%})")
+    regressions = 0
+    for name, result in new["scenarios"].items():
+        before = comparable(base["scenarios"].get(name, {}))
+        after = comparable(result)
+        for metric in sorted(set(before) & set(after)):
+            if not before[metric]:
+                continue
+            change = (after[metric] - before[metric]) / before[metric]
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            flag = ""
+            if worse > threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            elif worse < -threshold:
+                flag = "  improved"
+            print(f"{name:<20} {metric:<24} {before[metric]:>12g} -> {after[metric]:>12g} ({change:+.1%}){flag}")
+    return regressions
+
+def parse_env(values):
+    env = {}
+    for value in values:
+        key, sep, setting = value.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError(f"--env expects KEY=VALUE, got {value!r}")
+        env[key] = setting
+    return env
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmarks against local stand-ins.")
+    parser.add_argument("--tier", choices=sorted(TIERS), default="silver")
+    parser.add_argument("--scenarios", help="comma-separated subset (default: all for the tier)")
+    parser.add_argument("--items", type=int, default=200, help="files, emails, tasks or Outbox emails per scenario")
+    parser.add_argument("--rate", type=float, default=0, help="filesystem_watcher: files per second (0 = all at once)")
+    parser.add_argument("--file-bytes", type=int, default=2048, help="size of dropped files and Inbox notes")
+    parser.add_argument("--email-bytes", type=int, default=4096, help="body size of seeded IMAP messages")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds to the first token")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=1000)
+    parser.add_argument("--llm-completion-tokens", type=int, default=150)
+    parser.add_argument("--batch-latency", type=float, default=1.0, help="batch_reasoning: seconds until a batch job completes")
+    parser.add_argument("--batch-error-rate", type=float, default=0.0, help="batch_reasoning: share of batch requests that fail (and are resent)")
+    parser.add_argument("--smtp-latency", type=float, default=0.0, help="seconds the sink takes per message")
+    parser.add_argument("--linkedin-posts", type=int, default=0, help="orchestrator: LinkedIn posts (needs Playwright)")
+    parser.add_argument("--linkedin-latency", type=float, default=0.05)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="component setting, e.g. AGENT_CONCURRENCY=8 (repeatable)")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds the watcher runs before files are dropped")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds to wait for a scenario's items")
+    parser.add_argument("--strace", action="store_true", help="count syscalls with strace -c (slows the run)")
+    parser.add_argument("--keep", action="store_true", help="keep the workspaces (always kept on failure)")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<tier>-<commit>.json)")
+    parser.add_argument("--compare", nargs="+", metavar="RESULT",
+                        help="compare BASE [NEW] result files instead of running; NEW defaults to a fresh run")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change reported as a regression")
+    args = parser.parse_args()
+    args.env = parse_env(args.env)
+
+    if args.compare and len(args.compare) == 2:
+        sys.exit(1 if compare(args.compare[0], args.compare[1], args.threshold) else 0)
+    if args.strace and not shutil.which("strace"):
+        parser.error("--strace needs strace on PATH")
+
+    scenarios = args.scenarios.split(",") if args.scenarios else TIER_SCENARIOS[args.tier]
+    unknown = [s for s in scenarios if s not in TIER_SCENARIOS[args.tier]]
+    if unknown:
+        parser.error(f"unknown scenario(s) for {args.tier}: {', '.join(unknown)}")
+
+    commit, dirty = git_revision()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "tier": args.tier,
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("compare", "output", "keep")},
+        "scenarios": {},
+    }
+    for scenario in scenarios:
+        print(f"Running {scenario}...", flush=True)
+        report["scenarios"][scenario] = run_scenario(args.tier, scenario, args)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{args.tier}-{(commit or 'unknown')[:10]}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(format_summary(report))
+    print(f"Results written to {output}")
+
+    if args.compare:
+        sys.exit(1 if compare(args.compare[0], output, args.threshold) else 0)
+    if any("error" in result for result in report["scenarios"].values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,502 @@
+import re
+import json
+import time
+import random
+import itertools
+import threading
+import socketserver
+from email import policy
+from email.parser import BytesParser
+from email.utils import formatdate, make_msgid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Local stand-ins for every external service the pipeline talks to. Each one binds an
+# ephemeral port on 127.0.0.1, counts the traffic it served in `stats`, and is started
+# and stopped by run.py around a scenario.
+HOST = "127.0.0.1"
+
+class Stub:
+    """Runs a socketserver on a background thread; subclasses set `server`."""
+    server = None
+
+    def __init__(self):
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + amount
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name=type(self).__name__, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+# --- OpenAI-compatible chat completions ---------------------------------------------
+
+REPLY_HEAD = (
+    "ANALYSIS: The sender asks for a status update on the request described above.\n"
+    "PROPOSE: EMAIL reply confirming receipt and giving the expected completion date.\n\n"
+    "REASONING:"
+)
+
+class OpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        stub = self.server.stub
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.endswith("/files"):
+            self.reply(stub.upload(self.headers.get("Content-Type", ""), data))
+            return
+        body = json.loads(data or b"{}")
+        if self.path.endswith("/batches"):
+            self.reply(stub.create_batch(body))
+            return
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        stub.count("requests")
+        with stub.lock:
+            limited = stub.rate_limited > 0
+            stub.rate_limited -= limited
+        if limited:
+            stub.count("rate_limited")
+            self.reply({"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                       status=429, headers=[("Retry-After", str(stub.retry_after))])
+            return
+        with stub.lock:
+            stub.active += 1
+            stub.stats["peak_concurrency"] = max(stub.stats.get("peak_concurrency", 0), stub.active)
+        try:
+            prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+            tokens = stub.completion(stub.completion_tokens)
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                     "total_tokens": prompt_tokens + len(tokens)}
+            stub.count("prompt_tokens", prompt_tokens)
+            stub.count("completion_tokens", len(tokens))
+            time.sleep(stub.latency)
+            if body.get("stream"):
+                self.stream(body, tokens, usage)
+            else:
+                self.complete(body, tokens, usage)
+        finally:
+            with stub.lock:
+                stub.active -= 1
+
+    def do_GET(self):
+        stub = self.server.stub
+        match = re.search(r"/batches/([\w-]+)$", self.path)
+        if match and match.group(1) in stub.batches:
+            self.reply(stub.batch_status(match.group(1)))
+            return
+        match = re.search(r"/files/([\w-]+)/content$", self.path)
+        if match and match.group(1) in stub.files:
+            self.reply(stub.files[match.group(1)], "application/octet-stream")
+            return
+        self.send_error(404)
+
+    def reply(self, payload, content_type="application/json", status=200, headers=()):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def chunk(self, payload):
+        data = f"data: {json.dumps(payload) if not isinstance(payload, str) else payload}\n\n".encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+
+    def complete(self, body, tokens, usage):
+        time.sleep(len(tokens) / self.server.stub.tokens_per_second)
+        response = json.dumps({
+            "id": "chatcmpl-bench", "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model", "bench"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "".join(tokens)}}],
+            "usage": usage,
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def stream(self, body, tokens, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        base = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": body.get("model", "bench")}
+        interval = 1 / self.server.stub.tokens_per_second
+        started = time.perf_counter()
+        for i, token in enumerate(tokens):
+            # Paced against the start, so sleep granularity does not slow the token rate
+            delay = started + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self.chunk({**base, "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]})
+        self.chunk({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self.chunk({**base, "choices": [], "usage": usage})
+        self.chunk("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+class OpenAIStub(Stub):
+    """Chat completions with `latency` seconds to the first token, then `tokens_per_second`.
+
+    Also emulates the Batch API (file upload, batch create and retrieve, file content).
+    A batch completes `batch_latency` seconds after it is created, and each of its
+    requests fails with a 500 in the error file with probability `batch_error_rate`.
+    The next `rate_limited` chat completions are refused with a 429 and a Retry-After
+    of `retry_after` seconds.
+    """
+    def __init__(self, latency=0.2, tokens_per_second=1000, completion_tokens=150, batch_latency=1.0, batch_error_rate=0.0):
+        super().__init__()
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.batch_latency = batch_latency
+        self.batch_error_rate = batch_error_rate
+        self.rate_limited = 0
+        self.retry_after = 1
+        self.files = {}
+        self.batches = {}
+        self.ids = itertools.count(1)
+        self.active = 0
+        self.server = ThreadingHTTPServer((HOST, 0), OpenAIHandler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+
+    @property
+    def base_url(self):
+        return f"http://{HOST}:{self.port}/v1"
+
+    def _id(self, prefix):
+        return f"{prefix}-bench{next(self.ids)}"
+
+    def upload(self, content_type, data):
+        """Stores the "file" part of a multipart upload; returns the file object."""
+        message = BytesParser(policy=policy.HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + data)
+        part = next(p for p in message.iter_parts() if p.get_param("name", header="content-disposition") == "file")
+        file_id = self._id("file")
+        self.files[file_id] = part.get_payload(decode=True)
+        self.count("uploaded_bytes", len(self.files[file_id]))
+        return {"id": file_id, "object": "file", "bytes": len(self.files[file_id]), "created_at": int(time.time()),
+                "filename": part.get_filename() or "upload.jsonl", "purpose": "batch", "status": "processed"}
+
+    def create_batch(self, body):
+        batch_id = self._id("batch")
+        self.count("batches")
+        self.batches[batch_id] = {
+            "id": batch_id, "object": "batch", "endpoint": body["endpoint"], "errors": None,
+            "input_file_id": body["input_file_id"], "completion_window": body["completion_window"],
+            "status": "in_progress", "output_file_id": None, "error_file_id": None,
+            "created_at": int(time.time()), "metadata": body.get("metadata"),
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "ready_at": time.monotonic() + self.batch_latency,
+        }
+        return self.batch_status(batch_id)
+
+    def batch_status(self, batch_id):
+        """The batch object; the first call after `batch_latency` runs the batch and writes its result files."""
+        with self.lock:
+            batch = self.batches[batch_id]
+            if batch["status"] == "in_progress" and time.monotonic() >= batch["ready_at"]:
+                self._run_batch(batch)
+            return {key: value for key, value in batch.items() if key != "ready_at"}
+
+    def _run_batch(self, batch):
+        output, errors = [], []
+        for line in self.files[batch["input_file_id"]].decode("utf-8").splitlines():
+            request = json.loads(line)
+            body = request["body"]
+            self.stats["batch_requests"] = self.stats.get("batch_requests", 0) + 1
+            if random.random() < self.batch_error_rate:
+                errors.append({"id": f"req-{len(errors)}", "custom_id": request["custom_id"], "error": None,
+                               "response": {"status_code": 500, "body": {"error": {"message": "stub failure"}}}})
+                continue
+            prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+            tokens = self.completion(self.completion_tokens)
+            output.append({"id": f"req-{len(output)}", "custom_id": request["custom_id"], "error": None, "response": {
+                "status_code": 200, "request_id": f"req-{len(output)}", "body": {
+                    "id": "chatcmpl-bench", "object": "chat.completion", "created": int(time.time()),
+                    "model": body.get("model", "bench"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": "".join(tokens)}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                              "total_tokens": prompt_tokens + len(tokens)},
+                }}})
+        for records, key in ((output, "output_file_id"), (errors, "error_file_id")):
+            if records:
+                file_id = self._id("file")
+                self.files[file_id] = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+                batch[key] = file_id
+        batch["request_counts"] = {"total": len(output) + len(errors), "completed": len(output), "failed": len(errors)}
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+
+    def completion(self, count):
+        """A reply with a PROPOSE section, padded to `count` tokens (one word each)."""
+        tokens = re.findall(r"\S+\s*", REPLY_HEAD)
+        filler = ["The ", "request ", "is ", "routine ", "and ", "can ", "be ", "answered ", "directly. "]
+        while len(tokens) < count:
+            tokens.append(filler[len(tokens) % len(filler)])
+        return tokens[:max(count, 1)]
+
+# --- IMAP ---------------------------------------------------------------------------
+
+def parse_uid_set(text, highest):
+    uids = set()
+    for part in text.split(","):
+        start, _, end = part.partition(":")
+        start = highest if start == "*" else int(start)
+        end = start if not end else highest if end == "*" else int(end)
+        uids.update(range(min(start, end), max(start, end) + 1))
+    return uids
+
+class ImapHandler(socketserver.StreamRequestHandler):
+    """The IMAP4rev1 subset the Gmail watcher uses: LOGIN, SELECT, UID SEARCH/FETCH, IDLE, NOOP, LOGOUT."""
+    def send(self, data):
+        self.server.stub.count("bytes_sent", len(data))
+        self.wfile.write(data)
+
+    def handle(self):
+        stub = self.server.stub
+        stub.count("sessions")
+        self.send(b"* OK bench IMAP4rev1 ready\r\n")
+        for raw in self.rfile:
+            line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+            tag, _, rest = line.partition(" ")
+            command, _, args = rest.partition(" ")
+            command = command.upper()
+            stub.count("commands")
+            if command == "UID":
+                command, _, args = args.partition(" ")
+                command = "UID " + command.upper()
+            if command == "CAPABILITY":
+                self.send(b"* CAPABILITY IMAP4rev1 IDLE\r\n")
+            elif command == "SELECT":
+                self.send(f"* {len(stub.messages)} EXISTS\r\n* 0 RECENT\r\n"
+                          f"* OK [UIDVALIDITY {stub.uidvalidity}] UIDs valid\r\n"
+                          f"* OK [UIDNEXT {len(stub.messages) + 1}] Predicted next UID\r\n".encode())
+                self.send(f"{tag} OK [READ-WRITE] SELECT completed\r\n".encode())
+                continue
+            elif command == "UID SEARCH":
+                self.search(args)
+            elif command == "UID FETCH":
+                stub.count("fetches")
+                self.fetch(args)
+            elif command == "IDLE":
+                self.send(b"+ idling\r\n")
+                for raw in self.rfile:
+                    if raw.strip().upper() == b"DONE":
+                        break
+            elif command == "LOGOUT":
+                self.send(b"* BYE bench IMAP closing\r\n")
+                self.send(f"{tag} OK LOGOUT completed\r\n".encode())
+                return
+            elif command not in ("LOGIN", "NOOP"):
+                self.send(f"{tag} BAD unsupported command\r\n".encode())
+                continue
+            self.send(f"{tag} OK {command} completed\r\n".encode())
+
+    def search(self, args):
+        uids = range(1, len(self.server.stub.messages) + 1)
+        match = re.search(r"UID (\S+)", args, re.IGNORECASE)
+        if match and uids:
+            uids = sorted(parse_uid_set(match.group(1), len(uids)) & set(uids))
+        self.send(("* SEARCH " + " ".join(map(str, uids))).rstrip().encode() + b"\r\n")
+
+    def fetch(self, args):
+        messages = self.server.stub.messages
+        id_set, _, items = args.partition(" ")
+        items = items.strip("()").upper()
+        for uid in sorted(parse_uid_set(id_set, len(messages)) if messages else []):
+            if not 1 <= uid <= len(messages):
+                continue
+            header, body = messages[uid - 1]
+            out = f"* {uid} FETCH (UID {uid}".encode()
+            if "BODYSTRUCTURE" in items:
+                lines = body.count(b"\n") + 1
+                out += (f' BODYSTRUCTURE ("text" "plain" ("charset" "utf-8") NIL NIL "7bit" {len(body)} {lines}'
+                        f" NIL NIL NIL NIL)").encode()
+            for section, partial in re.findall(r"BODY\.PEEK\[([^\]]*)\](?:<(\d+\.\d+)>)?", items):
+                if section == "HEADER" and uid in self.server.stub.broken:
+                    continue
+                data = header if section == "HEADER" else body
+                name = f"BODY[{section}]"
+                if partial:
+                    offset, length = map(int, partial.split("."))
+                    data = data[offset:offset + length]
+                    name += f"<{offset}>"
+                out += f" {name} {{{len(data)}}}\r\n".encode() + data
+            self.send(out + b")\r\n")
+
+class ImapStub(Stub):
+    """A mailbox pre-seeded with `count` unseen single-part text messages of about `body_bytes` each.
+
+    UIDs added to `broken` are answered without their headers, as a server does for a
+    message it fails to read.
+    """
+    def __init__(self, count=100, body_bytes=4096):
+        super().__init__()
+        self.uidvalidity = random.randint(1, 2 ** 31)
+        self.broken = set()
+        self.messages = [self.message(i, body_bytes) for i in range(1, count + 1)]
+        self.server = socketserver.ThreadingTCPServer((HOST, 0), ImapHandler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+
+    @staticmethod
+    def message(i, body_bytes):
+        header = (
+            f"From: Client {i} <client{i}@example.com>\r\n"
+            f"To: bench@example.com\r\n"
+            f"Subject: Project question {i}\r\n"
+            f"Date: {formatdate(localtime=True)}\r\n"
+            f"Message-ID: {make_msgid(f'bench{i}')}\r\n"
+            f"MIME-Version: 1.0\r\n"
+            f"Content-Type: text/plain; charset=utf-8\r\n"
+            f"Content-Transfer-Encoding: 7bit\r\n\r\n"
+        ).encode()
+        line = f"Hello, could you send me an update on item {i} of our project this week?\r\n".encode()
+        return header, (line * max(1, body_bytes // len(line)))
+
+# --- SMTP ---------------------------------------------------------------------------
+
+class SmtpHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        stub = self.server.stub
+        stub.count("sessions")
+        self.wfile.write(b"220 bench ESMTP ready\r\n")
+        for raw in self.rfile:
+            command = raw.decode("utf-8", errors="replace").strip().upper()
+            stub.count("commands")
+            if command.startswith("EHLO"):
+                self.wfile.write(b"250-bench\r\n250-8BITMIME\r\n250 SMTPUTF8\r\n")
+            elif command == "DATA":
+                self.wfile.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                size = 0
+                for data in self.rfile:
+                    if data in (b".\r\n", b".\n"):
+                        break
+                    size += len(data)
+                time.sleep(stub.latency)
+                stub.count("messages")
+                stub.count("bytes_received", size)
+                self.wfile.write(b"250 OK queued\r\n")
+            elif command == "QUIT":
+                self.wfile.write(b"221 Bye\r\n")
+                return
+            else:
+                # HELO, MAIL, RCPT, RSET, NOOP
+                self.wfile.write(b"250 OK\r\n")
+
+class SmtpSink(Stub):
+    """Accepts and discards every message, taking `latency` seconds to acknowledge each one."""
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.latency = latency
+        self.server = socketserver.ThreadingTCPServer((HOST, 0), SmtpHandler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+
+# --- LinkedIn -----------------------------------------------------------------------
+
+LOGIN_PAGE = b"""<!doctype html><html><body>
+<form method="post" action="/login">
+<input id="username" name="username"><input id="password" name="password" type="password">
+<button type="submit">Sign in</button>
+</form></body></html>"""
+
+# Same selectors as Tools/linkedin_poster.py; the dialog closes once /share accepted the post
+FEED_PAGE = b"""<!doctype html><html><body>
+<button class="share-box-feed-entry__trigger" onclick="openEditor()">Start a post</button>
+<div id="dialog"></div>
+<script>
+function openEditor() {
+  document.getElementById("dialog").innerHTML =
+    '<div class="ql-editor" contenteditable="true"></div>' +
+    '<button class="share-actions__primary-action" onclick="share()">Post</button>';
+}
+function share() {
+  const text = document.querySelector(".ql-editor").innerText;
+  fetch("/share", {method: "POST", body: text}).then(() => {
+    document.getElementById("dialog").innerHTML = "";
+  });
+}
+</script></body></html>"""
+
+class LinkedInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body=b"", headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        stub = self.server.stub
+        stub.count("page_loads")
+        path = self.path.split("?")[0]
+        if path == "/login":
+            self.reply(200, LOGIN_PAGE)
+        elif path.startswith("/feed"):
+            self.reply(200, FEED_PAGE)
+        else:
+            self.reply(404)
+
+    def do_POST(self):
+        stub = self.server.stub
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        if self.path == "/login":
+            stub.count("logins")
+            self.reply(303, headers=[("Location", "/feed/"), ("Set-Cookie", "li_at=bench; Path=/")])
+        elif self.path == "/share":
+            time.sleep(stub.latency)
+            stub.count("posts")
+            self.reply(204)
+        else:
+            self.reply(404)
+
+class LinkedInPage(Stub):
+    """A static feed page with the share box; each post takes `latency` seconds to be accepted."""
+    def __init__(self, latency=0.05):
+        super().__init__()
+        self.latency = latency
+        self.server = ThreadingHTTPServer((HOST, 0), LinkedInHandler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+
+    @property
+    def base_url(self):
+        return f"http://{HOST}:{self.port}"
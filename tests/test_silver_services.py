@@ -0,0 +1,251 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+import importlib
+import socket
+import imaplib
+import threading
+
+# Checks for Silver tier components; the network clients run against the local stand-ins in
+# benchmarks/stubs.py. The tier is imported from a throwaway copy, so Inbox/, Logs/ and the
+# state files of the checkout are never touched.
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "benchmarks"))
+from stubs import ImapStub, OpenAIStub, SmtpSink
+
+WORKSPACE = None
+
+def setUpModule():
+    global WORKSPACE
+    source = os.path.join(REPO_DIR, "SilverTier")
+    ignore = shutil.ignore_patterns(".*", "__pycache__", "Inbox", "Logs", "Sent", "Done", "Plans")
+    WORKSPACE = os.path.join(tempfile.mkdtemp(prefix="vault-services-test-"), "SilverTier")
+    shutil.copytree(source, WORKSPACE, ignore=ignore)
+    sys.path.insert(0, WORKSPACE)
+    sys.path.insert(0, os.path.join(WORKSPACE, "Watchers"))
+
+def tearDownModule():
+    sys.path.remove(WORKSPACE)
+    sys.path.remove(os.path.join(WORKSPACE, "Watchers"))
+    shutil.rmtree(os.path.dirname(WORKSPACE), ignore_errors=True)
+
+class GmailFetchTest(unittest.TestCase):
+    def setUp(self):
+        self.gw = importlib.import_module("gmail_watcher")
+        self.stub = ImapStub(count=5, body_bytes=512).start()
+        self.gw.IMAP_HOST, self.gw.IMAP_PORT, self.gw.IMAP_SSL = "127.0.0.1", self.stub.port, False
+        self.gw.GMAIL_USER, self.gw.GMAIL_APP_PASSWORD = "test@example.com", "secret"
+        self.dir = tempfile.mkdtemp(prefix="gmail-test-")
+        self.gw.INBOX_DIR = os.path.join(self.dir, "Inbox")
+        self.gw.STATE_PATH = os.path.join(self.dir, "gmail_state.json")
+        self.gw.seen = self.gw.SeenSet(os.path.join(self.dir, "ingested.db"))
+        self.mail = self.gw.open_mailbox()
+
+    def tearDown(self):
+        self.mail.logout()
+        self.stub.stop()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def saved(self):
+        return len(os.listdir(self.gw.INBOX_DIR)) if os.path.isdir(self.gw.INBOX_DIR) else 0
+
+    def test_high_water_mark_skips_saved_mail(self):
+        self.gw.fetch_unseen(self.mail)
+        self.assertEqual(self.gw.load_state()["last_uid"], 5)
+        self.assertEqual(self.saved(), 5)
+
+        fetches = self.stub.stats["fetches"]
+        self.gw.fetch_unseen(self.mail)
+        self.assertEqual(self.stub.stats["fetches"], fetches)
+        self.assertEqual(self.saved(), 5)
+
+    def test_partial_fetch_stays_below_failed_message(self):
+        self.stub.broken.add(3)
+        with self.assertRaises(imaplib.IMAP4.error):
+            self.gw.fetch_unseen(self.mail)
+        self.assertEqual(self.gw.load_state()["last_uid"], 2)
+        self.assertEqual(self.saved(), 2)
+
+        # Once readable again, the rest of the batch is picked up
+        self.stub.broken.clear()
+        self.gw.fetch_unseen(self.mail)
+        self.assertEqual(self.gw.load_state()["last_uid"], 5)
+        self.assertEqual(self.saved(), 5)
+
+    def test_message_that_keeps_failing_is_skipped(self):
+        self.stub.broken.add(3)
+        for _ in range(self.gw.MAX_UID_FAILURES):
+            with self.assertRaises(imaplib.IMAP4.error):
+                self.gw.fetch_unseen(self.mail)
+            self.assertEqual(self.gw.load_state()["last_uid"], 2)
+
+        self.gw.fetch_unseen(self.mail)
+        state = self.gw.load_state()
+        self.assertEqual(state["last_uid"], 5)
+        self.assertNotIn("failing_uid", state)
+        self.assertEqual(self.saved(), 4)
+
+class SmtpPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.sp = importlib.import_module("smtp_pool")
+        self.sink = SmtpSink().start()
+        self.sp.SMTP_HOST, self.sp.SMTP_PORT = "127.0.0.1", self.sink.port
+        self.sp.SMTP_SSL = self.sp.SMTP_LOGIN = False
+        self.sp.GMAIL_USER = "test@example.com"
+        self.pool = self.sp.SMTPPool(size=1)
+        self.messages = [(f"client{i}@example.com", f"Re: question {i}", "Thanks!") for i in range(3)]
+
+    def tearDown(self):
+        self.pool.close()
+        self.sink.stop()
+
+    def test_batch_reconnects_after_dropped_session(self):
+        self.pool.send(*self.messages[0])
+        smtp, _ = self.pool.idle.queue[-1]
+        smtp.sock.shutdown(socket.SHUT_RDWR)
+
+        self.assertEqual(self.pool.send_batch(self.messages), [None, None, None])
+        self.assertEqual(self.sink.stats["messages"], 4)
+        self.assertEqual(self.sink.stats["sessions"], 2)
+
+    def test_batch_fails_once_when_server_is_unreachable(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.sp.SMTP_PORT = sock.getsockname()[1]
+        connects = []
+        connect = self.pool._connect
+        self.pool._connect = lambda: connects.append(1) or connect()
+
+        results = self.pool.send_batch(self.messages)
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(isinstance(e, OSError) for e in results))
+        self.assertEqual(len(connects), 1)
+
+class InboxPriorityTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="priority-test-")
+        ledger = importlib.import_module("task_ledger")
+        priority = importlib.import_module("priority")
+        triage = importlib.import_module("triage")
+        self.ledger = ledger.TaskLedger(os.path.join(self.dir, "tasks.db"))
+        self.classifier = triage.Classifier(priority.PriorityRules(os.path.join(self.dir, "Company_Handbook.md")))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def enqueue(self, filename, sender, subject):
+        path = os.path.join(self.dir, filename)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"# New Email from {sender}\n\n- **Subject:** {subject}\n\nHello,\n")
+        self.ledger.enqueue("inbox", filename, None, self.classifier.score_file(path))
+
+    def test_urgent_items_are_claimed_first(self):
+        # Oldest first would hand them out in this order
+        self.enqueue("EMAIL_1.md", "Shop <orders@shop.example.com>", "Your order receipt")
+        self.enqueue("EMAIL_2.md", "Client <client@example.com>", "Question about the project")
+        self.enqueue("EMAIL_3.md", "Client <client@example.com>", "Server is down, need a fix today")
+
+        tasks = self.ledger.claim("inbox", "test", limit=3, aging_seconds=6)
+        self.assertEqual([task["name"] for task in tasks], ["EMAIL_3.md", "EMAIL_2.md", "EMAIL_1.md"])
+
+class RateLimiterTest(unittest.TestCase):
+    def setUp(self):
+        from openai import OpenAI
+        self.rl = importlib.import_module("rate_limiter")
+        self.stub = OpenAIStub(latency=0, completion_tokens=5).start()
+        self.stub.retry_after = 0.5
+        # The SDK's own retries are off, so every 429 reaches rate_limited_call
+        self.client = OpenAI(api_key="test", base_url=self.stub.base_url, max_retries=0)
+        self.bucket = self.rl.TokenBucket(rate=100, capacity=10)
+
+    def tearDown(self):
+        self.client.close()
+        self.stub.stop()
+
+    def complete(self, **kwargs):
+        return self.rl.rate_limited_call(self.bucket, self.client.chat.completions.create, model="test",
+                                         messages=[{"role": "user", "content": "Hello"}], **kwargs)
+
+    def test_429_pauses_the_bucket_for_retry_after(self):
+        self.stub.rate_limited = 1
+        started = time.monotonic()
+        self.complete()
+        self.assertGreaterEqual(time.monotonic() - started, 0.5)
+        self.assertEqual(self.stub.stats["rate_limited"], 1)
+        self.assertEqual(self.stub.stats["requests"], 2)
+
+    def test_429_pauses_other_workers(self):
+        self.stub.rate_limited = 1
+        worker = threading.Thread(target=self.complete)
+        worker.start()
+        while worker.is_alive() and self.bucket.paused_until <= time.monotonic():
+            time.sleep(0.01)
+        started = time.monotonic()
+        self.bucket.acquire()
+        waited = time.monotonic() - started
+        worker.join()
+        self.assertGreaterEqual(waited, 0.3)
+
+    def test_gives_up_after_max_attempts(self):
+        from openai import RateLimitError
+        self.stub.rate_limited = 3
+        with self.assertRaises(RateLimitError):
+            self.complete(max_attempts=2)
+        self.assertEqual(self.stub.stats["requests"], 2)
+
+class BatchQueueTest(unittest.TestCase):
+    def setUp(self):
+        from openai import OpenAI
+        self.bj = importlib.import_module("batch_jobs")
+        resilience = importlib.import_module("resilience")
+        self.stub = OpenAIStub(latency=0, completion_tokens=5, batch_latency=0).start()
+        self.client = OpenAI(api_key="test", base_url=self.stub.base_url, max_retries=0)
+        self.dir = tempfile.mkdtemp(prefix="batch-test-")
+        self.queue = self.bj.BatchQueue(self.client, self.dir, circuit=resilience.CircuitBreaker("test"))
+        self.body = {"model": "test", "messages": [{"role": "user", "content": "Hello"}]}
+        self.results = []
+        # Failed jobs are retried at once instead of after minutes of backoff
+        self.retry_base = self.bj.JOB_RETRY_BASE_SECONDS
+        self.bj.JOB_RETRY_BASE_SECONDS = 0
+
+    def tearDown(self):
+        self.bj.JOB_RETRY_BASE_SECONDS = self.retry_base
+        self.client.close()
+        self.stub.stop()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def on_result(self, custom_id, body, completion, error):
+        self.results.append((custom_id, completion, error))
+
+    def test_job_answers_its_requests(self):
+        self.queue.add("EMAIL_1.md", self.body)
+        self.queue.step(self.on_result, force=True)
+        self.queue.step(self.on_result, force=True)
+        [(custom_id, completion, error)] = self.results
+        self.assertEqual(custom_id, "EMAIL_1.md")
+        self.assertIsNone(error)
+        self.assertTrue(completion.choices[0].message.content)
+
+    def test_job_given_up_after_repeated_api_failures(self):
+        self.queue.add("EMAIL_1.md", self.body)
+        self.queue.step(self.on_result, force=True)
+        # The server no longer knows the batch, so every poll is a 404
+        self.stub.batches.clear()
+        for _ in range(self.bj.JOB_MAX_FAILURES - 1):
+            self.queue.step(self.on_result, force=True)
+        self.assertEqual(self.results, [])
+        self.assertTrue(self.queue.has("EMAIL_1.md"))
+
+        self.queue.step(self.on_result, force=True)
+        [(custom_id, completion, error)] = self.results
+        self.assertEqual(custom_id, "EMAIL_1.md")
+        self.assertIsNone(completion)
+        self.assertIsInstance(error, self.bj.BatchError)
+        self.assertEqual(self.queue.jobs, {})
+        self.assertFalse(self.queue.has("EMAIL_1.md"))
+
+if __name__ == "__main__":
+    unittest.main()
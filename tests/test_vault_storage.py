@@ -0,0 +1,204 @@
+import os
+import sys
+import errno
+import shutil
+import tempfile
+import textwrap
+import unittest
+import importlib.util
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+# Crash-consistency checks for vault_storage (the copies in both tiers are identical).
+# A crash is simulated by running the operation in a child process that calls
+# os._exit() at the chosen point, so no finally block or cleanup gets to run.
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CRASHED = 9
+
+CHILD_PRELUDE = """
+import os
+import sys
+sys.path.insert(0, {tier_dir!r})
+import vault_storage as vs
+
+def crash(*args, **kwargs):
+    os._exit({crashed})
+
+def cross_device(fn):
+    # The first call fails as if src and dst were on different drives
+    calls = []
+    def wrapper(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            raise OSError({exdev}, "Invalid cross-device link")
+        return fn(*args, **kwargs)
+    return wrapper
+"""
+
+def load_storage(tier_dir):
+    spec = importlib.util.spec_from_file_location(f"vault_storage_{os.path.basename(tier_dir)}",
+                                                  os.path.join(tier_dir, "vault_storage.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class CrashConsistency:
+    TIER = None
+
+    def setUp(self):
+        self.tier_dir = os.path.join(REPO_DIR, self.TIER)
+        self.vs = load_storage(self.tier_dir)
+        self.dir = tempfile.mkdtemp(prefix="vault-storage-test-")
+        self.src_dir = os.path.join(self.dir, "Drop_Zone")
+        self.dst_dir = os.path.join(self.dir, "Needs_Action")
+        os.makedirs(self.src_dir)
+        os.makedirs(self.dst_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def run_child(self, code):
+        """Runs `code` in a child process that must reach its crash() call."""
+        script = CHILD_PRELUDE.format(tier_dir=self.tier_dir, crashed=CRASHED, exdev=errno.EXDEV) + textwrap.dedent(code)
+        result = subprocess.run([sys.executable, "-c", script], cwd=self.dir, capture_output=True, text=True)
+        self.assertEqual(result.returncode, CRASHED, result.stderr)
+
+    def write(self, path, data):
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def read(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    def visible(self, folder):
+        return sorted(name for name in os.listdir(folder) if not name.startswith("."))
+
+    def hidden(self, folder):
+        return sorted(name for name in os.listdir(folder) if name.startswith(self.vs.TEMP_PREFIX))
+
+    def test_atomic_write_crash_keeps_old_content(self):
+        path = os.path.join(self.dst_dir, "Dashboard.md")
+        self.write(path, b"old")
+        self.run_child(f"""
+            with vs.atomic_open({path!r}) as f:
+                f.write("new, half written")
+                f.flush()
+                crash()
+        """)
+        self.assertEqual(self.read(path), b"old")
+        self.assertEqual(self.visible(self.dst_dir), ["Dashboard.md"])
+        self.assertEqual(len(self.hidden(self.dst_dir)), 1)
+
+        # The next start removes what the crashed writer left behind
+        self.vs.STALE_TEMP_SECONDS = -1
+        self.vs.cleanup_temp(self.dst_dir)
+        self.assertEqual(self.hidden(self.dst_dir), [])
+
+    def test_cross_device_ingest_crash_mid_copy(self):
+        # The filesystem watcher moving a file from another drive into the queue folder
+        src = os.path.join(self.src_dir, "report.pdf")
+        data = os.urandom(256 * 1024)
+        self.write(src, data)
+        self.run_child(f"""
+            os.link = cross_device(os.link)
+            def partial_copy(src, dst_file):
+                with open(src, "rb") as f:
+                    dst_file.write(f.read(1000))
+                dst_file.flush()
+                crash()
+            vs.copy_file = partial_copy
+            vs.move_to_folder({src!r}, {self.dst_dir!r})
+        """)
+        self.assertEqual(self.read(src), data)
+        self.assertEqual(self.visible(self.dst_dir), [])
+
+    def test_cross_device_move_crash_before_source_removed(self):
+        src = os.path.join(self.src_dir, "report.pdf")
+        data = os.urandom(256 * 1024)
+        self.write(src, data)
+        dst = os.path.join(self.dst_dir, "report.pdf")
+        self.run_child(f"""
+            os.link = cross_device(os.link)
+            remove = os.remove
+            os.remove = lambda path: crash() if path == {src!r} else remove(path)
+            vs.move({src!r}, {dst!r})
+        """)
+        # Both copies are complete; nothing is lost and nothing partial is visible
+        self.assertEqual(self.read(src), data)
+        self.assertEqual(self.read(dst), data)
+        self.assertEqual(self.hidden(self.dst_dir), [])
+
+    def test_cross_device_overwrite_crash_mid_copy_keeps_old_file(self):
+        src = os.path.join(self.src_dir, "EMAIL_1.md")
+        self.write(src, b"new" * 1000)
+        dst = os.path.join(self.dst_dir, "EMAIL_1.md")
+        self.write(dst, b"old")
+        self.run_child(f"""
+            os.replace = cross_device(os.replace)
+            def partial_copy(src, dst_file):
+                dst_file.write(b"ne")
+                dst_file.flush()
+                crash()
+            vs.copy_file = partial_copy
+            vs.move({src!r}, {dst!r}, overwrite=True)
+        """)
+        self.assertEqual(self.read(dst), b"old")
+        self.assertEqual(self.read(src), b"new" * 1000)
+
+    def test_move_crash_between_link_and_unlink(self):
+        src = os.path.join(self.src_dir, "notes.txt")
+        self.write(src, b"notes")
+        dst = os.path.join(self.dst_dir, "notes.txt")
+        self.run_child(f"""
+            os.remove = crash
+            vs.move({src!r}, {dst!r})
+        """)
+        self.assertEqual(self.read(src), b"notes")
+        self.assertEqual(self.read(dst), b"notes")
+
+    def test_move_does_not_overwrite(self):
+        src = os.path.join(self.src_dir, "notes.txt")
+        dst = os.path.join(self.dst_dir, "notes.txt")
+        self.write(src, b"new")
+        self.write(dst, b"old")
+        with self.assertRaises(FileExistsError):
+            self.vs.move(src, dst)
+        self.assertEqual(self.read(src), b"new")
+        self.assertEqual(self.read(dst), b"old")
+
+    def test_concurrent_moves_never_share_a_name(self):
+        sources = []
+        for i in range(50):
+            folder = os.path.join(self.src_dir, str(i))
+            os.makedirs(folder)
+            sources.append(os.path.join(folder, "notes.txt"))
+            self.write(sources[-1], str(i).encode())
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            paths = list(pool.map(lambda src: self.vs.move_to_folder(src, self.dst_dir), sources))
+        self.assertEqual(len(set(paths)), len(sources))
+        self.assertEqual(sorted(self.read(path) for path in paths), sorted(str(i).encode() for i in range(50)))
+
+    def test_write_new_crash_leaves_no_visible_file(self):
+        self.run_child(f"""
+            os.fsync = crash
+            vs.write_new({self.dst_dir!r}, "EMAIL_1.md", "# New Email")
+        """)
+        self.assertEqual(self.visible(self.dst_dir), [])
+
+    def test_write_new_picks_a_free_name(self):
+        self.write(os.path.join(self.dst_dir, "EMAIL_1.md"), b"first")
+        path = self.vs.write_new(self.dst_dir, "EMAIL_1.md", "second")
+        self.assertEqual(os.path.basename(path), "EMAIL_1_1.md")
+        self.assertEqual(self.read(path), b"second")
+        self.assertEqual(self.read(os.path.join(self.dst_dir, "EMAIL_1.md")), b"first")
+        self.assertEqual(self.hidden(self.dst_dir), [])
+
+class SilverTierStorageTest(CrashConsistency, unittest.TestCase):
+    TIER = "SilverTier"
+
+class BronzeTierStorageTest(CrashConsistency, unittest.TestCase):
+    TIER = "AI_Employee_Vault"
+
+if __name__ == "__main__":
+    unittest.main()